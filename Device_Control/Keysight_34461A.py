@@ -1,124 +1,676 @@
-import os
 import time
+from contextlib import contextmanager
 import pyvisa
-import csv
+import numpy as np
+from adaptive_range import RangeController
+from running_stats import OVERLOAD
+
+# 测量功能代号与SCPI功能节点的对应关系
+FUNCTIONS = {
+    'DCV': 'VOLT:DC',
+    'ACV': 'VOLT:AC',
+    'DCI': 'CURR:DC',
+    'ACI': 'CURR:AC',
+    'Res': 'RES',
+}
+
+READING_MEMORY = 10000  # 34461A 读数存储器容量（条）
+
+
+# 电压积分时间（PLC）与 VOLT:APER 参数的对应关系
+APERTURES = {
+    1: '2E-02',
+    10: '2E-01',
+    100: '2E+00',
+    0.2: '3E-03',
+    0.02: '3E-04',
+}
+
+DEFAULT_NPLC = 10  # CONF 后直流功能的默认积分时间（PLC）
+AC_READING_TIME = 0.625  # 交流功能默认 20Hz 滤波器下每个读数的时间（秒）
+READING_OVERHEAD = 0.5e-3  # 每个读数在积分时间之外的固定开销（秒），定时采样校验时留出的余量
+
+
+def _ascii_values(data):
+    #   逗号分隔的 ASCII 读数转为 float64 数组
+    return np.array(data.split(','), dtype=np.float64) if data else np.empty(0)
+
+
+def _split_responses(line):
+    #   按 ';' 拆分一行中的多个查询响应，引号内的字符串可能含有分号
+    fields, start, quoted = [], 0, False
+    for i, ch in enumerate(line):
+        if ch == '"':
+            quoted = not quoted
+        elif ch == ';' and not quoted:
+            fields.append(line[start:i])
+            start = i + 1
+    fields.append(line[start:])
+    return fields
+
+
+class SCPIError(Exception):
+    """仪器错误队列中报告的错误（SYST:ERR? 返回非 +0）"""
+
+
+class Batch(object):
+    """合并为一次写入的一组 SCPI 命令
+
+    各命令加 ':' 前缀（公共命令 * 除外）后用 ';' 连成一行写入，查询命令的响应由仪器按顺序用 ';'
+    连成一行返回。check=True 时在末尾附加 *OPC? 和 SYST:ERR?，整批命令只需一次往返即可确认执行完毕且无错误。
+    """
+
+    def __init__(self, meter, check=True):
+        self.meter = meter
+        self.check = check
+        self.commands = []
+        self.queries = 0  # 批量中查询命令的个数
+        self.local = False  # 提交时是否附加一条 SYST:LOC
+        self.responses = []  # 提交后各查询命令的响应
+
+    def write(self, cmd):
+        self.commands.append(cmd)
+
+    def query(self, cmd):
+        """加入一条查询命令，返回其响应在 responses 中的序号"""
+        self.commands.append(cmd)
+        self.queries += 1
+        return self.queries - 1
+
+    def commit(self):
+        """下发全部命令并读回响应，返回查询响应列表；仪器报告错误时抛出 SCPIError"""
+        commands = self.commands + (['SYST:LOC'] if self.local else [])
+        queries = self.queries
+        self.commands, self.queries, self.local = [], 0, False
+        if self.check:
+            commands += ['*OPC?', 'SYST:ERR?']
+        if not commands:
+            self.responses = []
+            return self.responses
+
+        line = ';'.join(cmd if cmd.startswith(('*', ':')) else ':' + cmd for cmd in commands)
+        resource = self.meter.K34461A
+        if not self.check and not queries:
+            resource.write(line)
+            self.responses = []
+            return self.responses
+
+        fields = _split_responses(resource.query(line).strip())
+        if self.check:
+            error = fields[-1]
+            if int(error.split(',')[0]) != 0:
+                errors = [error]
+                while True:
+                    error = resource.query('SYST:ERR?').strip()
+                    if int(error.split(',')[0]) == 0:
+                        break
+                    errors.append(error)
+                raise SCPIError('; '.join(errors))
+        self.responses = fields[:queries]
+        return self.responses
 
 
 class DMM34461A(object):
 
-    def __init__(self):
-        """初始化资源管理器但不连接设备"""
+    def __init__(self, rm=None):
+        """初始化资源管理器但不连接设备；多台仪器可传入同一个 rm 共享资源管理器"""
         self.Meas = 0
-        self.rm = pyvisa.ResourceManager()
+        self.rm = rm if rm is not None else pyvisa.ResourceManager()
         self.K34461A = None  # 设备连接句柄
+        self.binary_transfer = True  # 批量读数优先使用 REAL,64 二进制传输，False 时退回 ASCII
+        # 仪器状态影子缓存：只记录本驱动写入过的配置（功能、量程、积分时间、输入阻抗、触发、数据格式），
+        # 配置命令与缓存一致时不再下发；空字典表示仪器状态未知
+        self.state = {}
+        self.commands = {}  # 缓存项 -> 最近一次写入它的命令，用于重新连接后恢复配置
+        self.address = None
+        self.init_time = None  # 最近一次 timed/stream 发出 INIT 的主机时刻
+        self.pending = None  # 进行中的批量（batch() 期间配置写入先记入其中）
+        self.timing = None  # 逐命令计时（enable_timing 后为 TimedResource）
+        self.rangers = None  # 自适应量程：功能代号 -> RangeController，None 表示使用仪器自动量程
+        self.range_options = {}
 
     def connect(self, device_address):
         """连接指定设备"""
-        self.K34461A = self.rm.open_resource(device_address)
+        resource = self.rm.open_resource(device_address)
+        if self.timing is not None:
+            self.timing.attach(resource)
+            resource = self.timing
+        self.K34461A = resource
+        self.address = device_address
+        self.invalidate()
         # 这里可以添加设备初始化配置
 
+    def enable_timing(self):
+        """给 VISA 会话挂上逐命令计时，按 写入/读取/解析 分阶段记入直方图，返回计时对象"""
+        if self.timing is None:
+            from visa_timing import TimedResource  # 只在需要计时时加载
+            self.timing = TimedResource(self.K34461A)
+            self.K34461A = self.timing
+        return self.timing
+
+    def _parse(self, convert, data):
+        #   数据转换，开启计时时把耗时记入上一条查询的 parse 阶段
+        if self.timing is None:
+            return convert(data)
+        start = time.perf_counter_ns()
+        value = convert(data)
+        self.timing.record_parse(start)
+        return value
+
+    @contextmanager
+    def batch(self, check=True):
+        """批量事务：with 块内配置方法的写入先记入批量，退出时合并为一次写入提交
+
+            with meter.batch() as batch:
+                meter.conf_function('DCV')
+                meter.set_volt_aperture(1)
+                index = batch.query('VOLT:DC:RANG?')
+            batch.responses[index]
+
+        with 块内只应调用配置方法和 batch.write/batch.query，直接查询仪器的方法会越过尚未提交的命令。
+        嵌套时并入最外层的批量。提交失败时缓存作废。
+        """
+        if self.pending is not None:
+            yield self.pending
+            return
+        batch = self.pending = Batch(self, check)
+        try:
+            yield batch
+        except BaseException:
+            self.invalidate()  # 未下发的配置已记入缓存
+            raise
+        finally:
+            self.pending = None
+        try:
+            batch.commit()
+        except Exception:
+            self.invalidate()
+            raise
+
+    def execute(self, commands, check=True):
+        """把一组命令作为一个批量下发，按顺序返回其中查询命令的响应"""
+        with self.batch(check) as batch:
+            for cmd in commands:
+                if '?' in cmd:
+                    batch.query(cmd)
+                else:
+                    batch.write(cmd)
+        self.invalidate()  # 自定义命令可能改动任意配置
+        return batch.responses
+
+    def _write(self, cmd):
+        #   有进行中的批量时记入批量，否则直接写入
+        if self.pending is not None:
+            self.pending.write(cmd)
+        else:
+            self.K34461A.write(cmd)
+
+    def invalidate(self):
+        """清空影子缓存：通过 text_function 或前面板改动配置后调用，之后的操作会重新下发配置"""
+        self.state.clear()
+
+    def _set(self, key, value, cmd):
+        #   缓存值与目标值不同时才写入仪器，返回是否实际发送了命令
+        if key in self.state and self.state[key] == value:
+            return False
+        self._write(cmd)
+        self.state[key] = value
+        self.commands[key] = cmd
+        return True
+
+    def _supersede(self, key):
+        #   另一条命令使该配置项失效（如 APER 与 NPLC 互相覆盖）：缓存记为 None，恢复配置时不再重发旧命令
+        self.state[key] = None
+        self.commands.pop(key, None)
+
+    def restore(self, state):
+        """按之前保存的缓存（dict(self.state)）恢复仪器配置，用于重新连接后继续采集
+
+        先 CONF 到原来的功能档位，再按原顺序重发其余与之不同的设置，最后恢复数据格式。
+        """
+        self.invalidate()
+        with self.batch():
+            if state.get('function'):
+                self.conf_function(state['function'])
+            for key, value in state.items():
+                if key in self.commands and self.state.get(key) != value:
+                    self._set(key, value, self.commands[key])
+                elif value is None and self.state.get(key) is not None:
+                    self._supersede(key)  # 已被其他命令覆盖的配置项（如 APER 生效时的 NPLC）
+            if state.get('format'):
+                self.set_data_format(state['format'])
+
+    def _conf_done(self, function):
+        #   CONF/MEAS 会把量程、积分时间和触发系统恢复为默认值，同步更新缓存
+        self.state.update({
+            'function': function,
+            'range': 'AUTO',
+            'samp_source': 'IMM',
+            'samp_count': 1,
+            'trig_count': 1,
+            'trig_source': 'IMM',
+            'trig_delay': 'AUTO',
+            'autozero': True,
+        })
+        if function == 'DCV':
+            self.state['aperture'] = None
+        if function not in ('ACV', 'ACI'):
+            self.state['nplc'] = DEFAULT_NPLC
+
+    def conf_function(self, function):
+        #   按功能代号设置测量档位（DCV/ACV/DCI/ACI/Res），已处于该档位时不重复配置
+        if self.state.get('function') == function:
+            return False
+        self._write('CONF:' + FUNCTIONS[function])
+        self._conf_done(function)
+        return True
+
     def conf_curr_dc(self):
         #   设置为DC 电流档
-        self.K34461A.write('CONF:CURR:DC')
-        device.local()
+        if self.conf_function('DCI'):
+            self.local()
 
     def conf_curr_ac(self):
         #   设置为AC电流档
-        self.K34461A.write('CONF:CURR:AC')
-        device.local()
+        if self.conf_function('ACI'):
+            self.local()
 
     def conf_volt_dc(self):
         #   设置为DC电压档
-        self.K34461A.write('CONF:VOLT:DC')
-        device.local()
+        if self.conf_function('DCV'):
+            self.local()
 
     def conf_volt_ac(self):
         #   设置为AC电压档
-        self.K34461A.write('CONF:VOLT:AC')
-        device.local()
+        if self.conf_function('ACV'):
+            self.local()
 
     def set_volt_aperture(self, APER):
         #   设置电压测量积分时间
-        if APER == 1:
-            self.K34461A.write('VOLTage:APERture 2E-02')   #1 PLC
-        elif APER == 10:
-            self.K34461A.write('VOLTage:APERture 2E-01')   #10 PLC
-        elif APER == 100:
-            self.K34461A.write('VOLTage:APERture 2E+00')    #100 PLC
-        elif APER == 0.2:
-            self.K34461A.write('VOLTage:APERture 3E-03')    #0.2 PLC
-        elif APER == 0.02:
-            self.K34461A.write('VOLTage:APERture 3E-04')    #0.02 PLC
-        else:
+        if APER not in APERTURES:
             print('输入参数错误，请输入0.02/0.2/1/10/100')
+            return
+
+        if self._set('aperture', APER, 'VOLTage:APERture ' + APERTURES[APER]):
+            self._supersede('nplc')  # 积分时间改由 APER 决定
+            self.local()
+
+    def _current_function(self):
+        #   当前测量功能代号，尚未配置功能（如刚恢复的会话）时抛出 ValueError
+        function = self.state.get('function')
+        if function is None:
+            raise ValueError('尚未设置测量功能，请先调用 conf_function')
+        return function
+
+    def set_nplc(self, nplc):
+        """按电源周期数设置当前直流功能（DCV/DCI/Res）的积分时间，同时关闭 APER"""
+        function = self._current_function()
+        if self._set('nplc', nplc, f'{FUNCTIONS[function]}:NPLC {nplc:g}') and function == 'DCV':
+            self._supersede('aperture')
+
+    def set_autozero(self, enable):
+        #   自动调零：开启时每个直流读数额外做一次零点测量，积分时间相当于加倍
+        self._set('autozero', enable, 'ZERO:AUTO ' + ('ON' if enable else 'OFF'))
+
+    def line_frequency(self):
+        """电源频率（Hz），首次查询后缓存"""
+        if 'line_freq' not in self.state:
+            self.state['line_freq'] = float(self.K34461A.query('SYST:LFR?'))
+        return self.state['line_freq']
+
+    def min_sample_period(self, function=None):
+        """按当前积分时间（APER/NPLC）、自动调零和固定开销估算的最短采样间隔（秒）"""
+        function = function or self.state.get('function', 'DCV')
+        if function in ('ACV', 'ACI'):
+            return AC_READING_TIME
+        aperture = self.state.get('aperture') if function == 'DCV' else None
+        if aperture is not None:
+            integration = float(APERTURES[aperture])
+        else:
+            integration = (self.state.get('nplc') or DEFAULT_NPLC) / self.line_frequency()
+        if self.state.get('autozero', True):
+            integration *= 2
+        return integration + READING_OVERHEAD
+
+    def set_range(self, value):
+        """设置当前功能的量程：满量程值，或 'AUTO' 恢复自动量程"""
+        node = FUNCTIONS[self._current_function()]
+        if value == 'AUTO':
+            self._set('range', value, node + ':RANG:AUTO ON')
+        else:
+            self._set('range', value, f'{node}:RANG {value:g}')
+
+    def set_adaptive_range(self, enable=True, headroom=0.25, patience=20):
+        """开启/关闭自适应量程
+
+        开启后各功能的第一个读数决定固定量程（留出 headroom 余量），之后只在过载或连续 patience 个读数
+        超出/远低于当前量程时换档，避免自动量程在信号接近量程边界时反复切换继电器和多做转换。
+        read_value 遇到过载时升档重测；burst 按本批读数调整下一批的量程；timed/stream 使用已学到的量程。
+        """
+        if not enable:
+            self.rangers = None
+            if self.state.get('function'):
+                self.set_range('AUTO')
+            return
+        self.rangers = {}
+        self.range_options = {'headroom': headroom, 'patience': patience}
+
+    def _ranger(self, function):
+        #   该功能的量程控制器，未开启自适应量程时返回 None
+        if self.rangers is None:
+            return None
+        if function not in self.rangers:
+            self.rangers[function] = RangeController(function, **self.range_options)
+        return self.rangers[function]
+
+    def _pin_range(self, function):
+        #   已学到量程时固定量程（须在 conf_function 之后调用，CONF 会恢复自动量程）
+        ranger = self._ranger(function)
+        if ranger is not None and ranger.range is not None:
+            self.set_range(ranger.range)
+
+    def _adapt(self, function, values):
+        #   把读数送入量程控制器，需要换档时立即下发新量程，返回是否换档
+        ranger = self._ranger(function)
+        if ranger is None:
+            return False
+        new_range = ranger.update(values)
+        if new_range is None:
+            return False
+        self.set_range(new_range)
+        return True
 
-        device.local()
+    def range_stats(self):
+        """各功能自适应量程的统计：当前量程、换档次数、按自动量程规则会发生的换档次数、避免的次数、过载次数"""
+        if self.rangers is None:
+            return {}
+        return {function: ranger.as_dict() for function, ranger in self.rangers.items()}
 
     def set_input_Z(self, IMMP):
         if IMMP == '10M':
-            self.K34461A.write('VOLT:DC:IMPedance:AUTO 0')
+            written = self._set('impedance', IMMP, 'VOLT:DC:IMPedance:AUTO 0')
         elif IMMP == 'AUTO':
-            self.K34461A.write('VOLT:DC:IMPedance:AUTO 1')
+            written = self._set('impedance', IMMP, 'VOLT:DC:IMPedance:AUTO 1')
         else:
             print('输入参数错误，请输入"10M"/"AUTO"')
+            return
 
-        device.local()
+        if written:
+            self.local()
+
+    def read_value(self, function):
+        """读取一次指定功能的测量值
+
+        功能尚未配置时用 MEAS? 一次往返完成配置和测量；
+        配置与缓存一致时只补齐单点触发设置并用 READ?，不再重新配置仪器。
+        开启自适应量程时，读数过载则升档重测，直到读数有效或已在最高档。
+        """
+        self.set_data_format('ASCII')
+        ranger = self._ranger(function)
+        if self.state.get('function') != function and (ranger is None or ranger.range is None):
+            value = self.K34461A.query('MEAS:' + FUNCTIONS[function] + '?')
+            self._conf_done(function)
+            value = self._parse(float, value)
+        else:
+            self.conf_function(function)
+            self._pin_range(function)
+            self._set('trig_source', 'IMM', 'TRIG:SOUR IMM')
+            self._set('trig_delay', 'AUTO', 'TRIG:DEL:AUTO ON')  # 之前的定时采样可能设过稳定时间
+            self._set('samp_count', 1, 'SAMP:COUN 1')
+            self._set('trig_count', 1, 'TRIG:COUN 1')
+            value = self._parse(float, self.K34461A.query('READ?'))
+
+        while self._adapt(function, [value]) and abs(value) >= OVERLOAD:
+            value = self._parse(float, self.K34461A.query('READ?'))
+        return value
 
     def get_volt_dc(self):
         #   获取DC电压档电压值
-        volt = self.K34461A.query('MEAS:VOLT:DC?')
-        # device.local()
-        return round(float(volt),6)
-
+        return round(self.read_value('DCV'), 6)
 
     def get_volt_ac(self):
         #   获取AC电压档电压值
-        volt = self.K34461A.query('MEAS:VOLT:AC?')
-        # device.local()
-        return round(float(volt),6)
+        return round(self.read_value('ACV'), 6)
 
     def get_curr_dc(self):
         #   获取DC电流档电流值
-        curr = self.K34461A.query('MEAS:CURR:DC?')
-        # device.local()
-        return round(float(curr),6)
+        return round(self.read_value('DCI'), 6)
 
     def get_curr_ac(self):
         #   获取AC电流档电流值
-        curr = self.K34461A.query('MEAS:CURR:AC?')
-        # device.local()
-        return round(float(curr),6)
+        return round(self.read_value('ACI'), 6)
 
     def get_immp(self):
         #   获取电阻值
-        res = self.K34461A.query('MEASUre:RESistance?')
-        # device.local()
-        return round(float(res), 6)
+        return round(self.read_value('Res'), 6)
 
     def measurement(self, function):
-        if function == 'DCV':
-            self.Meas = self.K34461A.query('MEASUre:VOLTage:DC?')
-        if function == 'DCI':
-            self.Meas = self.K34461A.query('MEASUre:CURRent:DC?')
-        if function == 'ACV':
-            self.Meas = self.K34461A.query('MEASUre:VOLTage:AC?')
-        if function == 'ACI':
-            self.Meas = self.K34461A.query('MEASUre:CURRent:AC?')
-        if function == 'Res':
-            self.Meas = self.K34461A.query('MEASUre:RESistance?')
-        Meas_Result = float(self.Meas)
+        self.Meas = self.read_value(function)
+        Meas_Result = self.Meas
         # device.local()
         return Meas_Result
 
+    def set_data_format(self, fmt):
+        """设置读数传输格式：'ASCII' 或 'REAL'（REAL,64 小端二进制块）"""
+        if self.state.get('format') == fmt:
+            return
+        if fmt == 'REAL':
+            self._write('FORM:DATA REAL,64')
+            self._write('FORM:BORD SWAP')  # 小端字节序，与PC一致，解析时无需字节交换
+        else:
+            self._write('FORM:DATA ASCII')
+        self.state['format'] = fmt
+
+    def fetch_array(self, cmd, count=0):
+        """读取一块读数（FETC?/R?）到 numpy 数组
+
+        二进制模式下按 IEEE-488.2 定长块直接解析为 float64，不做 round。
+        """
+        if self.binary_transfer:
+            self.set_data_format('REAL')
+            values = self.K34461A.query_binary_values(
+                cmd,
+                datatype='d',
+                is_big_endian=False,
+                container=np.ndarray,
+                data_points=count
+            )
+        else:
+            self.set_data_format('ASCII')
+            data = self.K34461A.query(cmd).strip()
+            if data.startswith('#'):
+                # R? 返回定长块，去掉 "#<位数><长度>" 块头
+                data = data[2 + int(data[1]):]
+            values = self._parse(_ascii_values, data)
+        return values
+
+    def burst(self, function, count, trig_count=1, poll_interval=0.05, stop_event=None):
+        """硬件缓存批量采集：只配置一次，INIT 后由仪器连续采样，最后用 FETC? 一次取回整块读数
+
+        采集过程中 stop_event 置位时发送 ABOR 放弃本批，返回空数组。
+        开启自适应量程时本批读数用于调整下一批的量程（本批中的过载读数保留为 9.9E37）。
+        """
+        total = self.arm_burst(function, count, trig_count)
+
+        # 轮询已完成的读数数量，避免 FETC? 在长时间采集中超时
+        while int(self.K34461A.query('DATA:POIN?')) < total:
+            if stop_event is not None and stop_event.wait(poll_interval):
+                self.K34461A.write('ABOR')
+                return np.empty(0)
+            if stop_event is None:
+                time.sleep(poll_interval)
+
+        return self.fetch_burst(function, total)
+
+    def arm_burst(self, function, count, trig_count=1):
+        """配置批量采集并发出 INIT，不等待采集完成，返回总点数（之后轮询 DATA:POIN? 再 fetch_burst）"""
+        total = count * trig_count
+        if total > READING_MEMORY:
+            raise ValueError(f'批量点数超过读数存储器容量({READING_MEMORY})')
+
+        # 配置和 INIT 合并为一次写入
+        with self.batch(check=False):
+            self.conf_function(function)
+            self._pin_range(function)
+            self._set('trig_source', 'IMM', 'TRIG:SOUR IMM')
+            self._set('trig_delay', 'AUTO', 'TRIG:DEL:AUTO ON')  # 之前的定时采样可能改过稳定时间和采样源
+            self._set('samp_source', 'IMM', 'SAMP:SOUR IMM')
+            self._set('samp_count', count, f'SAMP:COUN {count}')
+            self._set('trig_count', trig_count, f'TRIG:COUN {trig_count}')
+            self.set_data_format('REAL' if self.binary_transfer else 'ASCII')
+            self._write('INIT')
+        return total
+
+    def fetch_burst(self, function, total):
+        """取回已完成的批量读数（FETC?），自适应量程按本批读数调整下一批的量程"""
+        values = self.fetch_array('FETC?', total)
+        self._adapt(function, values)
+        return values
+
+    def timed(self, function, rate, count, settle=0.0, stop_event=None):
+        """硬件定时采集：由仪器采样定时器（SAMP:SOUR TIM / SAMP:TIM）按 rate 次/秒采集 count 个读数
+
+        先按当前积分时间、自动调零和开销校验采样率能否达到，达不到时抛出 ValueError。
+        settle 为触发后第一个读数前的稳定时间（TRIG:DEL，秒），只对本次采集有效，
+        其他采集方式会恢复自动触发延时。读数时刻由定时器推算：
+        INIT 时刻 + settle + k / rate，不受主机轮询抖动影响。返回 (时间戳数组, 读数数组)；
+        stop_event 置位时发送 ABOR 并返回空数组。
+        """
+        if count > READING_MEMORY:
+            raise ValueError(f'采样点数超过读数存储器容量({READING_MEMORY})')
+        self.conf_function(function)
+        period = 1.0 / rate
+        min_period = self.min_sample_period(function)
+        if period < min_period:
+            raise ValueError(f'采样率 {rate:g} 次/秒超出当前积分时间允许的上限 {1.0 / min_period:.4g} 次/秒')
+
+        with self.batch():
+            self._pin_range(function)
+            self._set('trig_source', 'IMM', 'TRIG:SOUR IMM')
+            self._set('trig_delay', settle, f'TRIG:DEL {settle:g}')
+            self._set('samp_source', 'TIM', 'SAMP:SOUR TIM')
+            self._set('samp_timer', period, f'SAMP:TIM {period:g}')
+            self._set('samp_count', count, f'SAMP:COUN {count}')
+            self._set('trig_count', 1, 'TRIG:COUN 1')
+            self.set_data_format('REAL' if self.binary_transfer else 'ASCII')
+        self.K34461A.write('INIT')
+        start = self.init_time = time.time()
+
+        # 预计采集完成前不轮询，之后每次等待约 1/20 的总时长
+        poll_interval = max(count * period / 20, 0.01)
+        if stop_event is not None and stop_event.wait(settle + (count - 1) * period):
+            self.K34461A.write('ABOR')
+            return np.empty(0), np.empty(0)
+        elif stop_event is None:
+            time.sleep(settle + (count - 1) * period)
+        while int(self.K34461A.query('DATA:POIN?')) < count:
+            if stop_event is not None and stop_event.wait(poll_interval):
+                self.K34461A.write('ABOR')
+                return np.empty(0), np.empty(0)
+            if stop_event is None:
+                time.sleep(poll_interval)
+
+        values = self.fetch_array('FETC?', count)
+        return start + settle + np.arange(len(values)) * period, values
+
+    def stream(self, function, rate=None, chunk=1000, stop_event=None, poll_interval=None, settle=None):
+        """连续流式采集生成器
+
+        仪器以 rate（次/秒，None 为最快速度）持续采样，主机轮询 DATA:POIN?，
+        一旦读数存储器中攒够 chunk 个读数就用 R? 取走并产出长度固定的 numpy 数组，
+        主机内存占用有界，仪器读数存储器也不会溢出。生成器关闭或 stop_event 置位时发送 ABOR 停止采集。
+        settle 见 arm_stream。
+        """
+        self.arm_stream(function, rate, chunk, settle)
+        if poll_interval is None:
+            # 每攒满一块大约轮询4次，兼顾响应速度和总线占用
+            poll_interval = min(max(chunk / rate / 4, 0.01), 0.5) if rate else 0.05
+        try:
+            while stop_event is None or not stop_event.is_set():
+                points = int(self.K34461A.query('DATA:POIN?'))
+                if points < chunk:
+                    time.sleep(poll_interval)
+                    continue
+                for _ in range(points // chunk):
+                    yield self.fetch_array(f'R? {chunk}', chunk)
+        finally:
+            self.K34461A.write('ABOR')
+
+    def arm_stream(self, function, rate=None, chunk=1000, settle=None):
+        """配置连续采集（触发次数无限）并发出 INIT，之后轮询 DATA:POIN? 并用 R? 分块取走，结束时须发送 ABOR
+
+        settle 为触发后第一个读数前的稳定时间（TRIG:DEL，秒），定时采样（rate）时只在采集开始时生效一次，
+        读数时刻为 init_time + settle + k / rate；None 为自动触发延时。
+        """
+        if chunk > READING_MEMORY:
+            raise ValueError(f'分块大小超过读数存储器容量({READING_MEMORY})')
+
+        # 配置一次下发并确认无错误（如采样间隔超出仪器能力）
+        with self.batch():
+            self.conf_function(function)
+            self._pin_range(function)
+            self._set('trig_source', 'IMM', 'TRIG:SOUR IMM')
+            if settle is None:
+                self._set('trig_delay', 'AUTO', 'TRIG:DEL:AUTO ON')
+            else:
+                self._set('trig_delay', settle, f'TRIG:DEL {settle:g}')
+            if rate:
+                # 由仪器内部定时器控制采样间隔，单次触发采集最大点数，触发次数无限
+                period = 1.0 / rate
+                self._set('samp_source', 'TIM', 'SAMP:SOUR TIM')
+                self._set('samp_timer', period, f'SAMP:TIM {period:g}')
+                self._set('samp_count', 1000000, 'SAMP:COUN 1000000')
+            else:
+                self._set('samp_source', 'IMM', 'SAMP:SOUR IMM')
+                self._set('samp_count', 1, 'SAMP:COUN 1')
+            self._set('trig_count', 'INF', 'TRIG:COUN INF')
+
+        self.K34461A.write('INIT')
+        self.init_time = time.time()  # 采集开始的主机时刻，定时采样时读数时刻可由此推算
+
+    def run_plan(self, plan, stop_event=None):
+        """执行多功能扫描计划（scan_plan.ScanPlan）：按最少切换的顺序分组批量采集，返回按计划顺序重建的 ScanResult"""
+        return plan.run(self, stop_event)
+
+    def set_average(self, enable=True):
+        """开启/关闭仪器内部统计（CALC:AVER），开启时清零，之后的每个读数都由仪器累计"""
+        self._set('calc_aver', enable, 'CALC:AVER:STAT ' + ('ON' if enable else 'OFF'))
+        if enable:
+            self._write('CALC:AVER:CLE')
+
+    def average_stats(self):
+        """读取仪器内部统计，一次往返返回 {'count', 'mean', 'std', 'min', 'max', 'pp'}"""
+        with self.batch(check=False) as batch:
+            batch.query('CALC:AVER:COUN?')
+            batch.query('CALC:AVER:ALL?')
+        count, values = batch.responses
+        mean, std, minimum, maximum = (float(x) for x in values.split(','))
+        count = int(float(count))
+        return {
+            'count': count,
+            'mean': mean,
+            'std': std,
+            'min': minimum if count else None,
+            'max': maximum if count else None,
+            'pp': maximum - minimum if count else None,
+        }
+
     def local(self):
-        self.K34461A.write('SYST:LOC')
+        if self.pending is not None:
+            self.pending.local = True  # 批量中多次调用只在提交时发送一次
+        else:
+            self.K34461A.write('SYST:LOC')
 
     def text_function(self, cmd):
-        if '?' in cmd:
-            read = self.K34461A.query(cmd)
-            return read
-        else:
-            self.K34461A.write(cmd)
+        self.set_data_format('ASCII')
+        try:
+            if '?' in cmd:
+                read = self.K34461A.query(cmd)
+                return read
+            else:
+                self.K34461A.write(cmd)
+        finally:
+            self.invalidate()  # 自定义命令（包括 MEAS?、CONF...;:READ? 这类查询）可能改动任意配置，缓存作废
         # device.local()
 
     # def start_scanning(self, interval_time, meas_param):
@@ -0,0 +1,364 @@
+import multiprocessing
+import queue
+import time
+import numpy as np
+from Keysight_34461A import READING_MEMORY
+from data_recorder import DataRecorder
+from event_capture import EventCapture, make_trigger
+from scan_scheduler import DeadlineScheduler
+from session_pool import SessionPool, LINK_ERRORS
+from shared_ring import SharedRing
+
+SOFTWARE_MIN_PERIOD = 0.05  # 软件定时能稳定维持的最短扫描间隔（秒），更短时交给仪器定时器
+INSTRUMENT_STATS_PERIOD = 1.0  # 读取仪器内部统计的最短间隔（秒）
+RING_CAPACITY = 1 << 20  # 共享环形缓冲区容量（条，16 MB）
+
+
+class AcquisitionWorker(object):
+    """独立进程中的扫描采集（界面进程一侧的句柄）
+
+    采集进程自己打开 VISA 会话并运行扫描循环，读数写入共享内存环形缓冲区，界面进程定时 read() 取走；
+    状态、错误和统计通过消息队列传回，停止通过跨进程 Event 通知。两边不共享 GIL：
+    界面重绘拖不慢采集，采集阻塞在总线上也不会卡住界面。
+    环形缓冲区只用于显示，界面跟不上时会丢弃读数；记录文件由采集进程直接从采集循环写入，不经过环形缓冲区。
+    """
+
+    def __init__(self, config, capacity=RING_CAPACITY):
+        # 统一使用 spawn：与 Windows 行为一致，也避免在带 Tk 线程的进程里 fork
+        context = multiprocessing.get_context('spawn')
+        self.ring = SharedRing(capacity)
+        self.stop_event = context.Event()
+        self.messages = context.Queue()
+        self.commands = context.Queue()  # 界面进程 -> 采集进程的控制命令（开始/停止记录）
+        self.process = context.Process(
+            target=run_acquisition,
+            args=(config, self.ring.name, self.stop_event, self.messages, self.commands),
+            daemon=True
+        )
+
+    def start(self):
+        self.process.start()
+
+    def stop(self):
+        """请求停止（立即返回），采集进程在当前读数/数据块结束后退出"""
+        self.stop_event.set()
+
+    def start_recording(self, file_path, metadata=None, log_options=None):
+        """让采集进程开始把读数记录到文件，结束时发回 ('record', 文件路径, 读数条数, 错误信息或 None) 消息"""
+        self.commands.put(('record', file_path, metadata, log_options))
+
+    def stop_recording(self):
+        self.commands.put(('stop_record',))
+
+    def is_alive(self):
+        return self.process.is_alive()
+
+    def read(self):
+        """取出新读数 (时间戳数组, 读数数组)"""
+        return self.ring.read()
+
+    def poll_messages(self):
+        """取出采集进程发来的全部消息"""
+        messages = []
+        while True:
+            try:
+                messages.append(self.messages.get_nowait())
+            except queue.Empty:
+                return messages
+
+    def close(self, timeout=2.0):
+        """停止并回收采集进程；超时未退出时终止进程，最后释放共享内存"""
+        self.stop()
+        self.process.join(timeout)
+        if self.process.is_alive():
+            self.process.terminate()
+            self.process.join()
+        self.ring.close()
+
+
+def run_acquisition(config, ring_name, stop_event, messages, commands):
+    """采集进程入口
+
+    config: address（VISA 地址）、sim（使用仿真仪器）、function（DCV/ACV/DCI/ACI/Res）、
+    interval（扫描间隔，秒）、burst（每次批量点数）、stream（流式采集）、instrument_stats（开启 CALC:AVER）、
+    nplc（直流电压、直流电流和电阻的积分时间，PLC，None 为默认）、autozero（自动调零）、adaptive_range（自适应量程）、
+    timing（逐命令计时，定期发回 ('timing', 统计表) 消息）；
+    hardware_timed 为 True 时改为硬件定时采集：rate（次/秒）、count（点数，0 为连续）、settle（稳定时间，秒）；
+    capture 为事件捕获设置 dict(trigger=条件名, args=条件参数列表, pre=预触发点数, post=后触发点数)，
+    此时只有事件记录中的读数写入环形缓冲区，每个事件另发一条 ('event', 序号, 触发时刻, 触发读数, 点数) 消息；
+    record 为记录设置 dict(path=文件路径, metadata=元数据, log_options=.dml 参数)，扫描开始即记录，
+    扫描中可由 commands 队列开始/停止记录，扫描结束时记录随之结束。
+    interval 短于当前积分时间允许的最短采样间隔时改用该间隔，并发回 ('interval', 实际间隔) 消息。
+    """
+    ring = SharedRing(name=ring_name)
+    scan = _Scan(config, ring, stop_event, messages, commands)
+    try:
+        scan.run()
+    except Exception as e:
+        messages.put(('error', str(e)))
+    finally:
+        scan.close()
+        messages.put(('done',))
+        ring.close()
+
+
+class _Scan(object):
+    #   采集进程内的扫描循环：软件定时逐点/批量扫描，或交给仪器定时的流式扫描；链路中断时重连继续
+
+    def __init__(self, config, ring, stop_event, messages, commands):
+        self.config = config
+        self.ring = ring
+        self.stop_event = stop_event
+        self.messages = messages
+        self.commands = commands
+        self.recorder = None  # 采集进程中的记录线程
+        self.record_path = None
+        self.pool = None
+        self.meter = None
+        self.stats_time = 0.0
+        self.capture = None  # 事件捕获（config['capture'] 非空时在 run() 中创建）
+
+    def post(self, *message):
+        self.messages.put(message)
+
+    def open(self):
+        if self.config.get('sim'):
+            from sim_34461A import SimResourceManager
+            self.pool = SessionPool(SimResourceManager())
+        else:
+            self.pool = SessionPool()
+        self.meter = self.pool.acquire(self.config['address'])
+        if self.config.get('timing'):
+            self.meter.enable_timing()
+
+    def close(self):
+        if self.capture is not None:
+            event = self.capture.flush()
+            if event is not None:
+                self.publish_event(event)
+            self.post('log', f"事件捕获: 共 {self.capture.events} 个事件，"
+                             f"保存 {self.capture.stored} / {self.capture.seen} 个读数")
+        self.handle_commands()
+        self.stop_recording()
+        if self.pool is not None:
+            self.post_timing()
+            for function, stats in (self.meter.range_stats() if self.meter is not None else {}).items():
+                if stats['range'] is None:
+                    continue
+                self.post('log', f"自适应量程({function}): 当前量程 {stats['range']:g}，换档 {stats['changes']} 次，"
+                                 f"自动量程需换档 {stats['autorange_changes']} 次，避免 {stats['avoided']} 次，"
+                                 f"过载 {stats['overloads']} 次")
+            self.pool.close()
+
+    def run(self):
+        capture = self.config.get('capture')
+        if capture:
+            self.capture = EventCapture(make_trigger(capture['trigger'], *capture['args']),
+                                        capture.get('pre', 100), capture.get('post', 100))
+        record = self.config.get('record')
+        if record:
+            self.start_recording(record['path'], record.get('metadata'), record.get('log_options'))
+        self.open()
+        # 先切到扫描功能再设积分时间/自动调零（CONF 会把它们恢复为默认值），整批下发
+        with self.meter.batch():
+            self.meter.conf_function(self.config['function'])
+            if self.config['function'] not in ('ACV', 'ACI'):
+                if self.config.get('nplc') is not None:
+                    self.meter.set_nplc(self.config['nplc'])
+                self.meter.set_autozero(self.config.get('autozero', True))
+        if self.config.get('adaptive_range'):
+            self.meter.set_adaptive_range(True)
+        if self.config.get('instrument_stats'):
+            # 全程统计交给仪器：开启 CALC:AVER，之后的读数都由仪器累计
+            self.meter.set_average(True)
+        interval = self.check_interval()
+        if self.config.get('hardware_timed'):
+            self.hardware_timed()
+        elif self.config.get('stream') or interval < SOFTWARE_MIN_PERIOD:
+            self.stream()
+        else:
+            self.scheduled()
+
+    def check_interval(self):
+        """扫描间隔不能短于当前积分时间决定的最短采样间隔（仪器定时器也无济于事），过短时改为该值并通知界面"""
+        interval = self.config['interval']
+        min_period = self.meter.min_sample_period(self.config['function'])
+        if 0 < interval < min_period and not self.config.get('hardware_timed'):
+            interval = self.config['interval'] = min_period
+            self.post('interval', interval)
+        return interval
+
+    def publish(self, times, values):
+        self.handle_commands()
+        if self.capture is None:
+            self.emit(times, values)
+        else:
+            for event in self.capture.feed(times, values):
+                self.publish_event(event)
+        if time.monotonic() - self.stats_time >= INSTRUMENT_STATS_PERIOD:
+            self.stats_time = time.monotonic()
+            if self.config.get('instrument_stats'):
+                self.post('instrument_stats', self.meter.average_stats())
+            self.post_timing()
+
+    def publish_event(self, event):
+        self.emit(event.times, event.values)
+        self.post('event', event.number, event.trigger_time, event.trigger_value, len(event))
+
+    def emit(self, times, values):
+        #   读数交给记录线程（写盘跟不上时在这里等待，不丢数据），再写入供界面显示的环形缓冲区
+        if self.recorder is not None:
+            try:
+                self.recorder.write(times, values)
+            except Exception:
+                self.stop_recording()  # 记录线程写盘出错，错误随结束消息发回
+        self.ring.write(times, values)
+
+    def handle_commands(self):
+        #   处理界面进程发来的开始/停止记录命令
+        while True:
+            try:
+                command = self.commands.get_nowait()
+            except queue.Empty:
+                return
+            if command[0] == 'record':
+                self.start_recording(*command[1:])
+            elif command[0] == 'stop_record':
+                self.stop_recording()
+
+    def start_recording(self, file_path, metadata=None, log_options=None):
+        self.stop_recording()
+        try:
+            recorder = DataRecorder(file_path, metadata=metadata, log_options=log_options)
+            recorder.start()
+        except Exception as e:
+            self.post('record', file_path, 0, str(e))
+            return
+        self.recorder, self.record_path = recorder, file_path
+        self.post('log', f"开始记录到 {file_path}")
+
+    def stop_recording(self):
+        recorder, self.recorder = self.recorder, None
+        if recorder is None:
+            return
+        recorder.close()
+        self.post('record', self.record_path, recorder.count,
+                  None if recorder.error is None else str(recorder.error))
+
+    def post_timing(self):
+        if self.meter is not None and self.meter.timing is not None:
+            self.post('timing', self.meter.timing.summary())
+
+    def scheduled(self):
+        function = self.config['function']
+        burst = self.config.get('burst', 1)
+        interval = self.config['interval']
+        # 按 monotonic 截止时刻调度，测量耗时自动从等待时间中扣除
+        scheduler = DeadlineScheduler(interval, self.stop_event)
+        try:
+            for tick, scheduled_time in scheduler:
+                try:
+                    start_time = time.time()
+                    if burst > 1:
+                        # 批量模式：一次往返取回整块读数，读数时刻按批量起止时间均匀分布
+                        values = self.meter.burst(function, burst, stop_event=self.stop_event)
+                        times = np.linspace(start_time, time.time(), len(values))
+                    else:
+                        values = [self.meter.read_value(function)]
+                        times = [time.time()]
+                    if self.stop_event.is_set():
+                        break
+                    self.publish(times, values)
+                except LINK_ERRORS as e:
+                    if not self.reconnect(e):
+                        break
+
+                if scheduler.should_hand_off():
+                    self.post('log', f"软件定时无法维持 {interval}s 的扫描间隔，切换为仪器定时采样")
+                    self.stream()
+                    break
+        finally:
+            if scheduler.ticks:
+                self.post('log', "扫描调度统计: " + scheduler.summary())
+
+    def hardware_timed(self):
+        """硬件定时采集：点数不超过读数存储器时一次采完，否则（或连续采集时）边采边取；时间戳由定时器推算"""
+        function = self.config['function']
+        rate = self.config['rate']
+        count = self.config['count']
+        settle = self.config.get('settle', 0.0)
+        if 0 < count <= READING_MEMORY:
+            times, values = self.meter.timed(function, rate, count, settle, stop_event=self.stop_event)
+            if len(values):
+                self.publish(times, values)
+            self.post('log', f"硬件定时采集完成：{len(values)} 个读数，{rate:g} 次/秒")
+            return
+
+        min_period = self.meter.min_sample_period(function)
+        if 1.0 / rate < min_period:
+            raise ValueError(f'采样率 {rate:g} 次/秒超出当前积分时间允许的上限 {1.0 / min_period:.4g} 次/秒')
+        chunk = min(max(int(rate * 0.1), 1), READING_MEMORY)
+        stream = self.meter.stream(function, rate, chunk, self.stop_event, settle=settle)
+        produced = 0
+        try:
+            for values in stream:
+                times = self.meter.init_time + settle + (produced + np.arange(len(values))) / rate
+                if count:
+                    values, times = values[:count - produced], times[:count - produced]
+                produced += len(values)
+                self.publish(times, values)
+                if count and produced >= count:
+                    break
+        finally:
+            stream.close()
+
+    def stream(self):
+        """流式扫描：消费驱动的 stream 生成器，链路中断时重新连接后从头开始"""
+        function = self.config['function']
+        interval = self.config['interval']
+        chunk = max(self.config.get('burst', 1), 1)
+        rate = 1.0 / interval if interval > 0 else None
+        if rate:
+            chunk = max(chunk, int(rate * 0.1))  # 高速率时至少攒0.1秒的读数再取回，避免频繁往返
+        while not self.stop_event.is_set():
+            stream = self.meter.stream(function, rate, chunk, self.stop_event)
+            last_time = time.time()
+            produced = 0
+            try:
+                for values in stream:
+                    if self.stop_event.is_set():
+                        break
+                    # 定时采样时读数时刻由 INIT 时刻和采样周期推算，否则在两次取回之间均匀分布
+                    now = time.time()
+                    if rate:
+                        times = self.meter.init_time + (produced + np.arange(len(values))) * interval
+                    else:
+                        times = np.linspace(last_time, now, len(values) + 1)[1:]
+                    last_time = now
+                    produced += len(values)
+                    self.publish(times, values)
+            except LINK_ERRORS as e:
+                try:
+                    stream.close()
+                except LINK_ERRORS:
+                    pass  # 链路已断开，ABOR 发不出去
+                if self.reconnect(e):
+                    continue
+                break
+            finally:
+                stream.close()
+            break
+
+    def reconnect(self, error):
+        """链路中断：按退避策略重新连接并恢复配置，成功返回 True"""
+        self.post('log', f"连接中断: {str(error)}，正在重新连接…")
+        self.post('status', "连接中断，正在重新连接…", "orange")
+
+        def on_retry(attempt, e, delay):
+            self.post('log', f"第{attempt}次重连失败: {str(e)}，{delay:g}s 后重试")
+
+        if self.pool.recover(self.meter, self.stop_event, on_retry=on_retry):
+            self.post('log', "已重新连接，配置已恢复，继续扫描")
+            self.post('status', f"已连接至 {self.meter.address}", "green")
+            return True
+        return False
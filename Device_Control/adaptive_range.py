@@ -0,0 +1,115 @@
+import math
+from running_stats import OVERLOAD
+
+# 各功能的量程（满量程值），仪器允许超量程 20%
+RANGES = {
+    'DCV': (0.1, 1, 10, 100, 1000),
+    'ACV': (0.1, 1, 10, 100, 750),
+    'DCI': (1e-4, 1e-3, 1e-2, 0.1, 1, 3),
+    'ACI': (1e-4, 1e-3, 1e-2, 0.1, 1, 3),
+    'Res': (1e2, 1e3, 1e4, 1e5, 1e6, 1e7, 1e8),
+}
+OVER_RANGE = 1.2  # 超过量程的 120% 即为过载
+AUTORANGE_DOWN = 0.1  # 仪器自动量程在读数低于量程的 10% 时降档
+
+
+class RangeController(object):
+    """自适应量程：按最近读数的幅度固定量程，只在必要时换档
+
+    第一个读数（自动量程下测得）决定初始量程：能以 headroom 余量容纳该读数的最小量程。
+    之后量程保持不变，只有两种情况才换档：
+    读数过载（9.9E37）时立即升一档；连续 patience 个读数都超出当前量程（进入超量程区），
+    或都能以余量放进更低的量程时，换到能容纳这段读数峰值的量程。
+
+    同时按仪器自动量程的规则（超过 120% 升档、低于 10% 降档）模拟同一串读数，
+    两者换档次数之差即为避免的换档次数（avoided）。
+    """
+
+    def __init__(self, function, headroom=0.25, patience=20):
+        self.ranges = RANGES[function]
+        self.headroom = headroom
+        self.patience = patience
+        self.range = None  # 当前固定的量程，None 表示尚未学习
+        self.above = self.below = 0  # 连续超出当前量程 / 可降档的读数数
+        self.peak = 0.0  # 这段连续读数的峰值（绝对值）
+        self.changes = 0  # 实际换档次数（不含首次固定量程）
+        self.overloads = 0
+        self.autorange = None  # 模拟的自动量程所在档位（下标）
+        self.autorange_changes = 0
+
+    @property
+    def avoided(self):
+        return max(self.autorange_changes - self.changes, 0)
+
+    def fit(self, peak):
+        """能以 headroom 余量容纳 peak 的最小量程"""
+        need = peak * (1 + self.headroom)
+        for value in self.ranges:
+            if value >= need:
+                return value
+        return self.ranges[-1]
+
+    def update(self, values):
+        """送入一批读数，需要换档时返回新量程，否则返回 None"""
+        previous = self.range
+        for value in values:
+            if math.isnan(value) or abs(value) >= OVERLOAD:
+                self._overload()
+            else:
+                self._observe(abs(value))
+        return self.range if self.range != previous else None
+
+    def _overload(self):
+        #   过载读数的幅度未知：升一档后重新积累，已在最高档时保持不变
+        self.overloads += 1
+        self.above = self.below = 0
+        if self.range is None:
+            self.range = self.ranges[-1]
+        elif self.range != self.ranges[-1]:
+            self.range = self.ranges[self.ranges.index(self.range) + 1]
+            self.changes += 1
+
+    def _observe(self, magnitude):
+        self._autorange(magnitude)
+        if self.range is None:
+            self.range = self.fit(magnitude)
+            return
+        target = self.fit(magnitude)
+        if magnitude > self.range:
+            self.above, self.below = self.above + 1, 0
+        elif target < self.range:
+            self.above, self.below = 0, self.below + 1
+        else:
+            self.above = self.below = 0
+            self.peak = 0.0
+            return
+        self.peak = max(self.peak, magnitude)
+        if self.above >= self.patience or self.below >= self.patience:
+            self.range = self.fit(self.peak)
+            self.changes += 1
+            self.above = self.below = 0
+            self.peak = 0.0
+
+    def _autorange(self, magnitude):
+        #   仪器自动量程的换档规则，用于统计避免的换档次数
+        ranges = self.ranges
+        if self.autorange is None:
+            self.autorange = next((i for i, r in enumerate(ranges) if magnitude <= r * OVER_RANGE), len(ranges) - 1)
+            return
+        index = self.autorange
+        while index < len(ranges) - 1 and magnitude > ranges[index] * OVER_RANGE:
+            index += 1
+        while index > 0 and magnitude < ranges[index] * AUTORANGE_DOWN:
+            index -= 1
+        if index != self.autorange:
+            self.autorange = index
+            self.autorange_changes += 1
+
+    def as_dict(self):
+        return {
+            'range': self.range,
+            'changes': self.changes,
+            'autorange_changes': self.autorange_changes,
+            'avoided': self.avoided,
+            'overloads': self.overloads,
+        }
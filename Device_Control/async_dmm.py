@@ -0,0 +1,157 @@
+"""DMM34461A 的 asyncio 接口
+
+pyvisa 本身只有阻塞调用，这里把每次总线往返（写配置、查询 DATA:POIN?、取回读数块）作为短任务放到
+线程池中执行，采集过程中的等待一律用 asyncio.sleep，不占用线程。一个事件循环可以同时驱动多台仪器
+和后续处理流程，线程数只取决于同时进行的总线往返数，而不是仪器数量。
+
+    async def main():
+        meters = [AsyncDMM34461A(rm=rm) for _ in addresses]
+        await asyncio.gather(*(m.connect(a) for m, a in zip(meters, addresses)))
+        values = await asyncio.gather(*(m.burst('DCV', 1000) for m in meters))
+
+取消（任务被 cancel 或超时）时向仪器发送 ABOR 并清除总线（设备清除），仪器立即回到空闲状态，
+可以马上开始下一次采集。超时按当前积分时间、自动调零和采样点数估算。
+"""
+
+import asyncio
+import functools
+import threading
+from Keysight_34461A import DMM34461A
+
+TIMEOUT_FACTOR = 2.0  # 超时 = 预计采集时间 × 系数 + 余量
+TIMEOUT_MARGIN = 2.0  # 秒，覆盖总线往返和仪器处理开销
+MIN_POLL_INTERVAL = 0.005  # 秒
+
+
+class AsyncDMM34461A(object):
+    """DMM34461A 的异步包装
+
+    同一台仪器上的操作按调用顺序串行执行（asyncio.Lock），不同仪器之间并发；
+    总线往返在 executor（缺省为事件循环的默认线程池）中执行。
+    meter 可传入已有的 DMM34461A（例如会话池中的会话），否则按 rm 新建。
+    """
+
+    def __init__(self, meter=None, rm=None, executor=None):
+        self.meter = meter if meter is not None else DMM34461A(rm)
+        self.executor = executor
+        self.lock = asyncio.Lock()
+        # 取消只会放弃等待，线程中的总线往返仍会做完；中止命令要等它结束后再发，避免两个线程同时访问会话
+        self.bus_lock = threading.Lock()
+
+    async def _call(self, func, *args, **kwargs):
+        #   在线程池中执行一次阻塞调用
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, functools.partial(self._locked, func, *args, **kwargs))
+
+    def _locked(self, func, *args, **kwargs):
+        with self.bus_lock:
+            return func(*args, **kwargs)
+
+    async def connect(self, address):
+        async with self.lock:
+            await self._call(self.meter.connect, address)
+
+    async def close(self):
+        async with self.lock:
+            if self.meter.K34461A is not None:
+                await self._call(self.meter.local)
+                await self._call(self.meter.K34461A.close)
+
+    async def configure(self, function, range=None, nplc=None, autozero=None):
+        """设置测量功能及可选的量程、积分时间（PLC）和自动调零，整批下发并检查仪器错误"""
+        def configure():
+            with self.meter.batch():
+                self.meter.conf_function(function)
+                if range is not None:
+                    self.meter.set_range(range)
+                if nplc is not None:
+                    self.meter.set_nplc(nplc)
+                if autozero is not None:
+                    self.meter.set_autozero(autozero)
+
+        async with self.lock:
+            await self._call(configure)
+
+    async def reading_period(self, function):
+        """按当前配置估算的单个读数耗时（秒）"""
+        return await self._call(self.meter.min_sample_period, function)
+
+    def timeout_for(self, period, count):
+        """count 个读数、每个读数 period 秒的采集超时"""
+        return count * period * TIMEOUT_FACTOR + TIMEOUT_MARGIN
+
+    async def measure(self, function, timeout=None):
+        """测量一次，返回读数"""
+        values = await self.burst(function, 1, timeout=timeout)
+        return float(values[0])
+
+    async def burst(self, function, count, trig_count=1, timeout=None):
+        """硬件缓存批量采集，返回 numpy 数组
+
+        INIT 后先等待预计的采集时间，再以约 1/10 采集时间的间隔轮询 DATA:POIN?；
+        timeout 缺省按积分时间和点数估算。超时抛出 asyncio.TimeoutError，超时或取消时仪器被中止。
+        """
+        async with self.lock:
+            period = await self._call(self.meter.min_sample_period, function)
+            total = count * trig_count
+            if timeout is None:
+                timeout = self.timeout_for(period, total)
+            try:
+                return await asyncio.wait_for(self._burst(function, count, trig_count, period), timeout)
+            except (asyncio.CancelledError, asyncio.TimeoutError):
+                await self._abort()
+                raise
+
+    async def _burst(self, function, count, trig_count, period):
+        total = await self._call(self.meter.arm_burst, function, count, trig_count)
+        expected = total * period
+        await asyncio.sleep(expected)
+        poll_interval = max(expected / 10, MIN_POLL_INTERVAL)
+        while int(await self._call(self.meter.K34461A.query, 'DATA:POIN?')) < total:
+            await asyncio.sleep(poll_interval)
+        return await self._call(self.meter.fetch_burst, function, total)
+
+    async def stream(self, function, rate=None, chunk=1000):
+        """连续流式采集的异步生成器，async for 逐块取得长度为 chunk 的 numpy 数组
+
+        读数存储器中攒够 chunk 个读数就用 R? 取走；超过按积分时间（或采样率）估算的一块时间仍未攒够时
+        抛出 asyncio.TimeoutError。aclose() 时发送 ABOR 停止采集，超时或任务取消时另外清除总线。
+        生成器运行期间占用这台仪器，提前退出循环时应 aclose()（或用 contextlib.aclosing 包装）以便立即释放。
+        """
+        async with self.lock:
+            period = await self._call(self.meter.min_sample_period, function)
+            if rate:
+                period = max(period, 1.0 / rate)
+            timeout = self.timeout_for(period, chunk)
+            poll_interval = min(max(chunk * period / 4, MIN_POLL_INTERVAL), 0.5)
+            await self._call(self.meter.arm_stream, function, rate, chunk)
+            loop = asyncio.get_running_loop()
+            aborted = False
+            try:
+                deadline = loop.time() + timeout
+                while True:
+                    points = int(await self._call(self.meter.K34461A.query, 'DATA:POIN?'))
+                    if points < chunk:
+                        if loop.time() > deadline:
+                            raise asyncio.TimeoutError(f'{timeout:.3g}s 内未采集到 {chunk} 个读数')
+                        await asyncio.sleep(poll_interval)
+                        continue
+                    for _ in range(points // chunk):
+                        yield await self._call(self.meter.fetch_array, f'R? {chunk}', chunk)
+                    deadline = loop.time() + timeout
+            except (asyncio.CancelledError, asyncio.TimeoutError):
+                aborted = True
+                await self._abort()
+                raise
+            finally:
+                if not aborted:
+                    await asyncio.shield(self._call(self.meter.K34461A.write, 'ABOR'))
+
+    async def _abort(self):
+        #   中止采集并清除总线：ABOR 停止触发系统，设备清除丢弃输出缓冲区中未读走的响应
+        def abort():
+            self.meter.K34461A.write('ABOR')
+            self.meter.K34461A.clear()
+
+        await asyncio.shield(self._call(abort))
+
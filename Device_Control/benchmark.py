@@ -0,0 +1,224 @@
+"""DMM34461A 驱动与扫描路径的吞吐/延迟基准测试
+
+默认连接进程内仿真仪器（sim_34461A），也可用 --address 指定真实仪器，或用 --trace 回放
+记录下来的 .dmc 采集文件作为仿真信号。对每种采集路径、测量功能、积分时间和分块大小的组合，
+统计读数速率、单次操作延迟分位数和每个读数的 CPU 时间（扣除进程内仿真仪器自身的 CPU 时间），结果以 JSON 输出；
+指定 --baseline 时与历史结果比较，读数速率下降超过容差即以非零状态退出。
+
+示例：
+    python benchmark.py --functions DCV,Res --nplc 0.02,1 --chunks 100,1000 -o result.json
+    python benchmark.py -o new.json --baseline result.json --tolerance 0.1
+"""
+
+import argparse
+import json
+import platform
+import sys
+import time
+import numpy as np
+from Keysight_34461A import DMM34461A, FUNCTIONS
+
+PATHS = ('meas', 'measurement', 'burst_ascii', 'burst_binary', 'stream')
+POLL_INTERVAL = 0.05  # 秒，驱动 burst()/stream() 的默认轮询间隔，仿真加速时按同一比例缩短
+
+
+def trace_signal(file_path):
+    """把 .dmc 采集文件中的读数作为仿真信号循环回放"""
+    from capture_file import CaptureReader
+    with CaptureReader(file_path) as reader:
+        _, values = reader.query()
+    values = np.array(values)
+    position = [0]
+
+    def signal(function, times):
+        index = (position[0] + np.arange(len(times))) % len(values)
+        position[0] = int(index[-1]) + 1 if len(times) else position[0]
+        return values[index]
+    return signal
+
+
+def open_meter(args):
+    if args.address:
+        meter = DMM34461A()
+        meter.connect(args.address)
+        return meter
+    from sim_34461A import SimResourceManager, LatencyModel, SIM_ADDRESS
+    signal = trace_signal(args.trace) if args.trace else None
+    meter = DMM34461A(SimResourceManager(LatencyModel(time_scale=args.time_scale), signal))
+    meter.connect(SIM_ADDRESS)
+    return meter
+
+
+def sim_cpu_time(meter):
+    #   进程内仿真仪器消耗的 CPU 时间，真实仪器为0
+    return getattr(meter.K34461A, 'cpu_time', 0.0)
+
+
+def run_case(meter, path, function, nplc, chunk, readings, time_scale=1.0):
+    """运行一个测试组合，返回结果字典
+
+    time_scale 为仿真时间与真实时间之比：主机轮询间隔按同一比例缩短，各路径之间的比较才与真实仪器一致。
+    """
+    meter.invalidate()
+    meter.conf_function(function)
+    if nplc is not None:
+        meter.set_volt_aperture(nplc)
+    meter.binary_transfer = path != 'burst_ascii'
+    poll_interval = POLL_INTERVAL * time_scale
+
+    latencies = []
+    count = 0
+    sim_start = sim_cpu_time(meter)
+    cpu_start = time.process_time()
+    start = last = time.perf_counter()
+    if path == 'meas':
+        # 每个读数一次完整的 MEAS? 查询（重新配置+触发+往返）
+        cmd = 'MEAS:' + FUNCTIONS[function] + '?'
+        for _ in range(readings):
+            float(meter.K34461A.query(cmd))
+            now = time.perf_counter()
+            latencies.append(now - last)
+            last = now
+        count = readings
+        meter.invalidate()
+    elif path == 'measurement':
+        for _ in range(readings):
+            meter.measurement(function)
+            now = time.perf_counter()
+            latencies.append(now - last)
+            last = now
+        count = readings
+    elif path in ('burst_ascii', 'burst_binary'):
+        while count < readings:
+            count += len(meter.burst(function, min(chunk, readings - count), poll_interval=poll_interval))
+            now = time.perf_counter()
+            latencies.append(now - last)
+            last = now
+    elif path == 'stream':
+        stream = meter.stream(function, None, chunk, poll_interval=poll_interval)
+        for values in stream:
+            count += len(values)
+            now = time.perf_counter()
+            latencies.append(now - last)
+            last = now
+            if count >= readings:
+                break
+        stream.close()
+    elapsed = time.perf_counter() - start
+    cpu = time.process_time() - cpu_start
+    sim_cpu = sim_cpu_time(meter) - sim_start
+
+    latencies = np.array(latencies) * 1000.0
+    return {
+        'path': path,
+        'function': function,
+        'nplc': nplc,
+        'chunk': chunk,
+        'readings': count,
+        'operations': len(latencies),
+        'seconds': elapsed,
+        'readings_per_s': count / elapsed if elapsed > 0 else float('inf'),
+        'latency_ms_p50': float(np.percentile(latencies, 50)),
+        'latency_ms_p90': float(np.percentile(latencies, 90)),
+        'latency_ms_p99': float(np.percentile(latencies, 99)),
+        'cpu_us_per_reading': (cpu - sim_cpu) / count * 1e6,  # 驱动及主机侧开销
+        'sim_cpu_us_per_reading': sim_cpu / count * 1e6,
+    }
+
+
+def iter_cases(args):
+    #   展开测试组合：逐点路径不区分分块大小，MEAS? 每次都恢复默认积分时间，积分时间只对直流电压有效
+    for path in args.paths:
+        for function in args.functions:
+            nplcs = args.nplc if function == 'DCV' and path != 'meas' else [None]
+            chunks = args.chunks if path in ('burst_ascii', 'burst_binary', 'stream') else [1]
+            for nplc in nplcs:
+                for chunk in chunks:
+                    yield path, function, nplc, chunk
+
+
+def case_key(result):
+    return result['path'], result['function'], result['nplc'], result['chunk']
+
+
+def compare(results, baseline_path, tolerance):
+    """与基线结果比较，返回读数速率下降超过容差的条目"""
+    with open(baseline_path, encoding='utf-8') as f:
+        baseline = {case_key(r): r for r in json.load(f)['results']}
+    regressions = []
+    for result in results:
+        old = baseline.get(case_key(result))
+        if old is None:
+            continue
+        change = result['readings_per_s'] / old['readings_per_s'] - 1
+        if change < -tolerance:
+            regressions.append((result, old, change))
+    return regressions
+
+
+def parse_list(text, cast=str):
+    return [cast(x) for x in text.split(',') if x]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='DMM34461A 吞吐/延迟基准测试')
+    parser.add_argument('--address', help='真实仪器 VISA 地址，缺省时使用仿真仪器')
+    parser.add_argument('--trace', help='作为仿真信号回放的 .dmc 采集文件')
+    parser.add_argument('--time-scale', type=float, default=1.0,
+                        help='仿真时间与真实时间之比，小于1时加速，主机轮询间隔同比缩短（默认1.0）')
+    parser.add_argument('--paths', type=parse_list, default=list(PATHS))
+    parser.add_argument('--functions', type=parse_list, default=list(FUNCTIONS))
+    parser.add_argument('--nplc', type=lambda s: parse_list(s, float), default=[0.02, 0.2, 1],
+                        help='直流电压积分时间（set_volt_aperture 支持的 PLC 值）')
+    parser.add_argument('--chunks', type=lambda s: parse_list(s, int), default=[100, 1000])
+    parser.add_argument('--readings', type=int, default=200, help='每个组合采集的读数数量')
+    parser.add_argument('-o', '--output', help='结果 JSON 文件，缺省输出到标准输出')
+    parser.add_argument('--baseline', help='用于比较的历史结果 JSON 文件')
+    parser.add_argument('--tolerance', type=float, default=0.1, help='允许的读数速率下降比例')
+    args = parser.parse_args(argv)
+
+    meter = open_meter(args)
+    results = []
+    try:
+        for path, function, nplc, chunk in iter_cases(args):
+            result = run_case(meter, path, function, nplc, chunk, args.readings,
+                              1.0 if args.address else args.time_scale)
+            results.append(result)
+            print(f"{path:13s} {function:4s} nplc={nplc} chunk={chunk}: "
+                  f"{result['readings_per_s']:.1f} rdg/s, p99 {result['latency_ms_p99']:.2f} ms, "
+                  f"{result['cpu_us_per_reading']:.1f} us CPU/rdg "
+                  f"(仿真 {result['sim_cpu_us_per_reading']:.1f} us)", file=sys.stderr)
+    finally:
+        meter.K34461A.close()
+
+    report = {
+        'meta': {
+            'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'address': args.address or 'SIM',
+            'trace': args.trace,
+            'time_scale': None if args.address else args.time_scale,
+            'readings': args.readings,
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+        },
+        'results': results,
+    }
+    text = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text)
+    else:
+        print(text)
+
+    if args.baseline:
+        regressions = compare(results, args.baseline, args.tolerance)
+        for result, old, change in regressions:
+            print(f"性能回退: {case_key(result)} {old['readings_per_s']:.1f} -> "
+                  f"{result['readings_per_s']:.1f} rdg/s ({change:+.1%})", file=sys.stderr)
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,245 @@
+"""采集文件格式（.dmc）
+
+    文件头    FILE_HEADER：魔数、每块行数、元数据长度，随后是 JSON 元数据（补齐到8字节）
+    数据块    CHUNK_HEADER：块标记、本块行数；随后是 count 个 float64 时间戳列和 count 个 float64 读数列
+    ……
+    索引      INDEX_DTYPE 数组，每块一条：偏移、行数、有效读数数、起止时间、最小/最大/平均值
+    文件尾    FOOTER：索引偏移、块数、索引魔数
+
+所有数值均为小端序。除最后一块外每块都是 chunk_rows 行。文件尾缺失（如记录过程中崩溃）时，
+读取端顺序遍历数据块重建索引。
+"""
+
+import json
+import mmap
+import os
+import struct
+import numpy as np
+from running_stats import OVERLOAD
+
+FILE_MAGIC = b'DMMCAP01'
+INDEX_MAGIC = b'DMMCAPIX'
+FILE_HEADER = struct.Struct('<8sII')
+CHUNK_MAGIC = b'CHNK'
+CHUNK_HEADER = struct.Struct('<4sI')
+FOOTER = struct.Struct('<QQ8s')
+INDEX_DTYPE = np.dtype([
+    ('offset', '<u8'),
+    ('count', '<u8'),
+    ('valid', '<u8'),
+    ('t_start', '<f8'),
+    ('t_end', '<f8'),
+    ('min', '<f8'),
+    ('max', '<f8'),
+    ('mean', '<f8'),
+])
+
+
+def _summary(values):
+    #   计算一段读数的有效条数和最小/最大/平均值，忽略过载读数
+    valid = values[np.abs(values) < OVERLOAD]
+    if len(valid) == 0:
+        return 0, np.nan, np.nan, np.nan
+    return len(valid), valid.min(), valid.max(), valid.mean()
+
+
+class CaptureWriter(object):
+    """按固定行数分块写入采集文件，close() 时写入索引和文件尾"""
+
+    index_dtype = INDEX_DTYPE
+    index_magic = INDEX_MAGIC
+
+    def __init__(self, file_path, chunk_rows=4096, metadata=None):
+        self.chunk_rows = chunk_rows
+        self.file = open(file_path, 'wb')
+        meta = json.dumps(metadata or {}, ensure_ascii=False).encode('utf-8')
+        meta += b' ' * (-(FILE_HEADER.size + len(meta)) % 8)  # 使数据块按8字节对齐
+        self.file.write(FILE_HEADER.pack(FILE_MAGIC, chunk_rows, len(meta)) + meta)
+        self.times = np.empty(chunk_rows)
+        self.values = np.empty(chunk_rows)
+        self.pending = 0  # 缓冲区中尚未写出的行数
+        self.index = []
+        self.count = 0  # 已写出的总行数
+
+    def append(self, times, values):
+        """追加读数，凑满一块即写出"""
+        times = np.asarray(times, dtype=np.float64)
+        values = np.asarray(values, dtype=np.float64)
+        pos = 0
+        while pos < len(values):
+            n = min(self.chunk_rows - self.pending, len(values) - pos)
+            self.times[self.pending:self.pending + n] = times[pos:pos + n]
+            self.values[self.pending:self.pending + n] = values[pos:pos + n]
+            self.pending += n
+            pos += n
+            if self.pending == self.chunk_rows:
+                self._write_chunk()
+
+    def sync(self):
+        """把已写出的数据块同步到磁盘（缓冲区中不足一块的数据不写出）"""
+        self.file.flush()
+        os.fsync(self.file.fileno())
+
+    def close(self):
+        """写出剩余数据、索引和文件尾"""
+        if self.file.closed:
+            return
+        if self.pending:
+            self._write_chunk()
+        index_offset = self.file.tell()
+        self.file.write(np.array(self.index, dtype=self.index_dtype).tobytes())
+        self.file.write(FOOTER.pack(index_offset, len(self.index), self.index_magic))
+        self.sync()
+        self.file.close()
+
+    def _write_chunk(self):
+        n = self.pending
+        times, values = self.times[:n], self.values[:n]
+        offset = self.file.tell()
+        self.file.write(CHUNK_HEADER.pack(CHUNK_MAGIC, n))
+        self.file.write(times.tobytes())
+        self.file.write(values.tobytes())
+        valid, vmin, vmax, mean = _summary(values)
+        self.index.append((offset, n, valid, times[0], times[-1], vmin, vmax, mean))
+        self.count += n
+        self.pending = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+class CaptureReader(object):
+    """以内存映射方式读取采集文件
+
+    数据块直接以 numpy 视图访问，不会整体载入内存；时间区间查询先用索引中的
+    起止时间定位数据块，统计查询对完整覆盖的数据块直接使用索引中的摘要。
+    要求时间戳单调递增。
+    """
+
+    index_dtype = INDEX_DTYPE
+    index_magic = INDEX_MAGIC
+
+    def __init__(self, file_path):
+        self.file = open(file_path, 'rb')
+        self.mm = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.chunk_rows, meta_len = FILE_HEADER.unpack_from(self.mm, 0)
+        if magic != FILE_MAGIC:
+            self.close()
+            raise ValueError('不是有效的采集文件')
+        self.metadata = json.loads(self.mm[FILE_HEADER.size:FILE_HEADER.size + meta_len] or b'{}')
+        self.data_offset = FILE_HEADER.size + meta_len
+        self.index = self._load_index()
+
+    def _load_index(self):
+        size = len(self.mm)
+        if size >= self.data_offset + FOOTER.size:
+            index_offset, n_chunks, magic = FOOTER.unpack_from(self.mm, size - FOOTER.size)
+            if magic == self.index_magic:
+                return np.frombuffer(self.mm, dtype=self.index_dtype, count=n_chunks, offset=index_offset)
+        return self._rebuild_index()
+
+    def _rebuild_index(self):
+        #   文件尾缺失：顺序遍历完整的数据块重建索引
+        entries = []
+        offset, size = self.data_offset, len(self.mm)
+        while offset + CHUNK_HEADER.size <= size:
+            magic, n = CHUNK_HEADER.unpack_from(self.mm, offset)
+            end = offset + CHUNK_HEADER.size + 16 * n
+            if magic != CHUNK_MAGIC or n == 0 or end > size:
+                break
+            entries.append(offset)
+            offset = end
+        index = np.zeros(len(entries), dtype=INDEX_DTYPE)
+        for i, offset in enumerate(entries):
+            times, values = self._chunk_at(offset)
+            valid, vmin, vmax, mean = _summary(values)
+            index[i] = (offset, len(values), valid, times[0], times[-1], vmin, vmax, mean)
+        return index
+
+    def _chunk_at(self, offset):
+        n = CHUNK_HEADER.unpack_from(self.mm, offset)[1]
+        start = offset + CHUNK_HEADER.size
+        times = np.frombuffer(self.mm, dtype='<f8', count=n, offset=start)
+        values = np.frombuffer(self.mm, dtype='<f8', count=n, offset=start + 8 * n)
+        return times, values
+
+    def __len__(self):
+        return int(self.index['count'].sum())
+
+    def chunk(self, i):
+        """第 i 块的 (时间戳, 读数) 只读视图"""
+        return self._chunk_at(int(self.index['offset'][i]))
+
+    def iter_chunks(self):
+        for i in range(len(self.index)):
+            yield self.chunk(i)
+
+    def time_span(self):
+        """整个文件的 (起始时间, 结束时间)"""
+        if len(self.index) == 0:
+            return None
+        return float(self.index['t_start'][0]), float(self.index['t_end'][-1])
+
+    def _chunk_range(self, t_start, t_end):
+        #   与 [t_start, t_end] 有交集的数据块编号范围
+        first = 0 if t_start is None else np.searchsorted(self.index['t_end'], t_start, 'left')
+        last = len(self.index) if t_end is None else np.searchsorted(self.index['t_start'], t_end, 'right')
+        return int(first), int(last)
+
+    def query(self, t_start=None, t_end=None):
+        """返回时间区间 [t_start, t_end] 内的 (时间戳, 读数)"""
+        first, last = self._chunk_range(t_start, t_end)
+        times, values = [], []
+        for i in range(first, last):
+            t, v = self.chunk(i)
+            lo = 0 if t_start is None else np.searchsorted(t, t_start, 'left')
+            hi = len(t) if t_end is None else np.searchsorted(t, t_end, 'right')
+            times.append(t[lo:hi])
+            values.append(v[lo:hi])
+        if not times:
+            return np.empty(0), np.empty(0)
+        return np.concatenate(times), np.concatenate(values)
+
+    def summary(self, t_start=None, t_end=None):
+        """时间区间内有效读数的条数、最小/最大/平均值（完整覆盖的数据块直接使用索引摘要）"""
+        first, last = self._chunk_range(t_start, t_end)
+        parts = []  # (有效条数, 最小, 最大, 平均)
+        for i in range(first, last):
+            entry = self.index[i]
+            inside = (t_start is None or entry['t_start'] >= t_start) and \
+                     (t_end is None or entry['t_end'] <= t_end)
+            if inside:
+                parts.append((int(entry['valid']), entry['min'], entry['max'], entry['mean']))
+                continue
+            t, v = self.chunk(i)
+            lo = 0 if t_start is None else np.searchsorted(t, t_start, 'left')
+            hi = len(t) if t_end is None else np.searchsorted(t, t_end, 'right')
+            parts.append(_summary(v[lo:hi]))
+
+        parts = [p for p in parts if p[0]]
+        if not parts:
+            return {'count': 0, 'min': np.nan, 'max': np.nan, 'mean': np.nan}
+        counts = np.array([p[0] for p in parts], dtype=np.float64)
+        return {
+            'count': int(counts.sum()),
+            'min': float(min(p[1] for p in parts)),
+            'max': float(max(p[2] for p in parts)),
+            'mean': float(np.dot(counts, [p[3] for p in parts]) / counts.sum()),
+        }
+
+    def close(self):
+        self.index = None
+        try:
+            self.mm.close()
+        except BufferError:
+            pass  # 调用方仍持有数据块视图，映射随视图一起释放
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
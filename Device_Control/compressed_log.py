@@ -0,0 +1,180 @@
+"""压缩长期记录格式（.dml）
+
+    文件头    FILE_HEADER：魔数、每块行数、压缩算法、时间分辨率、读数分辨率（0 为无损）、元数据长度，
+              随后是 JSON 元数据（补齐到8字节）
+    数据块    BLOCK_HEADER：块标记、本块行数、读数编码、压缩后长度；随后是压缩后的数据：
+              时间戳 —— 按时间分辨率取整后的二阶差分（固定采样间隔时几乎全为0）；
+              读数   —— 缩放整数编码（按读数分辨率取整后的一阶差分）或 XOR 浮点编码（与前一读数的位异或）；
+              两列都按字节重排（同一字节位的数据放在一起）后整体用 zlib / lzma 压缩
+    ……
+    索引      与 .dmc 相同的 INDEX_DTYPE，每块一条：偏移、行数、有效读数数、起止时间、最小/最大/平均值
+    文件尾    FOOTER：索引偏移、块数、索引魔数
+
+每块独立压缩、独立解码，按索引可直接定位到任意块；写入和读取都逐块流式进行。
+缩放整数编码是有损的（误差不超过读数分辨率的一半），块中含过载/NaN 读数或超出整数范围时该块自动改用
+无损的 XOR 编码；读数分辨率为0时全部使用 XOR 编码。文件尾缺失时读取端顺序遍历数据块重建索引。
+"""
+
+import json
+import lzma
+import mmap
+import struct
+import zlib
+import numpy as np
+from capture_file import CaptureWriter, CaptureReader, INDEX_DTYPE, _summary
+
+FILE_MAGIC = b'DMMLOG01'
+INDEX_MAGIC = b'DMMLOGIX'
+FILE_HEADER = struct.Struct('<8sIB3xddI')
+BLOCK_MAGIC = b'BLCK'
+BLOCK_HEADER = struct.Struct('<4sIB3xI')
+CODECS = {'zlib': 0, 'lzma': 1}
+SCALED, XOR = 0, 1  # 读数编码
+MAX_SCALED = 2 ** 53  # 缩放后的整数超过此值时 float64 无法精确还原
+
+
+def _shuffle(array):
+    #   按字节重排：把各元素的第 k 个字节放在一起，差分/异或后的高位字节大多为0，压缩效果更好
+    return array.view(np.uint8).reshape(-1, 8).T.tobytes()
+
+
+def _unshuffle(data, n, dtype):
+    return np.frombuffer(data, dtype=np.uint8).reshape(8, n).T.copy().view(dtype).ravel()
+
+
+def _delta(ints, order):
+    #   order 阶差分，首项保留原值，可用 order 次 cumsum 还原
+    for _ in range(order):
+        ints = np.diff(ints, prepend=ints.dtype.type(0))
+    return ints
+
+
+def _undelta(ints, order):
+    for _ in range(order):
+        ints = np.cumsum(ints, dtype=np.int64)
+    return ints
+
+
+class CompressedLogWriter(CaptureWriter):
+    """按固定行数分块压缩写入 .dml 文件，接口与 CaptureWriter 相同"""
+
+    index_magic = INDEX_MAGIC
+
+    def __init__(self, file_path, chunk_rows=8192, metadata=None, codec='zlib', level=6,
+                 time_resolution=1e-6, resolution=0.0):
+        if codec not in CODECS:
+            raise ValueError('压缩算法只支持 "zlib" / "lzma"')
+        self.chunk_rows = chunk_rows
+        self.codec = codec
+        self.level = level
+        self.time_resolution = time_resolution
+        self.resolution = resolution
+        self.file = open(file_path, 'wb')
+        meta = json.dumps(metadata or {}, ensure_ascii=False).encode('utf-8')
+        meta += b' ' * (-(FILE_HEADER.size + len(meta)) % 8)
+        self.file.write(FILE_HEADER.pack(FILE_MAGIC, chunk_rows, CODECS[codec], time_resolution, resolution,
+                                         len(meta)) + meta)
+        self.times = np.empty(chunk_rows)
+        self.values = np.empty(chunk_rows)
+        self.pending = 0
+        self.index = []
+        self.count = 0
+        self.raw_bytes = 0  # 未压缩时的数据量（时间戳+读数各8字节），用于计算压缩比
+        self.written_bytes = 0
+
+    def _compress(self, data):
+        if self.codec == 'lzma':
+            return lzma.compress(data, preset=self.level)
+        return zlib.compress(data, self.level)
+
+    def _encode_values(self, values):
+        #   能用缩放整数时优先使用，否则退回无损的 XOR 浮点编码
+        if self.resolution > 0 and np.all(np.isfinite(values)):
+            scaled = np.rint(values / self.resolution)
+            if np.abs(scaled).max() < MAX_SCALED:
+                return SCALED, _delta(scaled.astype(np.int64), 1)
+        bits = values.view(np.uint64)
+        return XOR, bits ^ np.concatenate(([np.uint64(0)], bits[:-1]))
+
+    def _write_chunk(self):
+        n = self.pending
+        times, values = self.times[:n], self.values[:n]
+        ticks = np.rint(times / self.time_resolution).astype(np.int64)
+        encoding, encoded = self._encode_values(values)
+        payload = self._compress(_shuffle(_delta(ticks, 2)) + _shuffle(encoded))
+        offset = self.file.tell()
+        self.file.write(BLOCK_HEADER.pack(BLOCK_MAGIC, n, encoding, len(payload)))
+        self.file.write(payload)
+        valid, vmin, vmax, mean = _summary(values)
+        self.index.append((offset, n, valid, times[0], times[-1], vmin, vmax, mean))
+        self.count += n
+        self.raw_bytes += 16 * n
+        self.written_bytes += BLOCK_HEADER.size + len(payload)
+        self.pending = 0
+
+    def ratio(self):
+        """已写出数据的压缩比（未压缩的 16 字节/读数 与实际写出字节数之比）"""
+        return self.raw_bytes / self.written_bytes if self.written_bytes else None
+
+
+class CompressedLogReader(CaptureReader):
+    """读取 .dml 文件，接口与 CaptureReader 相同
+
+    chunk(i)/iter_chunks() 每次只解压一块，返回新分配的数组；时间区间查询和统计先按索引定位数据块，
+    统计对完整覆盖的数据块直接使用索引摘要，无需解压。
+    """
+
+    index_magic = INDEX_MAGIC
+
+    def __init__(self, file_path):
+        self.file = open(file_path, 'rb')
+        self.mm = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.chunk_rows, codec, self.time_resolution, self.resolution, meta_len = \
+            FILE_HEADER.unpack_from(self.mm, 0)
+        if magic != FILE_MAGIC:
+            self.close()
+            raise ValueError('不是有效的压缩记录文件')
+        self.decompress = lzma.decompress if codec == CODECS['lzma'] else zlib.decompress
+        self.metadata = json.loads(self.mm[FILE_HEADER.size:FILE_HEADER.size + meta_len] or b'{}')
+        self.data_offset = FILE_HEADER.size + meta_len
+        self.index = self._load_index()
+
+    def _rebuild_index(self):
+        #   文件尾缺失：顺序遍历完整的数据块重建索引
+        entries = []
+        offset, size = self.data_offset, len(self.mm)
+        while offset + BLOCK_HEADER.size <= size:
+            magic, n, _, length = BLOCK_HEADER.unpack_from(self.mm, offset)
+            end = offset + BLOCK_HEADER.size + length
+            if magic != BLOCK_MAGIC or n == 0 or end > size:
+                break
+            try:
+                times, values = self._chunk_at(offset)
+            except (zlib.error, lzma.LZMAError, ValueError):
+                break  # 最后一块未写完整
+            valid, vmin, vmax, mean = _summary(values)
+            entries.append((offset, n, valid, times[0], times[-1], vmin, vmax, mean))
+            offset = end
+        return np.array(entries, dtype=INDEX_DTYPE)
+
+    def _chunk_at(self, offset):
+        _, n, encoding, length = BLOCK_HEADER.unpack_from(self.mm, offset)
+        start = offset + BLOCK_HEADER.size
+        data = self.decompress(self.mm[start:start + length])
+        ticks = _undelta(_unshuffle(data[:8 * n], n, np.int64), 2)
+        times = ticks * self.time_resolution
+        encoded = _unshuffle(data[8 * n:], n, np.int64 if encoding == SCALED else np.uint64)
+        if encoding == SCALED:
+            values = _undelta(encoded, 1) * self.resolution
+        else:
+            values = np.bitwise_xor.accumulate(encoded).view(np.float64)
+        return times, values
+
+
+def open_log(file_path):
+    """按文件头魔数打开 .dmc 或 .dml 文件"""
+    with open(file_path, 'rb') as f:
+        magic = f.read(8)
+    if magic == FILE_MAGIC:
+        return CompressedLogReader(file_path)
+    return CaptureReader(file_path)
@@ -0,0 +1,126 @@
+import os
+import queue
+import threading
+import numpy as np
+from capture_file import CaptureWriter
+from compressed_log import CompressedLogWriter
+
+BINARY_MAGIC = b'DMMREC01'  # 二进制记录文件头
+RECORD_DTYPE = np.dtype([('time', '<f8'), ('value', '<f8')])  # 每条记录16字节：时间戳+读数
+
+
+class DataRecorder(threading.Thread):
+    """后台流式记录线程
+
+    扫描线程调用 write() 把带时间戳的读数放入有界队列，记录线程凑满 chunk_size 条
+    （或等待超过 flush_interval 秒）就追加写入文件并 fsync，崩溃时最多丢失一个块。
+    支持 CSV（.csv）、紧凑二进制（.bin，小端 float64 时间戳+读数）、带时间索引的
+    分块采集文件（.dmc，见 capture_file）和压缩长期记录（.dml，见 compressed_log）四种格式。
+    log_options 为传给 CompressedLogWriter 的参数（codec、resolution 等）。
+    """
+
+    def __init__(self, file_path, fmt=None, chunk_size=1000, max_pending=64, flush_interval=1.0,
+                 metadata=None, log_options=None):
+        super().__init__(daemon=True)
+        if fmt is None:
+            fmt = os.path.splitext(file_path)[1].lower().lstrip('.')
+        if fmt not in ('csv', 'bin', 'dmc', 'dml'):
+            raise ValueError('记录格式只支持 "csv" / "bin" / "dmc" / "dml"')
+        self.file_path = file_path
+        self.fmt = fmt
+        self.metadata = metadata  # 写入 .dmc/.dml 文件头的元数据（测量功能、单位等）
+        self.log_options = log_options or {}
+        self.chunk_size = chunk_size
+        self.flush_interval = flush_interval
+        self.queue = queue.Queue(maxsize=max_pending)  # 有界队列：写盘跟不上时对采集线程施加背压
+        self.count = 0  # 已落盘的读数条数
+        self.error = None  # 记录线程中发生的异常
+
+    def write(self, times, values):
+        """提交一批读数（在采集线程中调用）"""
+        self._put((np.asarray(times, dtype=np.float64), np.asarray(values, dtype=np.float64)))
+        if self.error is not None:
+            raise self.error
+
+    def close(self):
+        """写完队列中剩余数据后结束记录"""
+        self._put(None)
+        self.join()
+
+    def _put(self, item):
+        #   队列满时等待，但记录线程已退出（写盘出错）时不再阻塞
+        while self.is_alive():
+            try:
+                self.queue.put(item, timeout=self.flush_interval)
+                return
+            except queue.Full:
+                pass
+
+    def run(self):
+        pending = []
+        pending_count = 0
+        try:
+            if self.fmt == 'dmc':
+                f = CaptureWriter(self.file_path, self.chunk_size, self.metadata)
+            elif self.fmt == 'dml':
+                f = CompressedLogWriter(self.file_path, metadata=self.metadata, **self.log_options)
+            else:
+                f = open(self.file_path, 'w' if self.fmt == 'csv' else 'wb')
+            with f:
+                self._write_header(f)
+                while True:
+                    try:
+                        item = self.queue.get(timeout=self.flush_interval)
+                    except queue.Empty:
+                        item = ()  # 超时：把已缓存的读数落盘
+                    if item:
+                        pending.append(item)
+                        pending_count += len(item[1])
+                    if pending and (not item or pending_count >= self.chunk_size):
+                        self._write_chunk(f, pending)
+                        pending, pending_count = [], 0
+                    if item is None:
+                        break
+        except Exception as e:
+            self.error = e
+
+    def _write_header(self, f):
+        if self.fmt == 'csv':
+            f.write('timestamp,value\n')
+        elif self.fmt == 'bin':
+            f.write(BINARY_MAGIC)
+        self._sync(f)
+
+    def _write_chunk(self, f, pending):
+        #   把缓存的若干批读数合并为一个块写入并同步到磁盘
+        times = np.concatenate([p[0] for p in pending])
+        values = np.concatenate([p[1] for p in pending])
+        if self.fmt in ('dmc', 'dml'):
+            f.append(times, values)  # 采集文件自行按块写出，不足一块的部分留在缓冲区
+        elif self.fmt == 'csv':
+            f.write(''.join(f'{t:.6f},{v:.9g}\n' for t, v in zip(times.tolist(), values.tolist())))
+        else:
+            records = np.empty(len(values), dtype=RECORD_DTYPE)
+            records['time'] = times
+            records['value'] = values
+            f.write(records.tobytes())
+        self._sync(f)
+        self.count += len(values)
+
+    @staticmethod
+    def _sync(f):
+        if isinstance(f, CaptureWriter):
+            f.sync()
+            return
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def read_binary_record(file_path):
+    """读取 .bin 记录文件，返回 (时间戳数组, 读数数组)"""
+    with open(file_path, 'rb') as f:
+        if f.read(len(BINARY_MAGIC)) != BINARY_MAGIC:
+            raise ValueError('不是有效的记录文件')
+        data = f.read()
+    records = np.frombuffer(data[:len(data) // RECORD_DTYPE.itemsize * RECORD_DTYPE.itemsize], dtype=RECORD_DTYPE)
+    return records['time'], records['value']
@@ -0,0 +1,115 @@
+import json
+import os
+import threading
+import time
+import pyvisa
+
+CACHE_PATH = os.path.join(os.path.expanduser('~'), '.device_control_devices.json')
+IDN_TIMEOUT = 1000  # 查询新设备 *IDN? 的超时（毫秒），避免无响应的端口拖慢扫描
+
+
+class DeviceDiscovery(object):
+    """后台设备发现
+
+    整个程序共用一个资源管理器（首次使用时创建），设备扫描在后台线程中进行，界面不再等待。
+    已知设备的地址和 *IDN? 结果缓存在 JSON 文件中：启动时先用缓存填充设备列表，
+    重新扫描时只对新出现的设备查询 *IDN?，未再出现的设备标记为离线但保留在缓存中。
+    扫描线程在局部字典中建好新的设备表后在锁内整体替换，替换后不再修改，界面线程读到的总是完整的一份。
+    """
+
+    def __init__(self, cache_path=CACHE_PATH, rm=None):
+        self.cache_path = cache_path
+        self.rm = rm
+        self.lock = threading.Lock()
+        self.scan_thread = None
+        self.devices = self.load_cache()  # 地址 -> {'idn', 'online', 'last_seen'}
+
+    def resource_manager(self):
+        """共享的资源管理器，首次调用时创建"""
+        with self.lock:
+            if self.rm is None:
+                self.rm = pyvisa.ResourceManager()
+            return self.rm
+
+    def load_cache(self):
+        try:
+            with open(self.cache_path, encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def snapshot(self):
+        """当前设备表（扫描只整体替换、不原地修改，可在任意线程中遍历）"""
+        with self.lock:
+            return self.devices
+
+    def save_cache(self):
+        devices = self.snapshot()
+        try:
+            tmp_path = self.cache_path + '.tmp'
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(devices, f, indent=2, ensure_ascii=False)
+            os.replace(tmp_path, self.cache_path)
+        except OSError:
+            pass  # 缓存只用于加速，写入失败不影响使用
+
+    def known(self):
+        """缓存中的设备地址，在线的排在前面"""
+        devices = self.snapshot()
+        return sorted(devices, key=lambda address: not devices[address].get('online'))
+
+    def describe(self, address):
+        """设备的简短描述，如 'Keysight 34461A (MY123456)'，未知时返回空字符串"""
+        idn = self.snapshot().get(address, {}).get('idn')
+        if not idn:
+            return ''
+        fields = [x.strip() for x in idn.split(',')]
+        return f"{fields[0]} {fields[1]} ({fields[2]})" if len(fields) >= 3 else idn
+
+    def query_idn(self, address):
+        try:
+            resource = self.resource_manager().open_resource(address, open_timeout=IDN_TIMEOUT)
+        except Exception:
+            return None
+        try:
+            resource.timeout = IDN_TIMEOUT
+            return resource.query('*IDN?').strip()
+        except Exception:
+            return None
+        finally:
+            resource.close()
+
+    def scan(self, query='?*::INSTR'):
+        """扫描一次（阻塞），返回当前在线的设备地址；只对缓存中没有 *IDN? 结果的设备进行查询"""
+        found = self.resource_manager().list_resources(query)
+        now = time.time()
+        devices = {address: dict(info, online=False) for address, info in self.snapshot().items()}
+        for address in found:
+            info = devices.setdefault(address, {'idn': None})
+            info['online'] = True
+            info['last_seen'] = now
+            if not info.get('idn'):
+                info['idn'] = self.query_idn(address)
+        with self.lock:
+            self.devices = devices
+        self.save_cache()
+        return list(found)
+
+    def scan_async(self, callback, error_callback=None):
+        """在后台线程中扫描，完成后以在线设备列表调用 callback（在扫描线程中调用）；
+        已有扫描在进行时直接返回 False"""
+        if self.scan_thread is not None and self.scan_thread.is_alive():
+            return False
+
+        def task():
+            try:
+                found = self.scan()
+            except Exception as e:
+                if error_callback is not None:
+                    error_callback(e)
+                return
+            callback(found)
+
+        self.scan_thread = threading.Thread(target=task, daemon=True)
+        self.scan_thread.start()
+        return True
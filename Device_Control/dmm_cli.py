@@ -0,0 +1,202 @@
+"""DMM34461A 命令行采集工具（无界面，用于无人值守的测试工位）
+
+基于 DMM34461A 驱动完成配置、采集（逐点 / 硬件缓存批量 / 流式）并输出到文件或标准输出，
+不导入 tkinter。numpy、pyvisa 和记录模块等较重的依赖在解析完参数后才按需导入，
+--help 和参数错误立即返回，采集路径上也只加载实际用到的模块。
+
+标准输出为 CSV 行 "时间戳,读数"；-o 按扩展名写入 .csv / .bin / .dmc / .dml 文件（见 data_recorder），
+长时间无人值守记录建议使用压缩的 .dml。
+
+示例：
+    python dmm_cli.py list
+    python dmm_cli.py --address USB0::0x2A8D::0x1301::MY12345678::INSTR single -n 10 --interval 0.5
+    python dmm_cli.py --sim --function Res burst --count 1000 -o data.dmc
+    python dmm_cli.py --address TCPIP0::192.168.1.10::INSTR stream --rate 1000 --duration 60 -o data.csv
+    python dmm_cli.py --sim stream --rate 100 -o soak.dml --resolution 1e-7
+"""
+
+import argparse
+import itertools
+import signal
+import sys
+import threading
+import time
+
+FUNCTION_CHOICES = ('DCV', 'ACV', 'DCI', 'ACI', 'Res')
+UNITS = {'DCV': 'V', 'ACV': 'V', 'DCI': 'A', 'ACI': 'A', 'Res': 'Ω'}
+
+
+class StdoutSink(object):
+    """把读数按 CSV 行写到标准输出"""
+
+    def __init__(self, stream=None):
+        self.stream = stream or sys.stdout
+
+    def write(self, times, values):
+        self.stream.write(''.join(f'{t:.6f},{v:.10g}\n' for t, v in zip(times, values)))
+        self.stream.flush()
+
+    def close(self):
+        pass
+
+
+def open_sink(args):
+    if not args.output or args.output == '-':
+        return StdoutSink()
+    from data_recorder import DataRecorder
+    log_options = {'codec': args.codec, 'resolution': args.resolution or 0.0}
+    recorder = DataRecorder(args.output, metadata={'function': args.function, 'unit': UNITS[args.function]},
+                            log_options=log_options)
+    recorder.start()
+    return recorder
+
+
+def open_meter(args):
+    from Keysight_34461A import DMM34461A
+    if args.sim:
+        from sim_34461A import SimResourceManager, SIM_ADDRESS
+        meter = DMM34461A(SimResourceManager())
+        meter.connect(SIM_ADDRESS)
+    else:
+        import pyvisa
+        meter = DMM34461A(pyvisa.ResourceManager(args.visa_library or ''))
+        meter.connect(args.address)
+    if args.timeout:
+        meter.K34461A.timeout = args.timeout
+    return meter
+
+
+def configure(meter, args):
+    """按参数配置功能、积分时间和输入阻抗，整批一次下发并检查仪器错误"""
+    with meter.batch():
+        meter.conf_function(args.function)
+        if args.nplc is not None:
+            meter.set_volt_aperture(args.nplc)
+        if args.impedance:
+            meter.set_input_Z(args.impedance)
+
+
+def run_single(meter, args, sink, stop_event):
+    deadline = time.monotonic()
+    for _ in range(args.count) if args.count else itertools.count():
+        if stop_event.is_set():
+            break
+        value = meter.read_value(args.function)
+        sink.write([time.time()], [value])
+        if args.interval:
+            deadline += args.interval
+            if stop_event.wait(max(deadline - time.monotonic(), 0)):
+                break
+
+
+def run_burst(meter, args, sink, stop_event):
+    import numpy as np
+    for _ in range(args.repeat):
+        if stop_event.is_set():
+            break
+        start = time.time()
+        values = meter.burst(args.function, args.count, stop_event=stop_event)
+        if not len(values):
+            break  # Ctrl+C：本批已中止（ABOR）
+        sink.write(np.linspace(start, time.time(), len(values)), values)
+
+
+def run_stream(meter, args, sink, stop_event):
+    import numpy as np
+    stream = meter.stream(args.function, args.rate, args.chunk, stop_event)
+    end = time.monotonic() + args.duration if args.duration else None
+    total = 0
+    last = time.time()
+    try:
+        for values in stream:
+            now = time.time()
+            if args.rate:
+                # 定时采样：读数时刻由 INIT 时刻和采样周期推算
+                times = meter.init_time + (total + np.arange(len(values))) / args.rate
+            else:
+                times = np.linspace(last, now, len(values) + 1)[1:]
+            last = now
+            sink.write(times, values)
+            total += len(values)
+            if (args.samples and total >= args.samples) or (end is not None and time.monotonic() >= end):
+                break
+    finally:
+        stream.close()
+
+
+def list_resources(args):
+    if args.sim:
+        from sim_34461A import SIM_ADDRESS
+        print(SIM_ADDRESS)
+        return 0
+    import pyvisa
+    for address in pyvisa.ResourceManager(args.visa_library or '').list_resources():
+        print(address)
+    return 0
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description='DMM34461A 命令行采集')
+    parser.add_argument('--address', help='仪器 VISA 地址')
+    parser.add_argument('--sim', action='store_true', help='使用进程内仿真仪器')
+    parser.add_argument('--visa-library', help='VISA 库路径或后端（如 @py），缺省自动选择')
+    parser.add_argument('--timeout', type=int, help='VISA 超时（毫秒）')
+    parser.add_argument('--function', choices=FUNCTION_CHOICES, default='DCV', help='测量功能（默认 DCV）')
+    parser.add_argument('--nplc', type=float, help='直流电压积分时间（PLC：0.02/0.2/1/10/100）')
+    parser.add_argument('--impedance', choices=('10M', 'AUTO'), help='直流电压输入阻抗')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    commands.add_parser('list', help='列出可用的 VISA 资源')
+
+    output = argparse.ArgumentParser(add_help=False)
+    output.add_argument('-o', '--output', help='输出文件（.csv/.bin/.dmc/.dml），缺省或 "-" 为标准输出')
+    output.add_argument('--codec', choices=('zlib', 'lzma'), default='zlib', help='.dml 压缩算法（默认 zlib）')
+    output.add_argument('--resolution', type=float, help='.dml 读数分辨率，缺省为无损')
+
+    single = commands.add_parser('single', parents=[output], help='逐点测量')
+    single.add_argument('-n', '--count', type=int, default=1, help='测量次数，0 为一直测量（默认1）')
+    single.add_argument('--interval', type=float, default=0.0, help='测量间隔（秒）')
+
+    burst = commands.add_parser('burst', parents=[output], help='硬件缓存批量采集')
+    burst.add_argument('--count', type=int, required=True, help='每批点数（不超过读数存储器容量）')
+    burst.add_argument('--repeat', type=int, default=1, help='批数（默认1）')
+
+    stream = commands.add_parser('stream', parents=[output], help='流式连续采集，Ctrl+C 结束')
+    stream.add_argument('--rate', type=float, help='采样率（次/秒），缺省为最快速度')
+    stream.add_argument('--chunk', type=int, default=1000, help='每次取回的点数（默认1000）')
+    stream.add_argument('--duration', type=float, help='采集时长（秒）')
+    stream.add_argument('--samples', type=int, help='采集点数')
+    return parser
+
+
+RUNNERS = {'single': run_single, 'burst': run_burst, 'stream': run_stream}
+
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if args.command == 'list':
+        return list_resources(args)
+    if not args.sim and not args.address:
+        parser.error('需要 --address 或 --sim')
+
+    # Ctrl+C 只置位停止标志，让采集在块边界结束并正常发送 ABOR、关闭文件
+    stop_event = threading.Event()
+    signal.signal(signal.SIGINT, lambda signum, frame: stop_event.set())
+
+    meter = open_meter(args)
+    sink = None
+    try:
+        configure(meter, args)
+        sink = open_sink(args)
+        RUNNERS[args.command](meter, args, sink, stop_event)
+    finally:
+        if sink is not None:
+            sink.close()
+        meter.local()
+        meter.K34461A.close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
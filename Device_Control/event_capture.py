@@ -0,0 +1,228 @@
+import numpy as np
+
+
+class _Trigger(object):
+    #   触发条件基类：子类的 _mask 按 (前一读数时刻, 前一读数, 时刻, 读数) 逐点判断，判断跨数据块连续
+
+    def __init__(self):
+        self.last_time = self.last_value = np.nan  # 上一个读数
+
+    def prime(self, t, value):
+        """记下最近的读数（捕获期间的读数不参与判断，结束后从最后一个读数接着判断）"""
+        self.last_time, self.last_value = t, value
+
+    def first(self, times, values):
+        """本块中第一个触发点的下标，没有时返回 -1；同时把判断位置推进到触发点（或块尾）"""
+        previous_times = np.concatenate(([self.last_time], times[:-1]))
+        previous = np.concatenate(([self.last_value], values[:-1]))
+        hits = np.flatnonzero(self._mask(previous_times, previous, times, values))
+        if not len(hits):
+            self.prime(times[-1], values[-1])
+            return -1
+        index = int(hits[0])
+        self.prime(times[index], values[index])
+        return index
+
+
+class LevelTrigger(_Trigger):
+    """电平穿越：读数穿过 level 时触发，edge 为 'rising' / 'falling' / 'both'"""
+
+    def __init__(self, level, edge='rising'):
+        super().__init__()
+        if edge not in ('rising', 'falling', 'both'):
+            raise ValueError('edge 应为 rising/falling/both')
+        self.level = level
+        self.edge = edge
+
+    def _mask(self, previous_times, previous, times, values):
+        rising = (previous < self.level) & (values >= self.level)
+        falling = (previous > self.level) & (values <= self.level)
+        if self.edge == 'rising':
+            return rising
+        if self.edge == 'falling':
+            return falling
+        return rising | falling
+
+
+class WindowTrigger(_Trigger):
+    """超出窗口：读数从 [low, high] 内离开窗口时触发"""
+
+    def __init__(self, low, high):
+        super().__init__()
+        if low >= high:
+            raise ValueError('窗口下限应小于上限')
+        self.low = low
+        self.high = high
+
+    def _mask(self, previous_times, previous, times, values):
+        inside = (previous >= self.low) & (previous <= self.high)
+        return inside & ((values < self.low) | (values > self.high))
+
+
+class SlopeTrigger(_Trigger):
+    """斜率：相邻读数的变化率绝对值超过 rate（单位/秒）时触发"""
+
+    def __init__(self, rate):
+        super().__init__()
+        self.rate = abs(rate)
+
+    def _mask(self, previous_times, previous, times, values):
+        with np.errstate(divide='ignore', invalid='ignore'):
+            slope = np.abs(values - previous) / (times - previous_times)
+        return slope > self.rate
+
+
+class DeadbandTrigger(_Trigger):
+    """死区变化：读数偏离上次记录的值超过 deadband 时触发，触发后以新值为参考"""
+
+    def __init__(self, deadband):
+        super().__init__()
+        self.deadband = abs(deadband)
+        self.reference = np.nan
+
+    def prime(self, t, value):
+        self.last_time, self.last_value = t, value
+        self.reference = value
+
+    def first(self, times, values):
+        if np.isnan(self.reference):
+            self.reference = values[0]
+        hits = np.flatnonzero(np.abs(values - self.reference) > self.deadband)
+        if not len(hits):
+            self.last_time, self.last_value = times[-1], values[-1]
+            return -1
+        index = int(hits[0])
+        self.prime(times[index], values[index])
+        return index
+
+
+TRIGGERS = {
+    'level': LevelTrigger,
+    'window': WindowTrigger,
+    'slope': SlopeTrigger,
+    'deadband': DeadbandTrigger,
+}
+
+
+def make_trigger(kind, *args):
+    """按名称创建触发条件：level(电平[, 边沿]) / window(下限, 上限) / slope(变化率) / deadband(死区)"""
+    return TRIGGERS[kind](*args)
+
+
+class Event(object):
+    """一次事件记录：触发前 pre 个读数、触发读数和触发后的读数"""
+
+    def __init__(self, number, times, values, trigger_index):
+        self.number = number
+        self.times = times
+        self.values = values
+        self.trigger_index = trigger_index  # 触发读数在 times/values 中的下标
+
+    @property
+    def trigger_time(self):
+        return float(self.times[self.trigger_index])
+
+    @property
+    def trigger_value(self):
+        return float(self.values[self.trigger_index])
+
+    def __len__(self):
+        return len(self.values)
+
+
+class EventCapture(object):
+    """阈值触发的事件捕获
+
+    读数持续写入长度为 pre 的预触发环形缓冲区，不保存也不显示；触发条件满足时，
+    取出缓冲区中触发前的 pre 个读数，再收集触发读数之后的 post 个读数，合成一条事件记录。
+    收集触发后读数期间不再判断触发（相当于 post 个读数的释抑），之后从最后一个读数接着判断。
+    长时间浸泡测试中只有事件前后的读数会被保存和显示，触发点附近的数据不会丢失。
+    """
+
+    def __init__(self, trigger, pre=100, post=100):
+        if pre < 0 or post < 0:
+            raise ValueError('预触发/后触发点数不能为负')
+        self.trigger = trigger
+        self.pre = pre
+        self.post = post
+        self.ring_times = np.empty(pre)
+        self.ring_values = np.empty(pre)
+        self.ring_index = 0  # 下一个写入位置
+        self.ring_count = 0
+        self.pending = None  # 正在收集触发后读数的事件：[时间块列表, 读数块列表, 触发下标, 还差的点数]
+        self.seen = 0  # 送入的读数总数
+        self.stored = 0  # 已提交到事件记录中的读数总数
+        self.events = 0
+
+    def feed(self, times, values):
+        """送入一批读数，返回本批中完成的事件记录列表"""
+        times = np.asarray(times, dtype=np.float64)
+        values = np.asarray(values, dtype=np.float64)
+        n = len(values)
+        self.seen += n
+        completed = []
+        position = 0
+        while position < n:
+            if self.pending is not None:
+                take = min(self.pending[3], n - position)
+                self.pending[0].append(times[position:position + take])
+                self.pending[1].append(values[position:position + take])
+                self.pending[3] -= take
+                position += take
+                if self.pending[3] == 0:
+                    completed.append(self._finish())
+                continue
+
+            index = self.trigger.first(times[position:], values[position:])
+            if index < 0:
+                self._push(times[position:], values[position:])
+                break
+            trigger = position + index
+            self._push(times[position:trigger], values[position:trigger])
+            pre_times, pre_values = self._drain()
+            self.pending = [[pre_times, times[trigger:trigger + 1]], [pre_values, values[trigger:trigger + 1]],
+                            len(pre_values), self.post]
+            position = trigger + 1
+            if self.post == 0:
+                completed.append(self._finish())
+        return completed
+
+    def flush(self):
+        """结束采集：收集中的事件按已有的触发后读数提交，返回事件记录或 None"""
+        return self._finish() if self.pending is not None else None
+
+    def _finish(self):
+        time_parts, value_parts, trigger_index, _ = self.pending
+        self.pending = None
+        self.events += 1
+        event = Event(self.events, np.concatenate(time_parts), np.concatenate(value_parts), trigger_index)
+        self.stored += len(event)
+        self.trigger.prime(event.times[-1], event.values[-1])
+        return event
+
+    def _push(self, times, values):
+        #   写入预触发环形缓冲区，只保留最近 pre 个读数
+        if not self.pre or not len(values):
+            return
+        if len(values) >= self.pre:
+            self.ring_times[:] = times[-self.pre:]
+            self.ring_values[:] = values[-self.pre:]
+            self.ring_index = 0
+            self.ring_count = self.pre
+            return
+        positions = (self.ring_index + np.arange(len(values))) % self.pre
+        self.ring_times[positions] = times
+        self.ring_values[positions] = values
+        self.ring_index = int(positions[-1] + 1) % self.pre
+        self.ring_count = min(self.ring_count + len(values), self.pre)
+
+    def _drain(self):
+        #   按时间顺序取出并清空预触发缓冲区
+        order = (self.ring_index - self.ring_count + np.arange(self.ring_count)) % max(self.pre, 1)
+        times, values = self.ring_times[order], self.ring_values[order]
+        self.ring_count = 0
+        return times, values
+
+    def reduction(self):
+        """送入读数与保存读数之比（没有保存任何读数时为 None）"""
+        return self.seen / self.stored if self.stored else None
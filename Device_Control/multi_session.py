@@ -0,0 +1,133 @@
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import pyvisa
+from Keysight_34461A import DMM34461A
+
+
+class MultiMeterSession(object):
+    """多台 34461A 并行采集会话
+
+    所有仪器共用一个资源管理器，每台仪器在线程池中占用一个工作线程，各自的 VISA 往返互不等待，
+    总吞吐随仪器数量增长。所有读数的时间戳都取自同一个单调时钟（会话开始时刻为 0 秒）。
+    """
+
+    def __init__(self, addresses, rm=None):
+        self.rm = rm if rm is not None else pyvisa.ResourceManager()
+        self.meters = {}
+        try:
+            for address in addresses:
+                meter = DMM34461A(self.rm)
+                meter.connect(address)
+                self.meters[address] = meter
+        except Exception:
+            self.close()
+            raise
+        self.pool = ThreadPoolExecutor(max_workers=max(len(self.meters), 1))
+        self.t0 = time.monotonic()  # 公共时基零点
+        self.epoch = time.time()  # 时基零点对应的墙钟时间，用于换算为绝对时间
+
+    def clock(self):
+        """公共时基当前时刻（秒）"""
+        return time.monotonic() - self.t0
+
+    def _each(self, fn):
+        #   对每台仪器并行执行 fn(meter)，按地址返回结果
+        futures = {address: self.pool.submit(fn, meter) for address, meter in self.meters.items()}
+        return {address: future.result() for address, future in futures.items()}
+
+    def configure(self, function):
+        """并行设置所有仪器的测量功能"""
+        self._each(lambda meter: meter.conf_function(function))
+
+    def measure(self, function):
+        """每台仪器测量一次，返回 {地址: (时间戳, 读数)}；时间戳取查询往返的中点"""
+        def task(meter):
+            start = self.clock()
+            value = meter.read_value(function)
+            return (start + self.clock()) / 2, value
+        return self._each(task)
+
+    def scan(self, function, rounds, interval=0.0):
+        """并行逐点扫描 rounds 轮，返回 {地址: (时间戳数组, 读数数组)}"""
+        results = {address: ([], []) for address in self.meters}
+        for _ in range(rounds):
+            for address, (t, value) in self.measure(function).items():
+                results[address][0].append(t)
+                results[address][1].append(value)
+            if interval:
+                time.sleep(interval)
+        return {address: (np.array(t), np.array(v)) for address, (t, v) in results.items()}
+
+    def burst(self, function, count):
+        """每台仪器并行执行一次硬件缓存批量采集，返回 {地址: (时间戳数组, 读数数组)}"""
+        def task(meter):
+            start = self.clock()
+            values = meter.burst(function, count)
+            return np.linspace(start, self.clock(), len(values)), values
+        return self._each(task)
+
+    def stream(self, function, rate=None, chunk=1000, stop_event=None):
+        """所有仪器同时流式采集的生成器，按到达顺序产出 (地址, 时间戳数组, 读数数组)"""
+        stop_event = stop_event if stop_event is not None else threading.Event()
+        chunks = queue.Queue(maxsize=4 * len(self.meters))  # 有界：消费者跟不上时采集线程等待
+
+        def task(address, meter):
+            last = self.clock()
+            for values in meter.stream(function, rate, chunk, stop_event):
+                now = self.clock()
+                if rate:
+                    times = now - (len(values) - 1 - np.arange(len(values))) / rate
+                else:
+                    times = np.linspace(last, now, len(values) + 1)[1:]
+                last = now
+                while not stop_event.is_set():
+                    try:
+                        chunks.put((address, times, values), timeout=0.1)
+                        break
+                    except queue.Full:
+                        pass
+
+        futures = [self.pool.submit(task, address, meter) for address, meter in self.meters.items()]
+        try:
+            while not all(f.done() for f in futures) or not chunks.empty():
+                try:
+                    yield chunks.get(timeout=0.1)
+                except queue.Empty:
+                    pass
+        finally:
+            stop_event.set()
+            for future in futures:
+                future.result()  # 等待各仪器发送 ABOR 并抛出采集中的异常
+
+    def close(self):
+        if hasattr(self, 'pool'):
+            self.pool.shutdown()
+        for meter in self.meters.values():
+            meter.K34461A.close()
+        self.meters = {}
+
+
+def align(results, period=None):
+    """把各仪器的 (时间戳, 读数) 合并为一张按公共时间轴对齐的表
+
+    时间轴取所有仪器共同覆盖的区间，步长默认为各仪器中最慢的平均采样间隔；
+    各仪器的读数在时间轴上线性插值。返回 {'time': 时间轴, 地址: 读数数组, ...}。
+    """
+    series = {address: (np.asarray(t), np.asarray(v)) for address, (t, v) in results.items() if len(t)}
+    if not series:
+        return {'time': np.empty(0)}
+    start = max(t[0] for t, _ in series.values())
+    stop = min(t[-1] for t, _ in series.values())
+    if period is None:
+        period = max((t[-1] - t[0]) / (len(t) - 1) if len(t) > 1 else 0.0 for t, _ in series.values())
+    if stop < start or period <= 0:
+        grid = np.array([start])
+    else:
+        grid = np.arange(start, stop + period / 2, period)
+    table = {'time': grid}
+    for address, (t, v) in series.items():
+        table[address] = np.interp(grid, t, v)
+    return table
@@ -0,0 +1,69 @@
+import queue
+import re
+import tkinter as tk
+
+# 字符分类：中文 / 数字 / 字母 / 其他，连续的同类字符合并为一段，整段只打一次标签
+TOKEN_PATTERN = re.compile(r'([\u4e00-\u9fff]+)|(\d+)|([^\W\d_\u4e00-\u9fff]+)|([\W_]+)')
+TOKEN_TAGS = (None, 'chinese', 'number', 'english', None)
+
+
+def tag_runs(text):
+    """把文本切成 (片段, 标签) 序列，标签为 None 表示不加字体标签"""
+    for match in TOKEN_PATTERN.finditer(text):
+        yield match.group(), TOKEN_TAGS[match.lastindex]
+
+
+class OutputConsole(object):
+    """批量刷新的输出控制台
+
+    生产者（包括扫描线程）只把文本行放进队列；GUI 线程按固定帧率取出队列中的全部行，
+    拼成一次带标签的 Text.insert 调用并只滚动一次，同时把回滚行数限制在 max_lines 以内，
+    长时间扫描时内存占用保持平稳。
+    """
+
+    def __init__(self, text_widget, max_lines=5000, fps=20):
+        self.text = text_widget
+        self.max_lines = max_lines
+        self.interval = int(1000 / fps)  # 刷新周期（毫秒）
+        self.queue = queue.SimpleQueue()  # 线程安全，生产者无需经过 after()
+        self.text.after(self.interval, self._flush)
+
+    def put(self, line):
+        """放入一行待显示文本（可在任意线程调用）"""
+        self.queue.put(line)
+
+    def insert(self, text):
+        """立即插入一段文本：按字符类别分段，一次 insert 调用写入所有分段"""
+        args = []
+        for chunk, tag in tag_runs(text):
+            args.append(chunk)
+            args.append(tag or ())
+        if args:
+            self.text.insert(tk.END, *args)
+
+    def clear(self):
+        """清空显示内容，丢弃尚未刷新的行"""
+        while not self.queue.empty():
+            self.queue.get_nowait()
+        self.text.delete(1.0, tk.END)
+
+    def _flush(self):
+        #   取出本帧积压的所有行，超出回滚上限的旧行不必再插入
+        lines = []
+        while not self.queue.empty():
+            lines.append(self.queue.get_nowait())
+
+        try:
+            if lines:
+                self.insert(''.join(lines[-self.max_lines:]))
+                self._trim()
+                self.text.see(tk.END)
+            self.text.after(self.interval, self._flush)
+        except tk.TclError:
+            pass  # 窗口已销毁，停止刷新
+
+    def _trim(self):
+        #   超出回滚上限时删除最旧的行
+        line_count = int(self.text.index('end-1c').split('.')[0])
+        if line_count > self.max_lines:
+            self.text.delete(1.0, f'{line_count - self.max_lines + 1}.0')
@@ -0,0 +1,172 @@
+import math
+import threading
+import numpy as np
+
+OVERLOAD = 9.9e37  # 34461A 过载读数（±9.9E37），各模块统一从这里导入，按 abs(读数) >= OVERLOAD 判断
+
+
+class RunningStats(object):
+    """全程统计：Welford 在线算法，按块合并（Chan 并行公式），数值稳定且不保存历史读数"""
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def update(self, values):
+        values = np.asarray(values, dtype=np.float64)
+        n = len(values)
+        if not n:
+            return
+        mean = float(values.mean())
+        m2 = float(np.square(values - mean).sum())
+        total = self.count + n
+        delta = mean - self.mean
+        self.mean += delta * n / total
+        self.m2 += m2 + delta * delta * self.count * n / total
+        self.count = total
+        self.min = min(self.min, float(values.min()))
+        self.max = max(self.max, float(values.max()))
+
+    def std(self):
+        """样本标准差（与仪器 CALC:AVER:SDEV 一致）"""
+        return math.sqrt(self.m2 / (self.count - 1)) if self.count > 1 else 0.0
+
+    def as_dict(self):
+        return _summary(self.count, self.mean, self.std(), self.min, self.max)
+
+
+class RollingWindow(object):
+    """最近 size 个读数的滚动统计
+
+    读数存放在 NumPy 环形缓冲区中；和与平方和以窗口中第一个读数为偏移量增量维护（写入 O(1)/读数），
+    每写满一轮按缓冲区重新精确计算一次，避免长时间运行的舍入误差累积。最小/最大值在查询时对缓冲区求得。
+    """
+
+    def __init__(self, size):
+        if size < 2:
+            raise ValueError('滚动窗口长度至少为2')
+        self.size = size
+        self.buffer = np.empty(size)
+        self.reset()
+
+    def reset(self):
+        self.index = 0  # 下一个写入位置
+        self.count = 0
+        self.shift = 0.0
+        self.sum = 0.0  # sum(x - shift)
+        self.sumsq = 0.0  # sum((x - shift)^2)
+        self.written = 0  # 上次精确重算以来写入的读数数
+
+    def update(self, values):
+        values = np.asarray(values, dtype=np.float64)
+        n = len(values)
+        if not n:
+            return
+        if n >= self.size:
+            self.buffer[:] = values[-self.size:]
+            self.index = 0
+            self.count = self.size
+            self._recompute()
+            return
+        if not self.count:
+            self.shift = float(values[0])
+
+        positions = (self.index + np.arange(n)) % self.size
+        removed = self.buffer[positions[self.size - self.count:]]  # 被覆盖的最旧读数
+        added = values - self.shift
+        removed = removed - self.shift
+        self.sum += float(added.sum() - removed.sum())
+        self.sumsq += float(np.square(added).sum() - np.square(removed).sum())
+        self.buffer[positions] = values
+        self.index = int(positions[-1] + 1) % self.size
+        self.count = min(self.count + n, self.size)
+
+        self.written += n
+        if self.written >= self.size:
+            self._recompute()
+
+    def _recompute(self):
+        window = self.view()
+        self.shift = float(window.mean())
+        deviations = window - self.shift
+        self.sum = float(deviations.sum())
+        self.sumsq = float(np.square(deviations).sum())
+        self.written = 0
+
+    def view(self):
+        """窗口中的读数（未按时间排序）"""
+        return self.buffer[:self.count]
+
+    def as_dict(self):
+        n = self.count
+        if not n:
+            return _summary(0, 0.0, 0.0, math.inf, -math.inf)
+        mean = self.shift + self.sum / n
+        var = (self.sumsq - self.sum * self.sum / n) / (n - 1) if n > 1 else 0.0
+        window = self.view()
+        return _summary(n, mean, math.sqrt(max(var, 0.0)), float(window.min()), float(window.max()))
+
+
+def _summary(count, mean, std, minimum, maximum):
+    return {
+        'count': count,
+        'mean': mean,
+        'std': std,
+        'min': minimum if count else None,
+        'max': maximum if count else None,
+        'pp': maximum - minimum if count else None,
+    }
+
+
+class StatsEngine(object):
+    """扫描读数的在线统计：全程累计加若干滚动窗口，过载读数单独计数不参与统计
+
+    扫描线程调用 update() 写入，界面线程调用 snapshot() 读取，二者用锁隔离。
+    offload 为 True 时全程统计交给仪器的 CALC:AVER 完成（由调用者定期把 average_stats() 的结果写入
+    instrument），主机只维护滚动窗口。
+    """
+
+    def __init__(self, windows=(100, 1000)):
+        self.lock = threading.Lock()
+        self.total = RunningStats()
+        self.windows = {size: RollingWindow(size) for size in windows}
+        self.overloads = 0
+        self.offload = False
+        self.instrument = None  # 仪器内部统计的最近一次结果
+
+    def reset(self, offload=False):
+        with self.lock:
+            self.total.reset()
+            for window in self.windows.values():
+                window.reset()
+            self.overloads = 0
+            self.offload = offload
+            self.instrument = None
+
+    def update(self, values):
+        values = np.asarray(values, dtype=np.float64)
+        valid = np.abs(values) < OVERLOAD  # 同时排除 NaN
+        with self.lock:
+            if not valid.all():
+                self.overloads += int(len(values) - np.count_nonzero(valid))
+                values = values[valid]
+            if not self.offload:
+                self.total.update(values)
+            for window in self.windows.values():
+                window.update(values)
+
+    def snapshot(self):
+        """[(名称, 统计字典), ...]，全程统计在前"""
+        with self.lock:
+            if self.offload:
+                rows = [('全程（仪器）', self.instrument or _summary(0, 0.0, 0.0, 0.0, 0.0))]
+            else:
+                rows = [('全程', self.total.as_dict())]
+            rows += [(f'最近{size}', window.as_dict()) for size, window in self.windows.items()]
+            return rows
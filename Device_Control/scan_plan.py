@@ -0,0 +1,181 @@
+import time
+import numpy as np
+from Keysight_34461A import READING_MEMORY, DEFAULT_NPLC
+
+FUNCTION_SWITCH_COST = 3  # CONF 切换功能（继电器切换、恢复默认配置）相对一次设置命令的代价
+AC_FUNCTIONS = ('ACV', 'ACI')  # 交流功能不使用 NPLC
+
+
+class ScanStep(object):
+    """扫描计划中的一步：功能、量程（满量程值或 'AUTO'）、积分时间（PLC，None 为默认值）和每周期读数数"""
+
+    def __init__(self, function, range='AUTO', nplc=None, count=1, label=None):
+        if count < 1:
+            raise ValueError('每步读数数至少为1')
+        self.function = function
+        self.range = range
+        if function in AC_FUNCTIONS:
+            self.nplc = None
+        else:
+            self.nplc = DEFAULT_NPLC if nplc is None else nplc
+        self.count = count
+        self.label = label or function
+
+    def key(self):
+        #   配置完全相同的步骤可以合并为一次批量采集
+        return self.function, self.range, self.nplc
+
+
+class ScanGroup(object):
+    #   配置相同的一组步骤：只配置一次，用一次（或几次）批量采集取回全部周期的读数
+
+    def __init__(self, key):
+        self.function, self.range, self.nplc = key
+        self.steps = []  # 计划中的步骤下标，按计划顺序
+
+
+class ScanResult(object):
+    """计划的执行结果，已按计划顺序重建为交错时间线
+
+    各数组等长，依次为 周期 0 的第 0、1、2… 步，周期 1 的第 0、1、2… 步……；
+    step 为读数所属步骤的下标，times 为读数的实际时刻（各组批量采集的时间分布在组内均匀插值）。
+    """
+
+    def __init__(self, plan, step, cycle, times, values):
+        self.plan = plan
+        self.step = step
+        self.cycle = cycle
+        self.times = times
+        self.values = values
+
+    def __len__(self):
+        return len(self.values)
+
+    def for_step(self, index):
+        """某一步在各周期的 (时刻数组, 读数数组)"""
+        mask = self.step == index
+        return self.times[mask], self.values[mask]
+
+    def rows(self):
+        """逐条 (周期, 步骤名称, 功能, 时刻, 读数)"""
+        steps = self.plan.steps
+        for step, cycle, t, value in zip(self.step, self.cycle, self.times, self.values):
+            yield int(cycle), steps[step].label, steps[step].function, float(t), float(value)
+
+
+class ScanPlan(object):
+    """多功能扫描计划：按顺序列出的步骤重复 cycles 个周期
+
+    手动交替测量时每个读数都要重新配置功能和量程；这里由 sequence() 把配置相同的步骤合并、
+    把同一功能的组排在一起并按量程排序，使功能和量程切换次数最少，每组一次批量采集取回所有周期的读数，
+    最后按计划顺序重建交错的时间线。代价是同一周期内各步的读数不再是相邻时刻测得的。
+    """
+
+    def __init__(self, steps=(), cycles=1):
+        if cycles < 1:
+            raise ValueError('周期数至少为1')
+        self.steps = list(steps)
+        self.cycles = cycles
+
+    def add(self, function, range='AUTO', nplc=None, count=1, label=None):
+        self.steps.append(ScanStep(function, range, nplc, count, label))
+        return self
+
+    def groups(self):
+        """按配置合并的步骤组（按各组在计划中首次出现的顺序）"""
+        groups = {}
+        for index, step in enumerate(self.steps):
+            groups.setdefault(step.key(), ScanGroup(step.key())).steps.append(index)
+        return list(groups.values())
+
+    def sequence(self, state=None):
+        """安排各组的执行顺序
+
+        从仪器当前配置（驱动的影子缓存 state）出发，每次选切换代价最小的下一组：
+        切换功能记 FUNCTION_SWITCH_COST，量程或积分时间不同各记 1；代价相同时按功能、量程排序。
+        """
+        remaining = self.groups()
+        state = state or {}
+        current = (state.get('function'), state.get('range', 'AUTO'), state.get('nplc'))
+        ordered = []
+        while remaining:
+            best = min(remaining, key=lambda group: (_switch_cost(current, group), _sort_key(group)))
+            remaining.remove(best)
+            ordered.append(best)
+            current = (best.function, best.range, best.nplc)
+        return ordered
+
+    def switches(self, order=None):
+        """按给定组顺序（缺省为逐步手动交替）执行一遍需要的 (功能切换次数, 量程/积分时间切换次数)"""
+        if order is None:
+            order = [ScanGroup(step.key()) for step in self.steps] * self.cycles
+        functions = settings = 0
+        current = (None, 'AUTO', None)
+        for group in order:
+            if group.function != current[0]:
+                functions += 1
+            else:
+                settings += (group.range != current[1]) + (group.nplc != current[2])
+            current = (group.function, group.range, group.nplc)
+        return functions, settings
+
+    def run(self, meter, stop_event=None):
+        """在 DMM34461A 上执行计划，返回 ScanResult；stop_event 置位时返回已完成各组的读数"""
+        step_parts, cycle_parts, time_parts, value_parts = [], [], [], []
+        for group in self.sequence(meter.state):
+            if stop_event is not None and stop_event.is_set():
+                break
+            # 一组的读数按 周期 -> 计划顺序 -> 步内序号 排列，批量采集依次产出
+            layout_step, layout_cycle = self._layout(group)
+            total = len(layout_step)
+            with meter.batch():
+                meter.conf_function(group.function)
+                meter.set_range(group.range)
+                if group.nplc is not None:
+                    meter.set_nplc(group.nplc)
+            times = np.empty(total)
+            values = np.empty(total)
+            done = 0
+            while done < total:
+                count = min(total - done, READING_MEMORY)
+                start = time.time()
+                block = meter.burst(group.function, count, stop_event=stop_event)
+                if len(block) < count:
+                    break  # 被 stop_event 中止
+                times[done:done + count] = np.linspace(start, time.time(), count)
+                values[done:done + count] = block
+                done += count
+            step_parts.append(layout_step[:done])
+            cycle_parts.append(layout_cycle[:done])
+            time_parts.append(times[:done])
+            value_parts.append(values[:done])
+
+        if not value_parts:
+            empty = np.empty(0)
+            return ScanResult(self, empty.astype(int), empty.astype(int), empty, empty)
+        step = np.concatenate(step_parts)
+        cycle = np.concatenate(cycle_parts)
+        times = np.concatenate(time_parts)
+        values = np.concatenate(value_parts)
+        # 重建交错时间线：按 (周期, 步骤) 稳定排序，同一步内保持采集顺序
+        order = np.lexsort((step, cycle))
+        return ScanResult(self, step[order], cycle[order], times[order], values[order])
+
+    def _layout(self, group):
+        #   组内读数的 (步骤下标, 周期) 排列
+        counts = [self.steps[index].count for index in group.steps]
+        per_cycle = np.repeat(group.steps, counts)
+        step = np.tile(per_cycle, self.cycles)
+        cycle = np.repeat(np.arange(self.cycles), len(per_cycle))
+        return step, cycle
+
+
+def _switch_cost(current, group):
+    if group.function != current[0]:
+        return FUNCTION_SWITCH_COST
+    return (group.range != current[1]) + (group.nplc != current[2])
+
+
+def _sort_key(group):
+    #   同代价时的确定顺序：功能代号，再按量程从小到大（'AUTO' 排在最后）
+    return group.function, group.range == 'AUTO', 0 if group.range == 'AUTO' else group.range
@@ -0,0 +1,74 @@
+import math
+import threading
+import time
+
+
+class DeadlineScheduler(object):
+    """无累积漂移的周期调度器
+
+    第 k 次测量的截止时刻固定为 start + k * period（time.monotonic() 时基），等待时间自动扣除
+    测量和界面开销，误差不会逐次累积。若某次测量拖过了一个或多个完整周期，这些周期计为
+    错过的截止时刻并直接跳过（不补测），同时统计每次唤醒相对截止时刻的抖动。
+    """
+
+    def __init__(self, period, stop_event=None):
+        if period <= 0:
+            raise ValueError('调度周期必须大于0')
+        self.period = period
+        self.stop_event = stop_event if stop_event is not None else threading.Event()
+        self.ticks = 0  # 已执行的周期数
+        self.missed = 0  # 错过的截止时刻数
+        # 抖动（唤醒时刻 - 截止时刻）的在线统计
+        self._mean = 0.0
+        self._m2 = 0.0
+        self._max = 0.0
+
+    def __iter__(self):
+        """逐周期产出 (周期序号, 该周期截止时刻对应的墙钟时间)，stop_event 置位时结束"""
+        mono_start = time.monotonic()
+        wall_start = time.time()
+        k = 0
+        while not self.stop_event.is_set():
+            deadline = mono_start + k * self.period
+            now = time.monotonic()
+            if now < deadline:
+                if self.stop_event.wait(deadline - now):
+                    break
+                now = time.monotonic()
+            late = now - deadline
+            if late >= self.period:
+                skipped = int(late // self.period)
+                self.missed += skipped
+                k += skipped
+                late -= skipped * self.period
+            self._record(late)
+            yield k, wall_start + k * self.period
+            k += 1
+
+    def _record(self, late):
+        #   Welford 在线均值/方差
+        self.ticks += 1
+        delta = late - self._mean
+        self._mean += delta / self.ticks
+        self._m2 += delta * (late - self._mean)
+        self._max = max(self._max, late)
+
+    def should_hand_off(self, min_ticks=10, max_missed_ratio=0.1):
+        """错过截止时刻的比例过高，说明软件轮询维持不了该周期，应改用仪器内部定时器"""
+        total = self.ticks + self.missed
+        return self.ticks >= min_ticks and self.missed > max_missed_ratio * total
+
+    def stats(self):
+        """调度统计：执行/错过的周期数与抖动（毫秒）"""
+        return {
+            'ticks': self.ticks,
+            'missed': self.missed,
+            'jitter_mean_ms': self._mean * 1000,
+            'jitter_std_ms': math.sqrt(self._m2 / self.ticks) * 1000 if self.ticks else 0.0,
+            'jitter_max_ms': self._max * 1000,
+        }
+
+    def summary(self):
+        s = self.stats()
+        return (f"执行 {s['ticks']} 次，错过 {s['missed']} 次，抖动 平均 {s['jitter_mean_ms']:.2f} ms / "
+                f"标准差 {s['jitter_std_ms']:.2f} ms / 最大 {s['jitter_max_ms']:.2f} ms")
@@ -0,0 +1,141 @@
+import threading
+import time
+import pyvisa
+from Keysight_34461A import DMM34461A, SCPIError
+
+# 视为连接中断的异常：总线超时/IO错误、会话已失效、底层套接字/USB错误
+LINK_ERRORS = (pyvisa.errors.VisaIOError, pyvisa.errors.InvalidSession, OSError)
+
+
+class SessionPool(object):
+    """可复用的仪器会话池
+
+    所有会话共用一个资源管理器；断开连接只把会话放回池中而不关闭，再次连接同一地址时直接复用，
+    省去打开会话和重新配置的开销。空闲会话由后台线程定期用 *OPC? 检查是否仍然可用，
+    失效的会话会被关闭并移出池。采集中链路中断时调用 recover() 按指数退避重新连接，
+    并按驱动的影子缓存恢复原来的测量配置。
+    """
+
+    def __init__(self, rm=None, keepalive=10.0, backoff=(0.5, 8.0)):
+        self.rm = rm if rm is not None else pyvisa.ResourceManager()
+        self.keepalive = keepalive  # 空闲会话的检查周期（秒）
+        self.backoff = backoff  # 重连等待时间的 (初始值, 上限)（秒）
+        self.sessions = {}  # 地址 -> DMM34461A
+        self.idle = {}  # 空闲会话的地址 -> 最近一次确认可用的时刻
+        self.lock = threading.Lock()
+        self.closed = threading.Event()
+        self.keepalive_thread = threading.Thread(target=self._keepalive, daemon=True)
+        self.keepalive_thread.start()
+
+    @staticmethod
+    def is_alive(meter):
+        """一次 *OPC? 往返确认会话可用"""
+        try:
+            return meter.K34461A.query('*OPC?').strip() == '1'
+        except Exception:
+            return False
+
+    def acquire(self, address):
+        """取得指定地址的会话：池中有可用会话时直接复用，否则新建连接"""
+        with self.lock:
+            meter = self.sessions.get(address)
+            self.idle.pop(address, None)
+            if meter is not None and self.is_alive(meter):
+                return meter
+            if meter is None:
+                meter = DMM34461A(self.rm)
+            else:
+                self._close_session(meter)
+            meter.connect(address)
+            self.sessions[address] = meter
+            return meter
+
+    def release(self, address):
+        """断开连接：把会话放回池中，仪器切回本地操作"""
+        with self.lock:
+            meter = self.sessions.get(address)
+            if meter is None:
+                return
+            try:
+                meter.local()
+            except Exception:
+                pass
+            self.idle[address] = time.monotonic()
+
+    def suspend(self, address):
+        """交出仪器：关闭会话但保留会话对象（连同计时等设置），另一进程可以独占打开同一地址；
+        之后 acquire() 重新连接"""
+        with self.lock:
+            meter = self.sessions.get(address)
+            if meter is None:
+                return
+            self.idle.pop(address, None)
+            try:
+                meter.local()
+            except Exception:
+                pass
+            self._close_session(meter)
+
+    def recover(self, meter, stop_event=None, max_attempts=None, on_retry=None):
+        """链路中断后重新连接并恢复配置
+
+        等待时间从 backoff[0] 开始每次加倍，不超过 backoff[1]；max_attempts 为 None 时一直重试，
+        直到成功或 stop_event 置位。on_retry(第几次, 异常, 等待秒数) 用于报告进度。
+        恢复前用 *CLS 清掉中断期间堆积的仪器错误；恢复配置时仪器仍报告错误（SCPIError）同样按退避重试。
+        成功返回 True，放弃返回 False。
+        """
+        state = dict(meter.state)
+        delay = self.backoff[0]
+        attempt = 0
+        while stop_event is None or not stop_event.is_set():
+            self._close_session(meter)
+            try:
+                meter.connect(meter.address)
+                meter.K34461A.clear()  # 清掉中断前残留在输出缓冲区中的半截响应
+                meter.K34461A.write('*CLS')  # 清空错误队列，restore 的错误检查只反映恢复命令本身
+                meter.restore(state)
+                return True
+            except LINK_ERRORS + (SCPIError,) as e:
+                attempt += 1
+                if max_attempts is not None and attempt >= max_attempts:
+                    return False
+                if on_retry is not None:
+                    on_retry(attempt, e, delay)
+                if stop_event is not None:
+                    stop_event.wait(delay)
+                else:
+                    time.sleep(delay)
+                delay = min(delay * 2, self.backoff[1])
+        return False
+
+    @staticmethod
+    def _close_session(meter):
+        try:
+            meter.K34461A.close()
+        except Exception:
+            pass  # 链路已断开时关闭也可能失败
+
+    def _keepalive(self):
+        #   定期检查空闲会话，失效的关闭并移出池，下次 acquire 时重新连接
+        while not self.closed.wait(self.keepalive):
+            with self.lock:
+                now = time.monotonic()
+                for address, checked in list(self.idle.items()):
+                    if now - checked < self.keepalive:
+                        continue
+                    meter = self.sessions[address]
+                    if self.is_alive(meter):
+                        self.idle[address] = now
+                    else:
+                        self._close_session(meter)
+                        del self.sessions[address]
+                        del self.idle[address]
+
+    def close(self):
+        """关闭池中所有会话并停止后台检查"""
+        self.closed.set()
+        with self.lock:
+            for meter in self.sessions.values():
+                self._close_session(meter)
+            self.sessions.clear()
+            self.idle.clear()
@@ -0,0 +1,80 @@
+from multiprocessing import shared_memory
+import numpy as np
+
+HEADER_SIZE = 64  # 头部：容量、已提交的写入总数、已预留的写入总数（uint64），其余保留
+RECORD_DTYPE = np.dtype([('time', '<f8'), ('value', '<f8')])  # 时间戳 + 读数
+
+
+class SharedRing(object):
+    """共享内存中的单生产者/单消费者环形缓冲区，跨进程传递带时间戳的读数
+
+    写端（采集进程）先推进预留总数，再把记录写入 写入总数 % 容量 的位置，最后推进提交总数，
+    不加锁也不等待读端；读端（界面进程）记住自己读到的位置，只读取已提交的记录，
+    复制完成后再读一次预留总数，丢弃复制期间可能正被写端覆盖的记录（与 seqlock 相同的校验），
+    落后超过一圈时跳过被覆盖的记录并计入 lost。因此界面卡顿只会丢弃显示数据，不会拖慢采集，也不会读到写了一半的记录。
+    """
+
+    def __init__(self, capacity=None, name=None):
+        create = name is None
+        if create:
+            self.shm = shared_memory.SharedMemory(create=True, size=HEADER_SIZE + capacity * RECORD_DTYPE.itemsize)
+        else:
+            self.shm = shared_memory.SharedMemory(name=name)
+        self.owner = create
+        self.header = np.ndarray((3,), dtype='<u8', buffer=self.shm.buf)  # [容量, 提交总数, 预留总数]
+        if create:
+            self.header[0] = capacity
+            self.header[1] = 0
+            self.header[2] = 0
+        self.capacity = int(self.header[0])
+        self.records = np.ndarray((self.capacity,), dtype=RECORD_DTYPE, buffer=self.shm.buf, offset=HEADER_SIZE)
+        self.tail = 0  # 读端已读到的写入总数
+        self.lost = 0  # 读端因落后被覆盖而丢弃的记录数
+
+    @property
+    def name(self):
+        return self.shm.name
+
+    def write(self, times, values):
+        """追加一批读数（只能由一个进程调用）"""
+        times = np.asarray(times, dtype=np.float64)
+        values = np.asarray(values, dtype=np.float64)
+        n = len(values)
+        head = int(self.header[1])
+        if n > self.capacity:
+            head += n - self.capacity
+            times, values = times[-self.capacity:], values[-self.capacity:]
+            n = self.capacity
+        self.header[2] = head + n  # 先预留：读端据此判断哪些槽位可能正在被覆盖
+        start = head % self.capacity
+        first = min(n, self.capacity - start)
+        self.records['time'][start:start + first] = times[:first]
+        self.records['value'][start:start + first] = values[:first]
+        if first < n:
+            self.records['time'][:n - first] = times[first:]
+            self.records['value'][:n - first] = values[first:]
+        self.header[1] = head + n  # 数据写完后才提交
+
+    def read(self):
+        """取出自上次读取以来的新记录，返回 (时间戳数组, 读数数组)"""
+        head = int(self.header[1])
+        start = max(self.tail, head - self.capacity)
+        self.lost += start - self.tail
+        if head == start:
+            return np.empty(0), np.empty(0)
+        positions = np.arange(start, head) % self.capacity
+        chunk = self.records[positions]  # 复制
+        # 复制期间写端可能已预留并开始覆盖开头的记录：写入总数小于 预留总数 - 容量 的记录都不可信
+        overwritten = min(int(self.header[2]) - self.capacity - start, len(chunk))
+        if overwritten > 0:
+            chunk = chunk[overwritten:]
+            self.lost += overwritten
+        self.tail = head
+        return chunk['time'], chunk['value']
+
+    def close(self):
+        """释放映射；创建者同时删除共享内存块"""
+        self.header = self.records = None  # 先释放指向共享内存的数组视图
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
@@ -0,0 +1,491 @@
+"""34461A 仿真后端
+
+SimResourceManager 与 pyvisa.ResourceManager 用法相同，可直接传给 DMM34461A(rm=...)；
+open_resource 返回的 SimInstrument 在进程内解释本项目用到的 SCPI 子集，并按延迟模型
+模拟总线往返、积分时间（NPLC/APER、自动调零）、量程切换和读数存储器容量，
+便于在没有硬件的 Linux 机器上做性能测量和回归测试。
+"""
+
+import collections
+import struct
+import time
+import numpy as np
+from pyvisa import constants, errors, util
+from running_stats import RunningStats, OVERLOAD
+
+SIM_ADDRESS = 'SIM::34461A::0::INSTR'
+IDN = 'Keysight Technologies,34461A,SIM0000001,A.03.00-SIM'
+READING_MEMORY = 10000
+
+# 各功能的量程（允许超量程20%）和默认信号值
+RANGES = {
+    'VOLT:DC': [0.1, 1, 10, 100, 1000],
+    'VOLT:AC': [0.1, 1, 10, 100, 750],
+    'CURR:DC': [1e-4, 1e-3, 1e-2, 0.1, 1, 3],
+    'CURR:AC': [1e-4, 1e-3, 1e-2, 0.1, 1, 3],
+    'RES': [1e2, 1e3, 1e4, 1e5, 1e6, 1e7, 1e8],
+}
+DEFAULT_SIGNALS = {
+    'VOLT:DC': 1.234567,
+    'VOLT:AC': 0.5,
+    'CURR:DC': 1e-3,
+    'CURR:AC': 2e-3,
+    'RES': 1000.0,
+}
+AC_FUNCTIONS = ('VOLT:AC', 'CURR:AC')  # 交流功能积分时间固定，不受 NPLC 影响
+
+
+class LatencyModel(object):
+    """仿真延迟模型（单位：秒）
+
+    write/query 为每条命令/每次读取的固定总线开销，per_byte 为传输每字节的时间，
+    reading_overhead 为每个读数在积分时间之外的固定开销，range_change 为自动量程切换的继电器与稳定时间，
+    ac_reading 为交流功能每个读数的时间。time_scale 为仿真时间与真实时间之比，小于1时按比例加速运行。
+    """
+
+    def __init__(self, write=0.3e-3, query=1.0e-3, per_byte=1e-7, reading_overhead=0.2e-3,
+                 range_change=5e-3, ac_reading=0.1, line_freq=50.0, time_scale=1.0):
+        self.write = write
+        self.query = query
+        self.per_byte = per_byte
+        self.reading_overhead = reading_overhead
+        self.range_change = range_change
+        self.ac_reading = ac_reading
+        self.line_freq = line_freq
+        self.time_scale = time_scale
+
+
+def short_form(mnemonic):
+    """SCPI 关键字转为短格式：不超过4个字母保持不变，否则取前4个字母，第4个为元音时取前3个"""
+    word = mnemonic.upper()
+    if len(word) <= 4 or not word.isalpha():
+        return word
+    return word[:3] if word[3] in 'AEIOU' else word[:4]
+
+
+class SimInstrument(object):
+    """进程内仿真的 34461A 会话对象，提供 DMM34461A 用到的 pyvisa 资源接口"""
+
+    resource_class = 'INSTR'
+
+    def __init__(self, resource_name, latency=None, signal=None, seed=0):
+        self.resource_name = resource_name
+        self.latency = latency or LatencyModel()
+        self.signal = signal  # 可选 signal(function, sim_times) -> 读数数组，默认恒定值加噪声
+        self.rng = np.random.default_rng(seed)
+        self.timeout = 2000  # 毫秒，与 pyvisa 默认一致
+        self.closed = False
+        self.t0 = time.monotonic()
+        self.output = b''  # 待读取的响应
+        self.stats = collections.Counter()  # 命令计数，便于测试统计总线往返
+        self.cpu_time = 0.0  # 仿真本身消耗的 CPU 时间（秒），基准测试从主机 CPU 时间中扣除
+        self.reset()
+
+    # ---------- 仿真时钟 ----------
+
+    def now(self):
+        return (time.monotonic() - self.t0) / self.latency.time_scale
+
+    def _sleep(self, seconds):
+        if seconds > 0:
+            time.sleep(seconds * self.latency.time_scale)
+
+    # ---------- pyvisa 资源接口 ----------
+
+    def write(self, message):
+        self._check_open()
+        self.stats['write'] += 1
+        self._sleep(self.latency.write + len(message) * self.latency.per_byte)
+        cpu_start = time.process_time()
+        responses = []
+        for command in message.strip().split(';'):
+            if command.strip():
+                response = self._execute(command.strip())
+                if response is not None:
+                    responses.append(response)
+        if responses:
+            self.output = b';'.join(responses) + b'\n'
+        self.cpu_time += time.process_time() - cpu_start
+        return len(message)
+
+    def read_raw(self, size=None):
+        self._check_open()
+        if not self.output:
+            self._timeout()
+        data, self.output = self.output, b''
+        self.stats['read'] += 1
+        self._sleep(self.latency.query + len(data) * self.latency.per_byte)
+        return data
+
+    def read_bytes(self, count, chunk_size=None, break_on_termchar=False):
+        self._check_open()
+        if len(self.output) < count:
+            self._timeout()
+        data, self.output = self.output[:count], self.output[count:]
+        self._sleep(len(data) * self.latency.per_byte)
+        return data
+
+    def read(self, termination=None, encoding=None):
+        return self.read_raw().decode('ascii').rstrip('\n')
+
+    def query(self, message, delay=None):
+        self.write(message)
+        return self.read()
+
+    def query_binary_values(self, message, datatype='f', is_big_endian=False, container=list,
+                            delay=None, header_fmt='ieee', expect_termination=True, data_points=0,
+                            chunk_size=None):
+        self.write(message)
+        block = self.read_raw()
+        return util.from_ieee_block(block, datatype, is_big_endian, container)
+
+    def clear(self):
+        self.output = b''
+
+    def close(self):
+        self.closed = True
+
+    def _check_open(self):
+        if self.closed:
+            raise errors.InvalidSession()
+
+    def _timeout(self):
+        raise errors.VisaIOError(constants.StatusCode.error_timeout)
+
+    # ---------- 仪器状态 ----------
+
+    def reset(self):
+        """*RST：恢复默认配置并清空读数存储器"""
+        self.function = 'VOLT:DC'
+        self.ranges = {f: 'AUTO' for f in RANGES}
+        self.current_range = {f: RANGES[f][-1] for f in RANGES}  # 自动量程当前所在量程
+        self.nplc = {f: 10.0 for f in RANGES}
+        self.aperture = {f: None for f in RANGES}
+        self.autozero = True
+        self.impedance_auto = False
+        self.trig_source = 'IMM'
+        self.trig_count = 1
+        self.samp_source = 'IMM'
+        self.samp_count = 1
+        self.samp_timer = 1.0
+        self.trig_delay = 0.0
+        self.data_format = 'ASCII'
+        self.swapped = False
+        self.memory = collections.deque()
+        self.errors = collections.deque()
+        self.overflows = 0  # 读数存储器溢出丢弃的读数总数
+        self.calc_aver = False  # CALC:AVER 内部统计
+        self.average = RunningStats()
+        self.acq = None  # 进行中的采集：dict(start, period, total, produced)
+
+    def reading_time(self, function=None):
+        """单个读数耗时：积分时间（直流功能开启自动调零时加倍）加固定开销"""
+        function = function or self.function
+        if function in AC_FUNCTIONS:
+            return self.latency.ac_reading
+        aperture = self.aperture[function]
+        integration = aperture if aperture is not None else self.nplc[function] / self.latency.line_freq
+        if self.autozero:
+            integration *= 2
+        return integration + self.latency.reading_overhead
+
+    def _signal_values(self, times):
+        if self.signal is not None:
+            return np.array(self.signal(self.function, times), dtype=np.float64)
+        base = DEFAULT_SIGNALS[self.function]
+        return base + abs(base) * 1e-5 * self.rng.standard_normal(len(times))
+
+    def _apply_range(self, values):
+        #   固定量程时超量程读数记为过载；自动量程时记录量程切换次数并计入切换耗时
+        function = self.function
+        ranges = RANGES[function]
+        fixed = self.ranges[function]
+        if fixed != 'AUTO':
+            values[np.abs(values) > fixed * 1.2] = OVERLOAD
+            return 0
+        limits = np.array(ranges) * 1.2
+        values[np.abs(values) > limits[-1]] = OVERLOAD
+        chosen = np.minimum(np.searchsorted(limits, np.abs(values)), len(ranges) - 1)
+        previous = np.concatenate(([ranges.index(self.current_range[function])], chosen[:-1]))
+        changes = int(np.count_nonzero(chosen != previous))
+        self.current_range[function] = ranges[chosen[-1]]
+        self.stats['range_changes'] += changes
+        return changes
+
+    def _initiate(self):
+        count = self.samp_count
+        total = float('inf') if self.trig_count == 'INF' else self.trig_count * count
+        period = self.reading_time()
+        if self.samp_source == 'TIM' and count > 1:
+            period = max(self.samp_timer, period)
+        self.memory.clear()
+        self.acq = {'start': self.now() + self.trig_delay, 'period': period, 'total': total, 'produced': 0}
+
+    def _advance(self):
+        #   按仿真时钟补齐到当前时刻为止应产生的读数
+        acq = self.acq
+        if acq is None:
+            return
+        due = int((self.now() - acq['start']) / acq['period'])
+        due = min(due, acq['total'])
+        n = int(due - acq['produced'])
+        if n <= 0:
+            return
+        times = acq['start'] + (acq['produced'] + 1 + np.arange(n)) * acq['period']
+        values = self._signal_values(times)
+        acq['start'] += self._apply_range(values) * self.latency.range_change
+        acq['produced'] += n
+        if self.calc_aver:
+            self.average.update(values[np.abs(values) < OVERLOAD])
+        self.memory.extend(values.tolist())
+        excess = len(self.memory) - READING_MEMORY
+        if excess > 0:
+            for _ in range(excess):
+                self.memory.popleft()
+            self.overflows += excess
+            self.errors.append('+305,"Reading memory overflow, oldest readings discarded"')
+        if acq['produced'] >= acq['total']:
+            self.acq = None
+
+    def _wait_complete(self):
+        #   FETC?/READ? 等待采集完成，超过会话超时时间则报超时
+        acq = self.acq
+        if acq is None:
+            return
+        if acq['total'] == float('inf'):
+            self.errors.append('-213,"Init ignored; infinite trigger count"')
+            return
+        remaining = acq['start'] + acq['total'] * acq['period'] - self.now()
+        if self.timeout is not None and remaining * self.latency.time_scale > self.timeout / 1000.0:
+            self._sleep(self.timeout / 1000.0 / self.latency.time_scale)
+            self._advance()
+            self._timeout()
+        self._sleep(remaining)
+        self._advance()
+
+    def _format(self, values, block=False):
+        if self.data_format == 'REAL':
+            body = struct.pack(('<' if self.swapped else '>') + 'd' * len(values), *values)
+            block = True
+        else:
+            body = ','.join(f'{v:+.9E}' for v in values).encode('ascii')
+        if not block:
+            return body
+        length = str(len(body))
+        return b'#' + str(len(length)).encode('ascii') + length.encode('ascii') + body
+
+    # ---------- SCPI 解释 ----------
+
+    def _execute(self, command):
+        self.stats['commands'] += 1
+        header, _, args = command.lstrip(':').partition(' ')
+        args = args.strip()
+        query = header.endswith('?')
+        nodes = [short_form(n) for n in header.rstrip('?').split(':') if n]
+        path = ':'.join(nodes)
+        try:
+            response = self._dispatch(nodes, path, args, query)
+        except (ValueError, KeyError, IndexError):
+            self.errors.append(f'-113,"Undefined header; {command}"')
+            return None
+        if isinstance(response, str):
+            return response.encode('ascii')
+        return response
+
+    @staticmethod
+    def _function_of(nodes):
+        #   解析功能节点，VOLT/CURR 省略 AC/DC 时默认为 DC
+        if nodes[0] == 'RES':
+            return 'RES', nodes[1:]
+        if len(nodes) > 1 and nodes[1] in ('DC', 'AC'):
+            return nodes[0] + ':' + nodes[1], nodes[2:]
+        return nodes[0] + ':DC', nodes[1:]
+
+    def _configure(self, function, args):
+        #   CONF/MEAS：恢复该功能默认设置，可带量程参数
+        self._advance()
+        self.acq = None
+        self.function = function
+        rng = args.split(',')[0].strip().upper() if args else 'AUTO'
+        self.ranges[function] = 'AUTO' if rng in ('AUTO', 'DEF', '') else float(rng)
+        self.nplc[function] = 10.0
+        self.aperture[function] = None
+        self.trig_source = 'IMM'
+        self.trig_count = 1
+        self.samp_source = 'IMM'
+        self.samp_count = 1
+        self.trig_delay = 0.0
+
+    def _average(self, setting, args, query):
+        #   CALC:AVER 子系统：STAT / CLE / COUN? / AVER? / SDEV? / MIN? / MAX? / PTP? / ALL?
+        self._advance()
+        if setting == 'STAT':
+            if query:
+                return '1' if self.calc_aver else '0'
+            self.calc_aver = short_form(args) in ('ON', '1')
+            return None
+        if setting == 'CLE':
+            self.average.reset()
+            return None
+        stats = self.average.as_dict()
+        if stats['count'] == 0:
+            stats.update(min=0.0, max=0.0, pp=0.0)
+        fields = {'AVER': 'mean', 'SDEV': 'std', 'MIN': 'min', 'MAX': 'max', 'PTP': 'pp'}
+        if setting == 'COUN':
+            return f"{stats['count']:+.9E}"
+        if setting == 'ALL':
+            return ','.join(f"{stats[key]:+.9E}" for key in ('mean', 'std', 'min', 'max'))
+        return f"{stats[fields[setting]]:+.9E}"
+
+    def _dispatch(self, nodes, path, args, query):
+        if path == '*IDN':
+            return IDN
+        if path == '*OPC':
+            return '1' if query else None
+        if path == '*RST':
+            self.reset()
+            return None
+        if path == '*CLS':
+            self.errors.clear()
+            return None
+        if path == 'SYST:ERR':
+            return self.errors.popleft() if self.errors else '+0,"No error"'
+        if path == 'SYST:LFR':
+            return f'{self.latency.line_freq:g}'
+        if path == 'TRIG:DEL:AUTO':
+            if query:
+                return '1' if self.trig_delay == 0.0 else '0'
+            if args.upper() in ('ON', '1'):
+                self.trig_delay = 0.0  # 自动延时：仿真中按0处理
+            return None
+        if path == 'TRIG:DEL':
+            if query:
+                return f'{self.trig_delay:+.9E}'
+            self.trig_delay = 0.0 if short_form(args) in ('AUTO', 'DEF', 'MIN') else float(args)
+            return None
+        if path in ('SYST:LOC', 'SYST:REM'):
+            return None
+        if path == 'FORM:DATA':
+            self.data_format = 'REAL' if args.upper().startswith('REAL') else 'ASCII'
+            return None
+        if path == 'FORM:BORD':
+            self.swapped = args.upper().startswith('SWAP')
+            return None
+        if nodes[0] == 'CONF':
+            if query:
+                return '"' + self.function + ' ' + str(self.ranges[self.function]) + '"'
+            self._configure(self._function_of(nodes[1:])[0], args)
+            return None
+        if nodes[0] == 'MEAS':
+            self._configure(self._function_of(nodes[1:])[0], args)
+            self._initiate()
+            self._wait_complete()
+            return self._format(list(self.memory))
+        if path == 'INIT':
+            self._initiate()
+            return None
+        if path == 'ABOR':
+            self._advance()
+            self.acq = None
+            return None
+        if path == 'READ':
+            self._initiate()
+            self._wait_complete()
+            return self._format(list(self.memory))
+        if path == 'FETC':
+            self._wait_complete()
+            return self._format(list(self.memory))
+        if path == 'R':
+            self._advance()
+            n = int(float(args)) if args else len(self.memory)
+            values = [self.memory.popleft() for _ in range(min(n, len(self.memory)))]
+            return self._format(values, block=True)
+        if path == 'DATA:POIN':
+            self._advance()
+            return str(len(self.memory))
+        if path == 'TRIG:SOUR':
+            self.trig_source = short_form(args)
+            return None
+        if path == 'TRIG:COUN':
+            value = short_form(args)
+            self.trig_count = 'INF' if value == 'INF' else int(float(args))
+            return None
+        if path == 'SAMP:COUN':
+            self.samp_count = int(float(args))
+            return None
+        if path == 'SAMP:SOUR':
+            self.samp_source = short_form(args)
+            return None
+        if path == 'SAMP:TIM':
+            self.samp_timer = float(args)
+            return None
+        if nodes[:2] == ['CALC', 'AVER']:
+            return self._average(':'.join(nodes[2:]), args, query)
+        if path in ('ZERO:AUTO', 'VOLT:DC:ZERO:AUTO', 'CURR:DC:ZERO:AUTO', 'RES:ZERO:AUTO'):
+            self.autozero = short_form(args) in ('ON', '1')
+            return None
+
+        # 各功能的参数设置：NPLC / APER / RANG / IMP:AUTO
+        function, rest = self._function_of(nodes)
+        setting = ':'.join(rest)
+        if setting == 'NPLC':
+            if query:
+                return str(self.nplc[function])
+            self.nplc[function] = float(args)
+            self.aperture[function] = None
+            return None
+        if setting == 'APER':
+            if query:
+                return str(self.aperture[function])
+            self.aperture[function] = float(args)
+            return None
+        if setting == 'APER:ENAB':
+            if short_form(args) in ('OFF', '0'):
+                self.aperture[function] = None
+            return None
+        if setting == 'RANG':
+            if query:
+                rng = self.ranges[function]
+                return str(self.current_range[function] if rng == 'AUTO' else rng)
+            self.ranges[function] = float(args)
+            if self.ranges[function] != self.current_range[function]:
+                self.current_range[function] = self.ranges[function]
+                self.stats['range_changes'] += 1
+                self._sleep(self.latency.range_change)  # 手动换档同样要切换继电器
+            return None
+        if setting == 'RANG:AUTO':
+            if short_form(args) in ('ON', '1'):
+                self.ranges[function] = 'AUTO'
+            elif self.ranges[function] == 'AUTO':
+                self.ranges[function] = self.current_range[function]
+            return None
+        if setting == 'IMP:AUTO':
+            self.impedance_auto = short_form(args) in ('ON', '1')
+            return None
+        raise KeyError(path)
+
+
+class SimResourceManager(object):
+    """仿真资源管理器，接口与 pyvisa.ResourceManager 相同"""
+
+    def __init__(self, latency=None, signal=None, resources=(SIM_ADDRESS,)):
+        self.latency = latency or LatencyModel()
+        self.signal = signal
+        self.resources = tuple(resources)
+        self.opened = {}
+
+    def list_resources(self, query='?*::INSTR'):
+        return self.resources
+
+    def open_resource(self, resource_name, **kwargs):
+        if resource_name not in self.resources:
+            raise errors.VisaIOError(constants.StatusCode.error_resource_not_found)
+        instrument = SimInstrument(resource_name, self.latency, self.signal)
+        for key, value in kwargs.items():
+            setattr(instrument, key, value)
+        self.opened[resource_name] = instrument
+        return instrument
+
+    def close(self):
+        for instrument in self.opened.values():
+            instrument.close()
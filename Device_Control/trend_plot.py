@@ -0,0 +1,319 @@
+import queue
+import time
+import tkinter as tk
+import numpy as np
+from running_stats import OVERLOAD
+
+
+def _grow(array, size, limit=None):
+    #   容量不足时按倍数扩容（不超过 limit），返回可容纳 size 个元素的数组
+    if size <= len(array):
+        return array
+    capacity = max(size, len(array) * 2)
+    new = np.empty(capacity if limit is None else min(capacity, limit), dtype=array.dtype)
+    new[:len(array)] = array
+    return new
+
+
+class MinMaxPyramid(object):
+    """最小/最大值金字塔
+
+    第 k 级的每个点记录原始数据中连续 FACTOR**k 个样本的最小值和最大值，随数据追加增量更新。
+    查询时选择恰好能覆盖每个像素列的那一级，因此抽取代价只与像素宽度有关，与样本总数无关。
+    最多保留最近 limit 个样本：超出时丢弃较早的一半并重建各级，内存占用有界，完整数据由记录文件保存。
+    """
+
+    FACTOR = 8
+
+    def __init__(self, capacity=65536, limit=1 << 21):
+        self.times = np.empty(min(capacity, limit))
+        self.values = np.empty(min(capacity, limit))
+        self.limit = limit
+        self.size = 0
+        self.dropped = 0  # 因超出 limit 而丢弃的较早样本数
+        self.levels = []  # 每级为 [mins, maxs, size]
+
+    def clear(self):
+        self.size = 0
+        self.dropped = 0
+        self.levels = []
+
+    def extend(self, times, values):
+        """追加一批样本（过载读数记为 NaN，不参与纵轴范围），返回本次丢弃的较早样本数"""
+        times = np.asarray(times, dtype=np.float64)
+        values = np.asarray(values, dtype=np.float64)
+        n = len(values)
+        dropped = 0
+        if self.size + n > self.limit:
+            dropped = self._discard(n)
+            if n > self.limit:
+                times, values = times[-self.limit:], values[-self.limit:]
+                n = self.limit
+        self.times = _grow(self.times, self.size + n, self.limit)
+        self.values = _grow(self.values, self.size + n, self.limit)
+        self.times[self.size:self.size + n] = times
+        self.values[self.size:self.size + n] = values
+        segment = self.values[self.size:self.size + n]
+        segment[np.abs(segment) >= OVERLOAD] = np.nan
+        self.size += n
+        self._update_levels()
+        return dropped
+
+    def _discard(self, incoming):
+        #   只保留最近 limit/2 个样本（含即将追加的 incoming 个），较早的样本和各级归并结果一并丢弃后重建
+        keep = max(min(self.limit // 2 - incoming, self.size), 0)
+        dropped = self.size - keep + max(incoming - self.limit, 0)
+        self.times[:keep] = self.times[self.size - keep:self.size]
+        self.values[:keep] = self.values[self.size - keep:self.size]
+        self.size = keep
+        self.levels = []
+        self.dropped += dropped
+        return dropped
+
+    def _update_levels(self):
+        #   逐级把新凑满的 FACTOR 个下级点归并为一个上级点
+        f = self.FACTOR
+        src_min = src_max = self.values
+        src_size = self.size
+        k = 0
+        while src_size >= f:
+            if k == len(self.levels):
+                self.levels.append([np.empty(1024), np.empty(1024), 0])
+            level = self.levels[k]
+            done, complete = level[2], src_size // f
+            if complete > done:
+                level[0] = _grow(level[0], complete)
+                level[1] = _grow(level[1], complete)
+                block_min = src_min[done * f:complete * f].reshape(-1, f)
+                block_max = src_max[done * f:complete * f].reshape(-1, f)
+                level[0][done:complete] = np.fmin.reduce(block_min, axis=1)
+                level[1][done:complete] = np.fmax.reduce(block_max, axis=1)
+                level[2] = complete
+            src_min, src_max, src_size = level[0], level[1], level[2]
+            k += 1
+
+    def decimate(self, start, stop, width):
+        """把样本区间 [start, stop) 抽取为不超过 width 列的 (样本位置, 最小值, 最大值)
+
+        样本数不多于 2*width 时直接返回原始点（最小值与最大值相同）。
+        """
+        n = stop - start
+        if n <= 2 * width:
+            x = np.arange(start, stop)
+            y = self.values[start:stop]
+            return x, y, y
+
+        # 选取仍能保证每列至少一个点的最粗一级
+        k, block = 0, 1
+        while k < len(self.levels) and n // (block * self.FACTOR) >= width:
+            k += 1
+            block *= self.FACTOR
+
+        if k == 0:
+            mins = maxs = self.values[start:stop]
+            first = start
+        else:
+            level = self.levels[k - 1]
+            first = start // block
+            last = min(-(-stop // block), level[2])
+            mins = level[0][first:last]
+            maxs = level[1][first:last]
+            first *= block
+            tail = last * block
+            if tail < stop:
+                # 尚未凑满一个块的尾部数据直接取原始值
+                tail_values = self.values[tail:stop]
+                mins = np.append(mins, np.nanmin(tail_values) if np.isfinite(tail_values).any() else np.nan)
+                maxs = np.append(maxs, np.nanmax(tail_values) if np.isfinite(tail_values).any() else np.nan)
+
+        edges = np.unique(np.linspace(0, len(mins), width + 1).astype(int)[:-1])
+        x = first + (edges + np.diff(np.append(edges, len(mins))) / 2.0) * block
+        return x, np.fmin.reduceat(mins, edges), np.fmax.reduceat(maxs, edges)
+
+
+class TrendPlot(object):
+    """嵌入式实时趋势图
+
+    采集线程通过 append() 把数据放入队列即可返回，GUI 线程按帧率合并数据并重绘。
+    滚轮缩放、左键拖动平移，双击恢复为跟随最新数据的全览视图。
+    """
+
+    MARGIN_LEFT = 70
+    MARGIN = 10
+    MARGIN_BOTTOM = 20
+
+    def __init__(self, master, fps=10, **canvas_options):
+        self.canvas = tk.Canvas(master, background='white', highlightthickness=0, **canvas_options)
+        self.data = MinMaxPyramid()
+        self.queue = queue.SimpleQueue()
+        self.interval = int(1000 / fps)
+        self.follow = True  # True 时视图始终覆盖全部历史数据
+        self.view = (0, 0)  # 当前视图的样本区间 [start, stop)
+        self.dirty = True
+        self.unit = ''
+        self._drag_x = None
+
+        self.canvas.bind('<Configure>', lambda e: self._mark_dirty())
+        self.canvas.bind('<MouseWheel>', self._on_wheel)
+        self.canvas.bind('<Button-4>', lambda e: self._zoom(e.x, 0.8))  # X11 滚轮
+        self.canvas.bind('<Button-5>', lambda e: self._zoom(e.x, 1.25))
+        self.canvas.bind('<ButtonPress-1>', self._on_press)
+        self.canvas.bind('<B1-Motion>', self._on_drag)
+        self.canvas.bind('<Double-Button-1>', self._on_reset)
+        self.canvas.after(self.interval, self._tick)
+
+    def grid(self, **kwargs):
+        self.canvas.grid(**kwargs)
+
+    def append(self, times, values):
+        """追加数据（可在任意线程调用，不阻塞采集）"""
+        self.queue.put((np.asarray(times, dtype=np.float64), np.asarray(values, dtype=np.float64)))
+
+    def load(self, times, values):
+        """在 GUI 线程中一次性载入历史数据（如记录文件），替换当前内容"""
+        self.clear()
+        self.data.extend(times, values)
+        self._mark_dirty()
+
+    def load_capture(self, reader):
+        """逐块载入采集文件（capture_file.CaptureReader），无需把整个文件读入内存再拷贝；超出保留上限时只保留最近的部分"""
+        self.clear(reader.metadata.get('unit', ''))
+        for times, values in reader.iter_chunks():
+            self.data.extend(times, values)
+        self._mark_dirty()
+
+    def clear(self, unit=''):
+        """清空曲线，unit 为纵轴单位"""
+        while not self.queue.empty():
+            self.queue.get_nowait()
+        self.data.clear()
+        self.unit = unit
+        self.follow = True
+        self.view = (0, 0)
+        self._mark_dirty()
+
+    def _mark_dirty(self):
+        self.dirty = True
+
+    def _tick(self):
+        #   合并本帧到达的数据，有变化时重绘
+        batches = []
+        while not self.queue.empty():
+            batches.append(self.queue.get_nowait())
+        if batches:
+            dropped = self.data.extend(np.concatenate([b[0] for b in batches]),
+                                       np.concatenate([b[1] for b in batches]))
+            if dropped and not self.follow:
+                self._shift_view(dropped)
+            if self.follow:
+                self.dirty = True
+
+        try:
+            if self.dirty:
+                self.dirty = False
+                self._redraw()
+            self.canvas.after(self.interval, self._tick)
+        except tk.TclError:
+            pass  # 窗口已销毁，停止刷新
+
+    def _shift_view(self, dropped):
+        #   较早的样本被丢弃后，把浏览中的视图区间平移到新的样本位置；视图已整个被丢弃时恢复全览
+        start, stop = self.view
+        if stop - dropped < 2:
+            self.follow = True
+        else:
+            self.view = (max(start - dropped, 0), stop - dropped)
+        self._mark_dirty()
+
+    def _plot_width(self):
+        return max(self.canvas.winfo_width() - self.MARGIN_LEFT - self.MARGIN, 1)
+
+    def _redraw(self):
+        canvas = self.canvas
+        canvas.delete('all')
+        width = self._plot_width()
+        height = max(canvas.winfo_height() - self.MARGIN - self.MARGIN_BOTTOM, 1)
+        left, top = self.MARGIN_LEFT, self.MARGIN
+
+        if self.follow:
+            self.view = (0, self.data.size)
+        start, stop = self.view
+        canvas.create_rectangle(left, top, left + width, top + height, outline='gray')
+        if stop - start < 1:
+            canvas.create_text(left + width / 2, top + height / 2, text='暂无数据', fill='gray')
+            return
+
+        x, mins, maxs = self.data.decimate(start, stop, width)
+        finite = np.isfinite(mins) & np.isfinite(maxs)
+        if not finite.any():
+            canvas.create_text(left + width / 2, top + height / 2, text='overload', fill='red')
+            return
+        y_low, y_high = float(mins[finite].min()), float(maxs[finite].max())
+        if y_high == y_low:
+            y_low, y_high = y_low - 0.5 * (abs(y_low) or 1), y_high + 0.5 * (abs(y_high) or 1)
+        span = max(stop - start - 1, 1)
+
+        px = left + (x - start) / span * width
+        py_low = top + (y_high - mins) / (y_high - y_low) * height
+        py_high = top + (y_high - maxs) / (y_high - y_low) * height
+
+        # 每列画一段从最小值到最大值的竖线，相邻列首尾相连；整列过载（NaN）处断开，
+        # 曲线按缺口分段，每段一个 Canvas 对象
+        columns = np.flatnonzero(finite)
+        for segment in np.split(columns, np.flatnonzero(np.diff(columns) > 1) + 1):
+            coords = np.empty(len(segment) * 4)
+            coords[0::4], coords[1::4] = px[segment], py_low[segment]
+            coords[2::4], coords[3::4] = px[segment], py_high[segment]
+            canvas.create_line(*coords.tolist(), fill='blue')
+
+        # 坐标轴标注：纵轴上下限，横轴起止时间
+        canvas.create_text(left - 5, top, text=f'{y_high:.6g} {self.unit}', anchor='ne')
+        canvas.create_text(left - 5, top + height, text=f'{y_low:.6g} {self.unit}', anchor='se')
+        times = self.data.times
+        canvas.create_text(left, top + height + 2, anchor='nw',
+                           text=time.strftime('%H:%M:%S', time.localtime(times[start])))
+        canvas.create_text(left + width, top + height + 2, anchor='ne',
+                           text=time.strftime('%H:%M:%S', time.localtime(times[stop - 1])))
+        canvas.create_text(left + width / 2, top + height + 2, anchor='n', fill='gray',
+                           text=f'{stop - start} 点' + ('' if self.follow else '（双击恢复全览）')
+                           + (f'，较早的 {self.data.dropped} 点已不再显示' if self.data.dropped else ''))
+
+    def _on_wheel(self, event):
+        self._zoom(event.x, 0.8 if event.delta > 0 else 1.25)
+
+    def _zoom(self, mouse_x, factor):
+        #   以鼠标所在位置为中心缩放视图
+        size = self.data.size
+        if size < 2:
+            return
+        start, stop = (0, size) if self.follow else self.view
+        ratio = min(max((mouse_x - self.MARGIN_LEFT) / self._plot_width(), 0.0), 1.0)
+        center = start + ratio * (stop - start)
+        span = min(max(int((stop - start) * factor), 10), size)
+        start = int(min(max(center - ratio * span, 0), size - span))
+        self.view = (start, start + span)
+        self.follow = False
+        self._mark_dirty()
+
+    def _on_press(self, event):
+        self._drag_x = event.x
+
+    def _on_drag(self, event):
+        #   拖动平移视图
+        size = self.data.size
+        if self._drag_x is None or size < 2:
+            return
+        start, stop = (0, size) if self.follow else self.view
+        shift = int((self._drag_x - event.x) / self._plot_width() * (stop - start))
+        self._drag_x = event.x
+        if shift == 0:
+            return
+        span = stop - start
+        start = min(max(start + shift, 0), size - span)
+        self.view = (start, start + span)
+        self.follow = False
+        self._mark_dirty()
+
+    def _on_reset(self, event):
+        self.follow = True
+        self._mark_dirty()
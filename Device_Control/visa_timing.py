@@ -0,0 +1,196 @@
+import json
+import threading
+import time
+from pyvisa import util
+
+PHASES = ('write', 'read', 'parse')  # 总线写入 / 总线读取（含等待仪器响应） / 主机解析
+
+SUB_BUCKET_BITS = 7  # 每个数量级 64 个线性子桶，相对误差约 1.6%
+SUB_BUCKET_HALF = 1 << (SUB_BUCKET_BITS - 1)
+
+
+class LatencyHistogram(object):
+    """HDR 风格的对数-线性直方图（微秒整数）
+
+    记录一个值只需计算桶号并加一，耗时 O(1) 且内存固定，可长期挂在热路径上；
+    分位数按桶累加计数得到，精度约为两位有效数字。
+    """
+
+    def __init__(self):
+        self.counts = []
+        self.count = 0
+        self.total = 0
+        self.min = None
+        self.max = 0
+
+    @staticmethod
+    def bucket_index(value):
+        if value < 2 * SUB_BUCKET_HALF:
+            return value
+        shift = value.bit_length() - SUB_BUCKET_BITS
+        return shift * SUB_BUCKET_HALF + (value >> shift)
+
+    @staticmethod
+    def bucket_value(index):
+        """桶的下界（微秒）"""
+        if index < 2 * SUB_BUCKET_HALF:
+            return index
+        shift = index // SUB_BUCKET_HALF - 1
+        return (index - shift * SUB_BUCKET_HALF) << shift
+
+    def record(self, value_us):
+        value_us = int(value_us)
+        index = self.bucket_index(value_us)
+        if index >= len(self.counts):
+            self.counts.extend([0] * (index + 1 - len(self.counts)))
+        self.counts[index] += 1
+        self.count += 1
+        self.total += value_us
+        self.max = max(self.max, value_us)
+        self.min = value_us if self.min is None else min(self.min, value_us)
+
+    def percentile(self, p):
+        if not self.count:
+            return 0
+        target = max(1, int(round(p / 100.0 * self.count)))
+        seen = 0
+        for index, n in enumerate(list(self.counts)):
+            seen += n
+            if seen >= target:
+                return min(self.bucket_value(index), self.max)
+        return self.max
+
+    def mean(self):
+        return self.total / self.count if self.count else 0.0
+
+    def to_dict(self):
+        return {
+            'count': self.count,
+            'min_us': self.min or 0,
+            'max_us': self.max,
+            'mean_us': self.mean(),
+            'p50_us': self.percentile(50),
+            'p90_us': self.percentile(90),
+            'p99_us': self.percentile(99),
+            'p999_us': self.percentile(99.9),
+            'buckets': [[self.bucket_value(i), n] for i, n in enumerate(self.counts) if n],
+        }
+
+
+def command_key(message):
+    """命令的统计键：去掉参数的命令头，如 'R? 100' -> 'R?'，'SAMP:COUN 10' -> 'SAMP:COUN'；
+    ';' 连接的批量命令记为第一条命令头加 ';...'"""
+    first, _, rest = message.strip().partition(';')
+    key = first.split(' ', 1)[0].lstrip(':').upper()
+    return key + ';...' if rest else key
+
+
+class TimedResource(object):
+    """给 VISA 会话的 write/query/read 计时的包装器
+
+    每条命令按 写入、读取（从发起读取到收完响应，含等待仪器测量的时间）、主机解析 三个阶段分别记入直方图，
+    用于判断瓶颈是总线传输与仪器积分时间还是 Python 解析。计时只包在原有的总线调用外面，
+    不增加总线往返；其他属性和方法原样转发给被包装的会话。
+    """
+
+    def __init__(self, resource):
+        object.__setattr__(self, 'resource', resource)
+        object.__setattr__(self, 'histograms', {})  # (命令, 阶段) -> LatencyHistogram
+        object.__setattr__(self, 'lock', threading.Lock())
+        object.__setattr__(self, 'last_key', '')
+
+    def attach(self, resource):
+        """重新连接后换用新的会话，保留已有统计"""
+        object.__setattr__(self, 'resource', resource)
+
+    def __getattr__(self, name):
+        return getattr(self.resource, name)
+
+    def __setattr__(self, name, value):
+        setattr(self.resource, name, value)  # timeout 等属性直接设置到会话上
+
+    def record(self, key, phase, start_ns):
+        elapsed_us = (time.perf_counter_ns() - start_ns) // 1000
+        histogram = self.histograms.get((key, phase))
+        if histogram is None:
+            with self.lock:
+                histogram = self.histograms.setdefault((key, phase), LatencyHistogram())
+        histogram.record(elapsed_us)
+
+    def record_parse(self, start_ns):
+        """记录上一条查询的解析耗时（由驱动在转换数据后调用）"""
+        self.record(self.last_key, 'parse', start_ns)
+
+    def write(self, message, *args, **kwargs):
+        key = command_key(message)
+        object.__setattr__(self, 'last_key', key)
+        start = time.perf_counter_ns()
+        result = self.resource.write(message, *args, **kwargs)
+        self.record(key, 'write', start)
+        return result
+
+    def _read_timed(self):
+        #   一次 read_raw 读完整条响应
+        start = time.perf_counter_ns()
+        data = self.resource.read_raw()
+        self.record(self.last_key, 'read', start)
+        return data
+
+    def read_raw(self, size=None):
+        return self._read_timed()
+
+    def read(self, *args, **kwargs):
+        return self._read_timed().decode('ascii').rstrip('\r\n')
+
+    def query(self, message, delay=None):
+        self.write(message)
+        if delay:
+            time.sleep(delay)
+        return self.read()
+
+    def query_binary_values(self, message, datatype='f', is_big_endian=False, container=list,
+                            delay=None, header_fmt='ieee', expect_termination=True, data_points=0,
+                            chunk_size=None, **kwargs):
+        """读取 IEEE-488.2 定长块，解析耗时单独计入 parse
+
+        先用一次 read_raw 读取；数据中恰好含有结束符字节而提前结束时，再按块头中的长度补读余下部分。
+        """
+        self.write(message)
+        if delay:
+            time.sleep(delay)
+        key = self.last_key
+        start = time.perf_counter_ns()
+        block = self.resource.read_raw()
+        offset, length = util.parse_ieee_block_header(block)
+        missing = offset + length + (1 if expect_termination else 0) - len(block)
+        if length >= 0 and missing > 0:
+            block += self.resource.read_bytes(missing, break_on_termchar=False)
+        self.record(key, 'read', start)
+
+        start = time.perf_counter_ns()
+        values = util.from_ieee_block(block, datatype, is_big_endian, container)
+        self.record(key, 'parse', start)
+        return values
+
+    def reset(self):
+        with self.lock:
+            self.histograms.clear()
+
+    def summary(self):
+        """各命令各阶段的 (次数, p50, p99, 最大值)（微秒），按命令排序"""
+        with self.lock:
+            items = list(self.histograms.items())  # 采集线程可能同时新增条目
+        rows = []
+        for (key, phase), h in sorted(items, key=lambda kv: (kv[0][0], PHASES.index(kv[0][1]))):
+            rows.append((key, phase, h.count, h.percentile(50), h.percentile(99), h.max))
+        return rows
+
+    def export(self, file_path):
+        """把全部直方图导出为 JSON 文件"""
+        with self.lock:
+            items = list(self.histograms.items())
+        data = {}
+        for (key, phase), h in items:
+            data.setdefault(key, {})[phase] = h.to_dict()
+        with open(file_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, indent=2, ensure_ascii=False)
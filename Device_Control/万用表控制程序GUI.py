@@ -1,14 +1,52 @@
 import tkinter as tk
 from tkinter import ttk, messagebox, scrolledtext
-from Keysight_34461A import DMM34461A
-import pyvisa
+from Keysight_34461A import APERTURES
+from output_console import OutputConsole
+from trend_plot import TrendPlot
+from compressed_log import open_log
+from device_discovery import DeviceDiscovery
+from session_pool import SessionPool
+from acquisition_worker import AcquisitionWorker
+from running_stats import StatsEngine, OVERLOAD
+from scan_plan import ScanPlan
 import time,threading,logging
 from datetime import datetime  # 新增导入
 from tkinter import filedialog  # 新增导入
-import re
 
 logging.basicConfig(level=logging.DEBUG, format='%(asctime)s - %(levelname)s - %(message)s')
 
+# 扫描参数与驱动功能代号的对应关系
+PARAM_FUNCTIONS = {
+    '直流电压': 'DCV',
+    '交流电压': 'ACV',
+    '直流电流': 'DCI',
+    '交流电流': 'ACI',
+    '电阻': 'Res',
+}
+
+# 事件捕获的触发条件：名称 -> (event_capture 条件名, 使用的参数)
+CAPTURE_TRIGGERS = {
+    '电平穿越': ('level', ('threshold',)),
+    '超出窗口': ('window', ('threshold', 'high')),
+    '斜率': ('slope', ('threshold',)),
+    '死区变化': ('deadband', ('threshold',)),
+}
+
+# 扫描参数对应的显示单位
+PARAM_UNITS = {
+    '直流电压': 'V',
+    '交流电压': 'V',
+    '直流电流': 'A',
+    '交流电流': 'A',
+    '电阻': 'Ω',
+}
+
+OUTPUT_MAX_LINES = 5000  # 输出栏最多保留的行数，超出后丢弃最旧的行
+OUTPUT_FPS = 20  # 输出栏刷新帧率
+STATS_REFRESH_MS = 500  # 统计面板刷新周期（毫秒）
+WORKER_POLL_MS = 50  # 从采集进程取读数和消息的周期（毫秒）
+WORKER_STOP_TIMEOUT_MS = 2000  # 请求停止后等待采集进程退出的时间，超时则终止进程
+
 
 class MultimeterGUI:
     def __init__(self, master):
@@ -17,11 +55,18 @@ class MultimeterGUI:
         self.master.iconbitmap('./resources/steam.ico')
         self.multimeter = None  # 延迟初始化
         self.connection_status = False
-        self.scan_thread = None
-        self.stop_event = threading.Event()  # 使用Event代替布尔标志
+        self.worker = None  # 扫描采集进程（AcquisitionWorker）
+        self.plan_stop = None  # 正在运行的扫描计划的停止标志，None 表示没有计划在运行
+        self.scan_param = None  # 最近一次扫描的测量模式，统计面板按它显示单位
+        self.worker_timing = []  # 采集进程会话的逐命令延迟统计
         self.available_devices = []
+        self.recording = None  # 记录文件路径：扫描前选定或扫描中开始，由采集进程直接写入
+        self.discovery = DeviceDiscovery()  # 共享资源管理器 + 设备缓存
+        self.pool = None  # 会话池，首次连接时创建
+        self.stats = StatsEngine()  # 扫描读数的在线统计
         self.create_widgets()
-        self.refresh_devices()  # 启动时自动扫描设备
+        self.show_devices(self.discovery.known(), "已载入{}个缓存设备，正在扫描…")
+        self.refresh_devices()  # 启动时在后台扫描设备
 
     def create_widgets(self):
         """创建界面组件（优化布局版本）"""
@@ -75,6 +120,15 @@ class MultimeterGUI:
         )
         self.btn_info.grid(row=0, column=2, padx=5, pady=2)
 
+        # 逐命令延迟统计按钮
+        self.btn_timing = ttk.Button(
+            self.control_frame,
+            text="性能统计",
+            command=self.show_timing,
+            state=tk.DISABLED
+        )
+        self.btn_timing.grid(row=0, column=3, padx=5, pady=2)
+
         # 测量功能区域（防拉伸优化版）
         self.measure_frame = ttk.LabelFrame(self.master, text="测量功能")
         self.measure_frame.grid(row=3, column=0, padx=10, pady=5, sticky="nsew")
@@ -155,7 +209,8 @@ class MultimeterGUI:
         self.scan_frame.columnconfigure(0, weight=1)  # 按钮组向左对齐
         self.scan_frame.columnconfigure(1, weight=0)  # 参数选择固定宽度
         self.scan_frame.columnconfigure(2, weight=0)  # 间隔输入框（新增）
-        self.scan_frame.columnconfigure(3, weight=0)  # 状态标签固定宽度
+        self.scan_frame.columnconfigure(3, weight=0)  # 批量点数输入框
+        self.scan_frame.columnconfigure(4, weight=0)  # 状态标签固定宽度
 
         # 扫描控制按钮组（左侧，保持不变）
         button_frame = ttk.Frame(self.scan_frame)
@@ -177,6 +232,15 @@ class MultimeterGUI:
         )
         self.btn_stop_scan.pack(side=tk.LEFT, padx=5, pady=2)
 
+        # 多功能扫描计划：按最少切换的顺序分组批量采集
+        self.btn_plan = ttk.Button(
+            button_frame,
+            text="扫描计划",
+            command=self.show_scan_plan,
+            state=tk.DISABLED
+        )
+        self.btn_plan.pack(side=tk.LEFT, padx=5, pady=2)
+
         # 参数选择下拉菜单（中间）
         self.param_frame = ttk.Frame(self.scan_frame)
         self.param_frame.grid(row=0, column=1, sticky="e", padx=(20, 5))
@@ -192,6 +256,7 @@ class MultimeterGUI:
         self.param_combobox.current(0)  # 默认选择第一个
         self.param_combobox.pack(side=tk.LEFT, padx=5)
         self.selected_param = self.param_combobox.get()  # 实时获取当前选择
+        self.param_combobox.bind("<<ComboboxSelected>>", lambda event: self.update_integration_controls())
 
         # ===== 新增间隔输入框 =====
         self.interval_frame = ttk.Frame(self.scan_frame)
@@ -210,13 +275,145 @@ class MultimeterGUI:
         )
         self.interval_entry.pack(side=tk.LEFT, padx=(5, 0))
 
-        # 扫描状态指示器（最右侧，列号改为3）
+        # 批量点数输入框：大于1时使用仪器硬件缓存批量采集
+        self.burst_frame = ttk.Frame(self.scan_frame)
+        self.burst_frame.grid(row=0, column=3, sticky="e", padx=(10, 5))
+
+        ttk.Label(self.burst_frame, text="批量点数:").pack(side=tk.LEFT)
+
+        self.burst_value = tk.StringVar(value="1")  # 默认逐点测量
+        self.burst_entry = ttk.Entry(
+            self.burst_frame,
+            textvariable=self.burst_value,
+            width=6,
+            validate="key",
+            validatecommand=vcmd
+        )
+        self.burst_entry.pack(side=tk.LEFT, padx=(5, 0))
+
+        # 流式采集：仪器按间隔自行定时连续采样，每攒够"批量点数"个读数取回一次
+        self.stream_mode = tk.BooleanVar(value=False)
+        ttk.Checkbutton(
+            self.burst_frame,
+            text="流式",
+            variable=self.stream_mode
+        ).pack(side=tk.LEFT, padx=(5, 0))
+
+        # 仪器统计：全程统计交给仪器的 CALC:AVER 计算
+        self.instrument_stats = tk.BooleanVar(value=False)
+        ttk.Checkbutton(
+            self.burst_frame,
+            text="仪器统计",
+            variable=self.instrument_stats
+        ).pack(side=tk.LEFT, padx=(5, 0))
+
+        # 自适应量程：按信号幅度固定量程，只在过载或持续越界时换档
+        self.adaptive_range = tk.BooleanVar(value=False)
+        ttk.Checkbutton(
+            self.burst_frame,
+            text="自适应量程",
+            variable=self.adaptive_range
+        ).pack(side=tk.LEFT, padx=(5, 0))
+
+        # 扫描状态指示器（最右侧，列号改为4）
         self.scan_status = ttk.Label(
             self.scan_frame,
             text="就绪",
             foreground="gray"
         )
-        self.scan_status.grid(row=0, column=3, sticky="e", padx=10)
+        self.scan_status.grid(row=0, column=4, sticky="e", padx=10)
+
+        # 硬件定时采样：由仪器采样定时器按采样率采集指定点数，时间戳由定时器推算
+        self.timed_frame = ttk.Frame(self.scan_frame)
+        self.timed_frame.grid(row=1, column=0, columnspan=5, sticky="w", padx=5, pady=(0, 2))
+
+        self.timed_mode = tk.BooleanVar(value=False)
+        ttk.Checkbutton(
+            self.timed_frame,
+            text="硬件定时",
+            variable=self.timed_mode
+        ).pack(side=tk.LEFT)
+
+        ttk.Label(self.timed_frame, text="采样率(次/秒):").pack(side=tk.LEFT, padx=(10, 0))
+        self.rate_value = tk.StringVar(value="10")
+        ttk.Entry(
+            self.timed_frame,
+            textvariable=self.rate_value,
+            width=8,
+            validate="key",
+            validatecommand=vcmd
+        ).pack(side=tk.LEFT, padx=(5, 0))
+
+        ttk.Label(self.timed_frame, text="点数(0为连续):").pack(side=tk.LEFT, padx=(10, 0))
+        self.count_value = tk.StringVar(value="1000")
+        ttk.Entry(
+            self.timed_frame,
+            textvariable=self.count_value,
+            width=8,
+            validate="key",
+            validatecommand=vcmd
+        ).pack(side=tk.LEFT, padx=(5, 0))
+
+        ttk.Label(self.timed_frame, text="积分(PLC):").pack(side=tk.LEFT, padx=(10, 0))
+        self.nplc_combobox = ttk.Combobox(
+            self.timed_frame,
+            values=["默认"] + [f"{plc:g}" for plc in sorted(APERTURES)],
+            state="readonly",
+            width=6
+        )
+        self.nplc_combobox.current(0)
+        self.nplc_combobox.pack(side=tk.LEFT, padx=(5, 0))
+
+        self.autozero = tk.BooleanVar(value=True)
+        self.autozero_check = ttk.Checkbutton(
+            self.timed_frame,
+            text="自动调零",
+            variable=self.autozero
+        )
+        self.autozero_check.pack(side=tk.LEFT, padx=(10, 0))
+
+        ttk.Label(self.timed_frame, text="稳定时间(秒):").pack(side=tk.LEFT, padx=(10, 0))
+        self.settle_value = tk.StringVar(value="0")
+        ttk.Entry(
+            self.timed_frame,
+            textvariable=self.settle_value,
+            width=6,
+            validate="key",
+            validatecommand=vcmd
+        ).pack(side=tk.LEFT, padx=(5, 0))
+
+        # 事件捕获：只保存和显示触发条件前后的读数
+        self.capture_frame = ttk.Frame(self.scan_frame)
+        self.capture_frame.grid(row=2, column=0, columnspan=5, sticky="w", padx=5, pady=(0, 2))
+
+        self.capture_mode = tk.BooleanVar(value=False)
+        ttk.Checkbutton(
+            self.capture_frame,
+            text="事件捕获",
+            variable=self.capture_mode
+        ).pack(side=tk.LEFT)
+
+        self.trigger_combobox = ttk.Combobox(
+            self.capture_frame,
+            values=list(CAPTURE_TRIGGERS),
+            state="readonly",
+            width=8
+        )
+        self.trigger_combobox.current(0)
+        self.trigger_combobox.pack(side=tk.LEFT, padx=(10, 0))
+
+        self.capture_entries = {}
+        for key, label, default in (("threshold", "阈值:", "1.0"), ("high", "上限:", "2.0"),
+                                    ("pre", "触发前点数:", "100"), ("post", "触发后点数:", "100")):
+            ttk.Label(self.capture_frame, text=label).pack(side=tk.LEFT, padx=(10, 0))
+            self.capture_entries[key] = tk.StringVar(value=default)
+            ttk.Entry(
+                self.capture_frame,
+                textvariable=self.capture_entries[key],
+                width=7,
+                validate="key",
+                validatecommand=vcmd
+            ).pack(side=tk.LEFT, padx=(5, 0))
 
         # 调整主窗口行权重
         self.master.rowconfigure(4, weight=0)
@@ -237,6 +434,9 @@ class MultimeterGUI:
         self.output_text.tag_config('number', font=('Calibri', 11))
         self.output_text.tag_config('english', font=('Calibri', 11))
 
+        # 批量刷新的输出控制台：各线程只入队，GUI线程按帧率合并插入
+        self.console = OutputConsole(self.output_text, OUTPUT_MAX_LINES, OUTPUT_FPS)
+
         # 插入示例文本
         self.insert_text_with_tags("此处为测量数据实时显示栏\n")
 
@@ -247,12 +447,12 @@ class MultimeterGUI:
             command=self.confirm_exit,
             style="TButton"
         )
-        self.btn_exit.grid(row=0, column=3, padx=5, pady=2)  # 新增第4列
+        self.btn_exit.grid(row=0, column=4, padx=5, pady=2)
 
         # 输出控制按钮
         output_control_frame = ttk.Frame(self.output_frame)
         output_control_frame.grid(row=1, column=0, sticky="ew")
-        output_control_frame.grid_columnconfigure([0, 1], weight=1)  # 设置列权重
+        output_control_frame.grid_columnconfigure([0, 1, 2], weight=1)  # 设置列权重
 
         self.btn_clear = ttk.Button(
             output_control_frame,
@@ -270,6 +470,14 @@ class MultimeterGUI:
         )
         self.btn_save.grid(row=0, column=1, padx=5, pady=2, sticky="ew")
 
+        self.btn_record = ttk.Button(
+            output_control_frame,
+            text="开始记录",
+            command=self.toggle_recording,
+            style="Small.TButton"
+        )
+        self.btn_record.grid(row=0, column=2, padx=5, pady=2, sticky="ew")
+
         # 定义小按钮样式
         style = ttk.Style()
         style.configure("Small.TButton",
@@ -280,6 +488,37 @@ class MultimeterGUI:
         # 调整输出框架行权重
         self.output_frame.grid_rowconfigure(1, weight=0)  # 固定控制按钮行高度
 
+        # 实时趋势图：按像素宽度做最小/最大值抽取，滚轮缩放、拖动平移
+        self.plot_frame = ttk.LabelFrame(self.master, text="趋势图")
+        self.plot_frame.grid(row=6, column=0, padx=10, pady=5, sticky="nsew")
+        self.plot_frame.grid_columnconfigure(0, weight=1)
+        self.plot_frame.grid_rowconfigure(0, weight=1)
+        self.master.rowconfigure(6, weight=1)  # 趋势图随窗口伸缩
+
+        self.trend_plot = TrendPlot(self.plot_frame, height=200)
+        self.trend_plot.grid(row=0, column=0, padx=5, pady=5, sticky="nsew")
+
+        self.btn_open_capture = ttk.Button(
+            self.plot_frame,
+            text="打开记录文件",
+            command=self.open_capture,
+            style="Small.TButton"
+        )
+        self.btn_open_capture.grid(row=1, column=0, padx=5, pady=2, sticky="e")
+
+        # 统计面板：全程与滚动窗口的点数/平均/标准差/最小/最大/峰峰值
+        self.stats_frame = ttk.LabelFrame(self.master, text="统计")
+        self.stats_frame.grid(row=7, column=0, padx=10, pady=5, sticky="ew")
+        self.stats_frame.grid_columnconfigure(0, weight=1)
+        columns = ("name", "count", "mean", "std", "min", "max", "pp")
+        headings = ("范围", "点数", "平均值", "标准差", "最小值", "最大值", "峰峰值")
+        self.stats_tree = ttk.Treeview(self.stats_frame, columns=columns, show="headings", height=3)
+        for column, heading in zip(columns, headings):
+            self.stats_tree.heading(column, text=heading)
+            self.stats_tree.column(column, width=90 if column == "name" else 100, anchor="w" if column == "name" else "e")
+        self.stats_tree.grid(row=0, column=0, padx=5, pady=5, sticky="ew")
+        self.master.after(STATS_REFRESH_MS, self.refresh_stats)
+
         pass
 
 
@@ -289,27 +528,47 @@ class MultimeterGUI:
         self.status_label.config(text=message, foreground=color)
         pass
 
-    def update_output(self, message):
-        """带毫秒级时间戳的输出更新（修改后）"""
-        now = datetime.now()
+    def update_output(self, message, timestamp=None):
+        """带毫秒级时间戳的输出更新（可在扫描线程中直接调用，由控制台合并刷新）
+
+        timestamp 为读数的采集时刻（time.time() 秒），缺省为当前时刻。
+        """
+        now = datetime.now() if timestamp is None else datetime.fromtimestamp(timestamp)
         timestamp = now.strftime("%Y-%m-%d %H:%M:%S") + f".{now.microsecond // 1000:03d}"
         formatted_message = f"[{timestamp}] {message}\n"
-        self.insert_text_with_tags(formatted_message)  # 关键修改：使用标签插入
-        self.output_text.after(0, self.output_text.see, tk.END)
+        self.console.put(formatted_message)
 
     def refresh_devices(self):
-        """刷新可用设备列表"""
-        try:
-            rm = pyvisa.ResourceManager()
-            self.available_devices = rm.list_resources()
-            self.device_combobox["values"] = self.available_devices
-            if self.available_devices:
-                self.device_combobox.current(0)
-                self.update_status(f"发现{len(self.available_devices)}个设备", "blue")
-            else:
-                self.update_status("未检测到可用设备", "red")
-        except Exception as e:
-            messagebox.showerror("VISA错误", f"资源管理器初始化失败: {str(e)}")
+        """在后台刷新可用设备列表，扫描完成后回到界面线程更新"""
+        started = self.discovery.scan_async(
+            lambda found: self.master.after(0, self.on_devices_found, found),
+            lambda e: self.master.after(0, self.on_discovery_error, e)
+        )
+        if started:
+            self.btn_refresh.config(state=tk.DISABLED)
+
+    def on_devices_found(self, found):
+        self.btn_refresh.config(state=tk.NORMAL)
+        self.show_devices(self.discovery.known(), f"发现{len(found)}个设备")
+
+    def on_discovery_error(self, e):
+        self.btn_refresh.config(state=tk.NORMAL)
+        messagebox.showerror("VISA错误", f"资源管理器初始化失败: {str(e)}")
+
+    def show_devices(self, devices, message):
+        """更新设备下拉框，尽量保留当前选择"""
+        selected = self.device_combobox.get()
+        self.available_devices = devices
+        self.device_combobox["values"] = self.available_devices
+        if selected in devices:
+            self.device_combobox.set(selected)
+        elif devices:
+            self.device_combobox.current(0)
+        if devices:
+            description = self.discovery.describe(self.device_combobox.get())
+            self.update_status(message.format(len(devices)) + (f"：{description}" if description else ""), "blue")
+        else:
+            self.update_status("未检测到可用设备", "red")
 
     def connect_device(self):
         """连接选定设备（添加设备信息按钮控制）"""
@@ -323,19 +582,20 @@ class MultimeterGUI:
 
         try:
             # ============= 保持原有连接逻辑 =============
-            self.multimeter = DMM34461A()
-            self.multimeter.K34461A = self.multimeter.rm.open_resource(selected_device)
+            if self.pool is None:
+                self.pool = SessionPool(self.discovery.resource_manager())
+            self.multimeter = self.pool.acquire(selected_device)  # 复用断开前的会话
             self.connection_status = True
             self.update_status(f"已连接至 {selected_device}", "green")  # 保持原有状态更新
             self.btn_connect.config(state=tk.DISABLED)
             self.btn_disconnect.config(state=tk.NORMAL)
-            self.enable_measure_buttons(True)
+            self.update_instrument_controls()
 
             # ============= 新增设备信息按钮控制 =============
             if hasattr(self, 'btn_info'):  # 安全检测防止属性不存在
-                self.btn_info.config(state=tk.NORMAL)  # 关键修复点：启用按钮
-                self.btn_start_scan.config(state=tk.NORMAL)
-                self.scan_status.config(text="就绪", foreground="blue")
+                self.btn_timing.config(state=tk.NORMAL)
+                if self.worker is None:
+                    self.scan_status.config(text="就绪", foreground="blue")
             else:
                 print("Warning: 设备信息按钮未初始化")
 
@@ -355,14 +615,17 @@ class MultimeterGUI:
     def disconnect_device(self):
         try:
             if self.multimeter and self.multimeter.K34461A:
-                self.multimeter.K34461A.close()
+                if self.worker is not None:
+                    self.worker.stop()
+                if self.plan_stop is not None:
+                    self.plan_stop.set()
+                self.pool.release(self.multimeter.address)  # 会话留在池中，重新连接时直接复用
                 self.connection_status = False
                 self.update_status("连接已断开", "orange")
                 self.btn_connect.config(state=tk.NORMAL)
                 self.btn_disconnect.config(state=tk.DISABLED)
-                self.enable_measure_buttons(False)
-                self.btn_info.config(state=tk.DISABLED)
-                self.stop_event.set()
+                self.update_instrument_controls()
+                self.btn_timing.config(state=tk.DISABLED)
             logging.debug("Device disconnected")
         except Exception as e:
             self.update_status(f"断开失败: {str(e)}", "red")
@@ -430,11 +693,206 @@ class MultimeterGUI:
         except Exception as e:
             messagebox.showerror("错误", f"获取设备信息失败: {str(e)}")
 
+    def show_timing(self):
+        """逐命令延迟统计窗口：各命令 写入/读取/解析 阶段的次数与 p50/p99/最大值，每500ms刷新
+
+        计时在首次打开窗口时才挂到会话上（之后启动的扫描在采集进程中同样计时），平时不增加任何开销。
+        """
+        if not self.connection_status:
+            messagebox.showwarning("警告", "请先连接设备")
+            return
+        timing = self.multimeter.enable_timing()
+
+        timing_window = tk.Toplevel(self.master)
+        timing_window.title("性能统计（微秒）")
+        columns = ("command", "phase", "count", "p50", "p99", "max")
+        headings = ("命令", "阶段", "次数", "p50", "p99", "最大")
+        tree = ttk.Treeview(timing_window, columns=columns, show="headings", height=16)
+        for column, heading in zip(columns, headings):
+            tree.heading(column, text=heading)
+            tree.column(column, width=110 if column == "command" else 70, anchor="e" if column not in ("command", "phase") else "w")
+        tree.pack(padx=10, pady=5, fill=tk.BOTH, expand=True)
+
+        def refresh():
+            if not timing_window.winfo_exists():
+                return
+            tree.delete(*tree.get_children())
+            for row in timing.summary():
+                tree.insert("", tk.END, values=row)
+            for key, *values in self.worker_timing:  # 扫描在采集进程中进行，其会话单独统计
+                tree.insert("", tk.END, values=["[扫描] " + key] + values)
+            timing_window.after(500, refresh)
+
+        def export():
+            file_path = filedialog.asksaveasfilename(
+                defaultextension=".json",
+                filetypes=[("JSON文件", "*.json"), ("所有文件", "*.*")],
+                initialfile=f"timing_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+            )
+            if file_path:
+                timing.export(file_path)
+                self.update_output(f"延迟统计已导出至：{file_path}")
+
+        btn_frame = ttk.Frame(timing_window)
+        btn_frame.pack(pady=5)
+        ttk.Button(btn_frame, text="导出", command=export).grid(row=0, column=0, padx=5)
+        ttk.Button(btn_frame, text="清零", command=timing.reset).grid(row=0, column=1, padx=5)
+        ttk.Button(btn_frame, text="关闭", command=timing_window.destroy).grid(row=0, column=2, padx=5)
+        refresh()
+
+    def show_scan_plan(self):
+        """扫描计划窗口：编辑多功能步骤列表，按最少切换的顺序分组批量采集，结果按计划顺序输出"""
+        if not self.connection_status:
+            messagebox.showwarning("警告", "请先连接设备")
+            return
+
+        plan_window = tk.Toplevel(self.master)
+        plan_window.title("扫描计划")
+        steps = []  # (测量模式, 量程, NPLC, 点数)
+        stop_event = threading.Event()
+
+        columns = ("param", "range", "nplc", "count")
+        headings = ("测量模式", "量程", "积分(PLC)", "每周期点数")
+        tree = ttk.Treeview(plan_window, columns=columns, show="headings", height=8)
+        for column, heading in zip(columns, headings):
+            tree.heading(column, text=heading)
+            tree.column(column, width=90, anchor="w" if column == "param" else "e")
+        tree.pack(padx=10, pady=5, fill=tk.BOTH, expand=True)
+
+        edit_frame = ttk.Frame(plan_window)
+        edit_frame.pack(padx=10, pady=2, fill=tk.X)
+        vcmd = (self.master.register(self.validate_number), '%P')
+        param_box = ttk.Combobox(edit_frame, values=list(PARAM_FUNCTIONS), state="readonly", width=10)
+        param_box.current(0)
+        param_box.pack(side=tk.LEFT)
+        ttk.Label(edit_frame, text="量程:").pack(side=tk.LEFT, padx=(10, 0))
+        range_value = tk.StringVar(value="AUTO")
+        ttk.Entry(edit_frame, textvariable=range_value, width=8).pack(side=tk.LEFT, padx=(5, 0))
+        ttk.Label(edit_frame, text="积分(PLC):").pack(side=tk.LEFT, padx=(10, 0))
+        nplc_box = ttk.Combobox(
+            edit_frame,
+            values=["默认"] + [f"{plc:g}" for plc in sorted(APERTURES)],
+            state="readonly",
+            width=6
+        )
+        nplc_box.current(0)
+        nplc_box.pack(side=tk.LEFT, padx=(5, 0))
+        ttk.Label(edit_frame, text="点数:").pack(side=tk.LEFT, padx=(10, 0))
+        count_value = tk.StringVar(value="1")
+        ttk.Entry(edit_frame, textvariable=count_value, width=6, validate="key",
+                  validatecommand=vcmd).pack(side=tk.LEFT, padx=(5, 0))
+
+        def add_step():
+            try:
+                rng = range_value.get().strip().upper() or "AUTO"
+                step = (
+                    param_box.get(),
+                    rng if rng == "AUTO" else float(rng),
+                    None if nplc_box.get() == "默认" else float(nplc_box.get()),
+                    max(int(float(count_value.get())), 1),
+                )
+            except ValueError:
+                messagebox.showwarning("警告", "量程应为 AUTO 或数值", parent=plan_window)
+                return
+            steps.append(step)
+            tree.insert("", tk.END, values=[step[0], step[1], "默认" if step[2] is None else step[2], step[3]])
+
+        def remove_step():
+            for item in tree.selection():
+                del steps[tree.index(item)]
+                tree.delete(item)
+
+        def run_plan():
+            if not steps:
+                messagebox.showwarning("警告", "请先添加步骤", parent=plan_window)
+                return
+            if self.worker is not None or self.plan_stop is not None:
+                messagebox.showwarning("警告", "请先停止正在进行的扫描或扫描计划", parent=plan_window)
+                return
+            try:
+                plan = ScanPlan(cycles=max(int(float(cycles_value.get())), 1))
+            except ValueError:
+                messagebox.showwarning("警告", "请输入有效的周期数", parent=plan_window)
+                return
+            for param, rng, nplc, count in steps:
+                plan.add(PARAM_FUNCTIONS[param], rng, nplc, count, label=param)
+            btn_run.config(state=tk.DISABLED)
+            stop_event.clear()
+            self.plan_stop = stop_event
+            self.update_instrument_controls()  # 计划运行期间会话归后台线程使用
+            threading.Thread(target=execute, args=(plan,), daemon=True).start()
+
+        def execute(plan):
+            #   后台线程中执行计划，结果回到界面线程输出
+            try:
+                start = time.time()
+                result = self.multimeter.run_plan(plan, stop_event)
+                self.multimeter.local()
+                self.master.after(0, report, plan, result, time.time() - start)
+            except Exception as e:
+                self.master.after(0, self.update_output, f"扫描计划执行失败: {str(e)}")
+            finally:
+                self.master.after(0, finish)
+
+        def finish():
+            self.plan_stop = None
+            self.update_instrument_controls()
+            if btn_run.winfo_exists():
+                btn_run.config(state=tk.NORMAL)
+
+        def report(plan, result, elapsed):
+            for cycle, label, function, t, value in result.rows():
+                timestamp = datetime.fromtimestamp(t).strftime('%H:%M:%S.%f')[:-3]
+                self.update_output(f"[{timestamp}] 周期{cycle + 1} {self.format_measurement(label, value)}")
+            manual = sum(plan.switches())
+            planned = sum(plan.switches(plan.sequence()))
+            self.update_output(
+                f"扫描计划完成：{len(result)} 个读数，耗时 {elapsed:.2f}s，"
+                f"配置切换 {planned} 次（逐点交替需 {manual} 次）"
+            )
+
+        def close():
+            stop_event.set()
+            plan_window.destroy()
+
+        btn_frame = ttk.Frame(plan_window)
+        btn_frame.pack(pady=5)
+        ttk.Button(btn_frame, text="添加", command=add_step).grid(row=0, column=0, padx=5)
+        ttk.Button(btn_frame, text="删除", command=remove_step).grid(row=0, column=1, padx=5)
+        ttk.Label(btn_frame, text="周期数:").grid(row=0, column=2, padx=(10, 0))
+        cycles_value = tk.StringVar(value="10")
+        ttk.Entry(btn_frame, textvariable=cycles_value, width=6, validate="key",
+                  validatecommand=vcmd).grid(row=0, column=3, padx=5)
+        btn_run = ttk.Button(btn_frame, text="运行", command=run_plan)
+        btn_run.grid(row=0, column=4, padx=5)
+        ttk.Button(btn_frame, text="停止", command=stop_event.set).grid(row=0, column=5, padx=5)
+        ttk.Button(btn_frame, text="关闭", command=close).grid(row=0, column=6, padx=5)
+        plan_window.protocol("WM_DELETE_WINDOW", close)
+
     def save_device_config(self, device):
         """保存设备配置示例方法"""
         # 这里可以添加实际保存逻辑
         messagebox.showinfo("提示", "配置保存功能待实现")
 
+    def update_integration_controls(self):
+        """积分时间和自动调零只对直流/电阻功能有效，交流功能时禁用"""
+        dc = PARAM_FUNCTIONS[self.param_combobox.get()] not in ('ACV', 'ACI')
+        self.nplc_combobox.config(state="readonly" if dc else tk.DISABLED)
+        self.autozero_check.config(state=tk.NORMAL if dc else tk.DISABLED)
+
+    def update_instrument_controls(self):
+        """按连接和占用状态启用/禁用会访问仪器的控件
+
+        扫描期间仪器由采集进程使用，扫描计划运行期间由后台线程使用，界面进程不得再向同一台仪器发送命令：
+        单次测量、设备信息、扫描计划和开始扫描按钮都被禁用，扫描和计划也不能同时运行。
+        """
+        available = self.connection_status and self.worker is None and self.plan_stop is None
+        state = tk.NORMAL if available else tk.DISABLED
+        self.enable_measure_buttons(available)
+        self.btn_info.config(state=state)
+        self.btn_plan.config(state=state)
+        self.btn_start_scan.config(state=state)
+
     def enable_measure_buttons(self, enable):
         """控制测量按钮状态"""
         state = tk.NORMAL if enable else tk.DISABLED
@@ -517,93 +975,269 @@ class MultimeterGUI:
             messagebox.showerror("测量错误", f"电阻测量时出错: {str(e)}")
 
     def start_scan(self):
-        """启动扫描线程"""
+        """启动扫描采集进程"""
         if not self.connection_status:
             messagebox.showwarning("警告", "请先连接设备")
             return
-        if self.scan_thread is None or not self.scan_thread.is_alive():
-            self.stop_event.clear()
-            self.scan_thread = threading.Thread(target=self.start_scanning)
-            self.scan_thread.start()
-            self.btn_start_scan.config(state=tk.DISABLED)
+        if self.plan_stop is not None:
+            messagebox.showwarning("警告", "扫描计划正在运行，请先停止")
+            return
+        if self.worker is None:
+            meas_param = self.param_combobox.get()
+            try:
+                interval = float(self.interval_value.get())
+            except ValueError:
+                interval = 1.0
+            try:
+                burst_size = max(int(float(self.burst_value.get())), 1)
+            except ValueError:
+                burst_size = 1
+            config = {
+                'address': self.multimeter.address,
+                'function': PARAM_FUNCTIONS[meas_param],
+                'interval': interval,
+                'burst': burst_size,
+                'stream': self.stream_mode.get(),
+                'instrument_stats': self.instrument_stats.get(),
+                'adaptive_range': self.adaptive_range.get(),
+                'autozero': self.autozero.get(),
+                'nplc': None if self.nplc_combobox.get() == "默认" else float(self.nplc_combobox.get()),
+                'timing': self.multimeter.timing is not None,
+            }
+            if self.timed_mode.get():
+                try:
+                    config.update(
+                        hardware_timed=True,
+                        rate=float(self.rate_value.get()),
+                        count=int(float(self.count_value.get())),
+                        settle=float(self.settle_value.get() or 0),
+                    )
+                except ValueError:
+                    messagebox.showwarning("警告", "请输入有效的采样率和点数")
+                    return
+                if config['rate'] <= 0:
+                    messagebox.showwarning("警告", "采样率必须大于0")
+                    return
+            if self.recording is not None:
+                config['record'] = {'path': self.recording, 'metadata': self.record_metadata(meas_param)}
+            if self.capture_mode.get():
+                kind, params = CAPTURE_TRIGGERS[self.trigger_combobox.get()]
+                try:
+                    entries = {key: float(var.get()) for key, var in self.capture_entries.items()}
+                except ValueError:
+                    messagebox.showwarning("警告", "请输入有效的事件捕获参数")
+                    return
+                args = [entries[key] for key in params]
+                if kind == 'level':
+                    args.append('both')
+                config['capture'] = {
+                    'trigger': kind,
+                    'args': args,
+                    'pre': int(entries['pre']),
+                    'post': int(entries['post']),
+                }
+            self.scan_param = meas_param
+            self.trend_plot.clear(PARAM_UNITS[meas_param])
+            self.stats.reset(offload=self.instrument_stats.get())
+            self.worker_timing = []
+            # 关闭界面的会话，由采集进程独占仪器（USB 等后端不允许两个会话同时打开同一设备），扫描结束后重新连接
+            self.pool.suspend(self.multimeter.address)
+            try:
+                self.worker = AcquisitionWorker(config)
+                self.worker.start()
+            except Exception as e:
+                self.worker = None
+                self.resume_session()
+                messagebox.showerror("扫描错误", f"无法启动采集进程: {str(e)}")
+                return
+            self.update_instrument_controls()  # 扫描期间仪器归采集进程使用
             self.btn_stop_scan.config(state=tk.NORMAL)
             self.scan_status.config(text="扫描中...", foreground="green")
+            self.master.after(WORKER_POLL_MS, self.poll_worker)
         logging.debug("Scan started")
 
     def stop_scan(self):
-        """停止扫描线程"""
-        if self.scan_thread and self.scan_thread.is_alive():
-            self.stop_event.set()
-            self.master.after(100, self.join_scan_thread)
+        """请求采集进程停止，进程在当前读数/数据块结束后退出，超时未退出时终止"""
+        if self.worker is not None:
+            self.worker.stop()
+            self.scan_status.config(text="正在停止...", foreground="orange")
+            self.master.after(WORKER_STOP_TIMEOUT_MS, self.finish_scan, self.worker)
         else:
             self.update_ui_after_stop()
         logging.debug("Stop scan requested")
 
-    def join_scan_thread(self):
-        if self.scan_thread and self.scan_thread.is_alive():
-            logging.debug("Waiting for scan thread to join...")
-            self.scan_thread.join(timeout=2)  # 设置2秒超时
-            if self.scan_thread.is_alive():
-                logging.warning("Scan thread forced termination")
-                # 强制终止线程（谨慎使用）
-                self.scan_thread._stop()
-            logging.debug("Scan thread joined")
+    def poll_worker(self):
+        """定时从采集进程取走读数和消息（界面线程）"""
+        worker = self.worker
+        if worker is None:
+            return
+        times, values = worker.read()
+        if len(values):
+            self.publish_readings(self.scan_param, times, values)
+        done = False
+        for message in worker.poll_messages():
+            if message[0] == 'done':
+                done = True
+            else:
+                self.handle_worker_message(message)
+        if done or not worker.is_alive():
+            self.finish_scan(worker)
+        else:
+            self.master.after(WORKER_POLL_MS, self.poll_worker)
+
+    def handle_worker_message(self, message):
+        """处理采集进程发来的一条消息（界面线程）"""
+        kind = message[0]
+        if kind == 'log':
+            self.update_output(message[1])
+        elif kind == 'status':
+            self.update_status(message[1], message[2])
+        elif kind == 'error':
+            self.update_output(f"扫描错误: {message[1]}")
+            logging.error(f"Scan error: {message[1]}")
+        elif kind == 'instrument_stats':
+            self.stats.instrument = message[1]
+        elif kind == 'timing':
+            self.worker_timing = message[1]
+        elif kind == 'event':
+            _, number, trigger_time, trigger_value, count = message
+            timestamp = datetime.fromtimestamp(trigger_time).strftime('%H:%M:%S.%f')[:-3]
+            self.update_output(
+                f"事件 #{number}: {timestamp} {self.format_measurement(self.scan_param, trigger_value)}，"
+                f"记录 {count} 个读数"
+            )
+        elif kind == 'interval':
+            self.interval_value.set(f"{message[1]:.4g}")
+            self.update_output(f"扫描间隔短于当前积分时间允许的最短采样间隔，已改为 {message[1]:.4g}s"
+                               f"（{1.0 / message[1]:.4g} 次/秒）")
+        elif kind == 'record':
+            _, path, count, error = message
+            if path == self.recording:
+                self.recording = None
+                self.btn_record.config(text="开始记录")
+            if error is not None:
+                messagebox.showerror("记录失败", f"写入记录文件 {path} 时出错: {error}")
+            else:
+                self.update_output(f"记录结束，共 {count} 条读数")
+
+    def finish_scan(self, worker):
+        """回收采集进程（已退出或停止超时）并恢复界面状态"""
+        if worker is not self.worker:
+            return
+        self.worker = None
+        worker.stop()
+        times, values = worker.read()  # 进程退出前写入的最后一批读数
+        if len(values):
+            self.publish_readings(self.scan_param, times, values)
+        if worker.ring.lost:
+            self.update_output(f"界面处理不及，跳过了 {worker.ring.lost} 个读数的显示")
+        worker.close(timeout=0.5)
+        for message in worker.poll_messages():  # 停止超时时尚未处理的消息（如记录结束）
+            if message[0] != 'done':
+                self.handle_worker_message(message)
+        if self.recording is not None:
+            self.recording = None  # 记录随扫描结束
+            self.btn_record.config(text="开始记录")
+        self.resume_session()
         self.update_ui_after_stop()
 
+    def resume_session(self):
+        """采集进程退出后重新打开界面的会话（重新连接会清空影子缓存，采集进程改动过的配置会重新下发）"""
+        if not self.connection_status:
+            return  # 扫描期间已断开连接
+        try:
+            self.multimeter = self.pool.acquire(self.multimeter.address)
+        except Exception as e:
+            self.connection_status = False
+            self.update_status(f"重新连接失败: {str(e)}", "red")
+            self.btn_connect.config(state=tk.NORMAL)
+            self.btn_disconnect.config(state=tk.DISABLED)
+            self.btn_timing.config(state=tk.DISABLED)
+
     def update_ui_after_stop(self):
         """更新UI状态"""
-        self.btn_start_scan.config(state=tk.NORMAL)
+        self.update_instrument_controls()
         self.btn_stop_scan.config(state=tk.DISABLED)
         self.scan_status.config(text="已停止", foreground="red")
         logging.debug("UI updated after stop")
 
-    def start_scanning(self):
-        try:
-            while not self.stop_event.is_set():
-                meas_param = self.param_combobox.get()
-                try:
-                    interval = float(self.interval_value.get())
-                except ValueError:
-                    interval = 1.0
+    def publish_readings(self, meas_param, times, values):
+        """把一批读数送往输出栏、趋势图和统计（界面线程中调用，只做入队和累计；记录文件由采集进程写入）"""
+        for t, param in zip(times, values):
+            self.update_output(self.format_measurement(meas_param, param), t)  # 按采集时刻而非取回时刻标注
+        self.trend_plot.append(times, values)
+        self.stats.update(values)
+
+    def refresh_stats(self):
+        """定时刷新统计面板（界面线程），只读取统计引擎的当前结果"""
+        unit = PARAM_UNITS.get(self.scan_param, '')  # 按实际扫描的功能，而不是下拉框的当前选择
+        self.stats_tree.delete(*self.stats_tree.get_children())
+        for name, stats in self.stats.snapshot():
+            values = [name, stats['count']]
+            for key in ('mean', 'std', 'min', 'max', 'pp'):
+                values.append('-' if not stats['count'] else f"{stats[key]:.7g} {unit}")
+            self.stats_tree.insert("", tk.END, values=values)
+        self.master.after(STATS_REFRESH_MS, self.refresh_stats)
+
+    def toggle_recording(self):
+        """开始/停止把扫描读数流式记录到文件
+
+        记录由采集进程直接从采集循环写入，界面显示跟不上时跳过的读数也会完整落盘；
+        扫描未运行时先选定文件，扫描开始后开始记录，扫描结束时记录随之结束。
+        """
+        if self.recording is not None:
+            self.stop_recording()
+            return
 
-                try:
-                    if self.stop_event.is_set():
-                        break
-
-                    logging.debug(f"Starting measurement for {meas_param}")
-                    start_time = time.time()
-                    if meas_param == '直流电压':
-                        param = self.multimeter.get_volt_dc()
-                    elif meas_param == '交流电压':
-                        param = self.multimeter.get_volt_ac()
-                    elif meas_param == '直流电流':
-                        param = self.multimeter.get_curr_dc()
-                    elif meas_param == '交流电流':
-                        param = self.multimeter.get_curr_ac()
-                    elif meas_param == '电阻':
-                        param = self.multimeter.get_immp()
-                    else:
-                        param = None
-
-                    end_time = time.time()
-                    logging.debug(f"{meas_param} took {end_time - start_time:.3f}s")
-
-                    if self.stop_event.is_set():
-                        break
-
-                    msg = self.format_measurement(meas_param, param)
-                    self.master.after(0, self.update_output, msg)  # 使用update_output
-
-                except Exception as e:
-                    self.master.after(0, self.update_output, f"扫描错误: {str(e)}")
-                    logging.error(f"Scan error: {str(e)}")
-                    break
-
-                time.sleep(interval)
+        file_path = filedialog.asksaveasfilename(
+            defaultextension=".csv",
+            filetypes=[("CSV文件", "*.csv"), ("二进制记录", "*.bin"), ("采集文件", "*.dmc"), ("压缩记录", "*.dml")],
+            title="记录数据到文件"
+        )
+        if not file_path:
+            return
+        self.recording = file_path
+        self.btn_record.config(text="停止记录")
+        if self.worker is not None:
+            self.worker.start_recording(file_path, self.record_metadata(self.scan_param))
+        else:
+            self.update_output(f"扫描开始后记录到 {file_path}")
+
+    def record_metadata(self, meas_param):
+        """写入 .dmc/.dml 文件头的元数据"""
+        return {'function': PARAM_FUNCTIONS[meas_param], 'unit': PARAM_UNITS[meas_param]}
+
+    def open_capture(self):
+        """把 .dmc 采集文件或 .dml 压缩记录载入趋势图回看"""
+        if self.worker is not None:
+            messagebox.showwarning("警告", "请先停止扫描")
+            return
+        file_path = filedialog.askopenfilename(
+            filetypes=[("采集文件", "*.dmc *.dml"), ("所有文件", "*.*")],
+            title="打开记录文件"
+        )
+        if not file_path:
+            return
+        try:
+            with open_log(file_path) as reader:
+                self.trend_plot.load_capture(reader)
+                summary = reader.summary()
+            self.update_output(
+                f"已载入 {file_path}: {summary['count']} 条读数, "
+                f"最小 {summary['min']:.6f}, 最大 {summary['max']:.6f}, 平均 {summary['mean']:.6f}"
+            )
         except Exception as e:
-            logging.error(f"Unexpected error in scan thread: {str(e)}")
-        finally:
-            self.master.after(0, self.update_ui_after_stop)
+            messagebox.showerror("打开失败", f"读取记录文件时出错: {str(e)}")
+
+    def stop_recording(self):
+        path, self.recording = self.recording, None
+        if path is None:
+            return
+        self.btn_record.config(text="开始记录")
+        if self.worker is not None:
+            self.worker.stop_recording()  # 采集进程写完剩余读数后发回记录结束消息
+        else:
+            self.update_output(f"已取消记录到 {path}")
 
     def export_output(self):
         """导出输出信息到文件"""
@@ -622,12 +1256,17 @@ class MultimeterGUI:
 
     def clear_output(self):
         """清空输出信息"""
-        self.output_text.delete(1.0, tk.END)
+        self.console.clear()
         self.update_output("输出信息已清空")
 
     def confirm_exit(self):
         """显示确认退出对话框"""
         if messagebox.askyesno("退出确认", "确认要退出程序吗？"):
+            if self.worker is not None:
+                self.worker.close()  # 采集进程退出前结束记录
+                self.worker = None
+            if self.pool is not None:
+                self.pool.close()
             self.master.destroy()
 
     def on_closing(self):
@@ -635,25 +1274,15 @@ class MultimeterGUI:
         self.confirm_exit()
 
     def format_measurement(self, meas_param, param):
-        if meas_param == '电阻' and param > 1e8:
-            return "电阻测量值: overload Ω"
+        unit = 'V' if '电压' in meas_param else 'A' if '电流' in meas_param else 'Ω'
+        if param is not None and abs(param) >= OVERLOAD:
+            return f"{meas_param}测量值: overload {unit}"  # 仪器以 ±9.9E37 表示过载
         elif param is not None:
-            return f"{meas_param}测量值: {param:.6f} {'V' if '电压' in meas_param else 'A' if '电流' in meas_param else 'Ω'}"
+            return f"{meas_param}测量值: {param:.6f} {unit}"
         else:
             return "未知测量结果"
 
 
-    def stop_scanning(self):
-        """绑定万用表类的停止扫描方法"""
-        self.stop_flag = True
-        if self.scan_thread is not None and self.scan_thread.is_alive():
-            self.scan_thread.join()  # 等待线程结束
-
-        # 更新按钮状态
-        self.btn_start_scan.config(state=tk.NORMAL)
-        self.btn_stop_scan.config(state=tk.DISABLED)
-        self.scan_status.config(text="已停止", foreground="red")
-
     def validate_number(self, new_value):
         """验证输入是否为有效数字"""
         if new_value == "":
@@ -665,29 +1294,12 @@ class MultimeterGUI:
             return False
 
     def insert_text_with_tags(self, text):
-        for char in text:
-            if re.match(r'[\u4e00-\u9fff]', char):
-                tag = 'chinese'
-            elif char.isdigit():
-                tag = 'number'
-            elif char.isalpha():
-                tag = 'english'
-            else:
-                tag = None
-            if tag:
-                self.output_text.insert(tk.END, char, tag)
-            else:
-                self.output_text.insert(tk.END, char)
-
-    def display_scanned_data(self, scanned_data):
-        # 在扫描数据前添加换行符，使输出更清晰
-        self.output_text.insert(tk.END, '\n')
-        self.insert_text_with_tags(scanned_data)
+        self.console.insert(text)
 
 
 if __name__ == "__main__":
     root = tk.Tk()
     root.title("万用表控制程序")
-    root.geometry("800x650")
+    root.geometry("800x1000")
     app = MultimeterGUI(root)
     root.mainloop()
\ No newline at end of file